@@ -4,114 +4,767 @@ import csv
 from pathlib import Path
 from collections import defaultdict
 import io
+import argparse
+import shutil
+import codecs
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-def save_error_rows(error_rows, headers, output_dir):
-    """Save error rows to a CSV file with headers and source file information"""
-    error_file = output_dir / "error-data.csv"
+import zip_source
+import csv_validator
+import lvr_schema
+import run_metrics
+import error_sink
+import aggregate_cubes
+import address_normalizer
+import header_registry
+from manifest import Manifest
+
+def quarantine_sink(csv_file, quarantine_dir=None):
+    """The error sink rows of csv_file are quarantined to: quarantine_dir, or a quarantine
+    folder next to the file when called on its own"""
+    return error_sink.get_sink(quarantine_dir or csv_file.parent / "quarantine")
+
+def detect_encoding(file_path, block_size=1 << 20):
+    """Decide the encoding of a file before parsing it, reading it in blocks
+    Returns 'utf-8-sig' (UTF-8, BOM stripped if there is one) or 'big5'.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with file_path.open('rb') as f:
+        try:
+            for block in iter(lambda: f.read(block_size), b''):
+                decoder.decode(block)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            return 'big5'
+    return 'utf-8-sig'
+
+def parse_columns(header):
+    """Column names for a raw header row, deduplicated the same way pd.read_csv does"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(header)
+    buffer.seek(0)
+    return list(pd.read_csv(buffer, nrows=0).columns)
+
+def rows_to_dataframe(rows, columns, index=None):
+    """Build a dtype=str chunk from csv rows, with the same NA handling as pd.read_csv
+
+    index labels the rows, like the positions pd.read_csv would give them in the file.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(rows)
+    buffer.seek(0)
+    df = pd.read_csv(buffer, dtype=str, header=None, names=columns)
+    if index is not None:
+        df.index = pd.Index(index)
+    return df
+
+def read_repaired_headers(file_path, encoding=None):
+    """Read just the header row of a file pandas cannot tokenize"""
+    encoding = encoding or detect_encoding(file_path)
+    with file_path.open('r', encoding=encoding, errors='replace') as f:
+        return tuple(parse_columns(next(csv.reader(f))))
+
+def fix_csv_file(file_path, chunksize=100_000, encoding=None, metrics=None, quarantine_dir=None):
+    """Fix CSV files with quote/delimiter issues in a single streaming pass
+
+    The file is decoded once, in an encoding decided up front. Rows whose field count
+    differs from the header are quarantined as they are found, and the good rows are
+    yielded as dtype=str DataFrames of up to chunksize rows, so memory stays
+    proportional to chunksize rather than to the file. A chunk's index is each row's
+    record number minus 2, the position pd.read_csv gives a row, so rows quarantined
+    later by apply_schema keep their place in the file. The encoding, the repair and
+    the rows quarantined are noted in metrics.
+    """
+    metrics = {} if metrics is None else metrics
+    encoding = encoding or detect_encoding(file_path)
+    metrics.update(encoding=encoding, repaired=True)
+    sink = quarantine_sink(file_path, quarantine_dir)
+    error_count = 0
+    columns = ()
     
-    # Add source_file and error_type to headers
-    error_headers = list(headers) + ['source_file', 'error_type', 'row_number']
+    try:
+        with file_path.open('r', encoding=encoding, errors='replace') as f:
+            csv_reader = csv.reader(f)
+            
+            # Get the expected number of columns from the first row
+            header = next(csv_reader)
+            expected_columns = len(header)
+            columns = parse_columns(header)
+            
+            rows = []
+            row_positions = []
+            chunks_yielded = 0
+            for row_idx, row in enumerate(csv_reader, 2):  # Start from 2 as 1 is header
+                if len(row) != expected_columns:
+                    # The row is kept as read, every field of it
+                    error_file = sink.write(columns, file_path, row_idx,
+                                            f"Wrong column count (expected {expected_columns}, got {len(row)})", row)
+                    error_count += 1
+                    continue
+                
+                rows.append(row)
+                row_positions.append(row_idx - 2)
+                if len(rows) >= chunksize:
+                    yield rows_to_dataframe(rows, columns, row_positions)
+                    chunks_yielded += 1
+                    rows = []
+                    row_positions = []
+            
+            if rows or chunks_yielded == 0:
+                yield (rows_to_dataframe(rows, columns, row_positions) if rows
+                       else pd.DataFrame(columns=columns, dtype=str))
+        
+        # Write out the rows still buffered, so a worker process loses none of them
+        sink.flush()
+        if error_count:
+            metrics['error_rows'] = metrics.get('error_rows', 0) + error_count
+            # Rows sent to error_sink.DISCARD were already quarantined by an earlier read
+            if quarantine_dir != error_sink.DISCARD:
+                print(f"\n  ! Quarantined {error_count} problematic rows to {error_file}")
     
-    # Create or append to error file
-    mode = 'a' if error_file.exists() else 'w'
-    with open(error_file, mode, encoding='utf-8', newline='') as f:
-        writer = csv.writer(f)
-        # Write headers only if creating new file
-        if mode == 'w':
-            writer.writerow(error_headers)
-        # Write error rows
-        for row_data in error_rows:
-            writer.writerow(row_data)
+    except Exception as e:
+        print(f"  ✗ Error fixing CSV file: {e}")
+        # Record the failure itself, in the file's group if its header was read
+        try:
+            error_file = sink.write(columns, file_path, 0, f"File parsing error: {str(e)}")
+            sink.flush()
+            if quarantine_dir != error_sink.DISCARD:
+                print(f"  ! Saved error information to {error_file}")
+        except Exception as save_error:
+            print(f"  ✗ Could not save error information: {save_error}")
+        raise
+
+def map_files(executor, fn, *iterables):
+    """Apply fn to every file, in the process pool if there is one.
+
+    Results always come back in input order, so merging them gives the same
+    header_types and combined outputs as a serial run.
+    """
+    if executor is None:
+        return map(fn, *iterables)
+    return executor.map(fn, *iterables)
+
+def prevalidate(csv_file):
+    """Pre-validate a file's bytes; the report's 'needs_repair' tells whether pandas would
+    fail on it and 'blank_rows' which records pandas skips"""
+    report = csv_validator.validate_csv(csv_file)
+    if report['needs_repair']:
+        print(f"  ! Pre-validation: {csv_file.name} has {len(report['bad_rows'])} rows with a wrong field count "
+              f"and {len(report['unbalanced_quote_spans'])} unclosed quotes")
+    return report
+
+def record_index(index, blank_rows):
+    """Relabel the positions pd.read_csv gave rows as their record numbers minus 2, the
+    labels fix_csv_file gives them, by counting the blank records pandas skipped
+    Example: blank_rows [3] -> positions 0, 1, 2 become 0, 2, 3
+    """
+    if not blank_rows:
+        return index
+    # Position of the first row after each blank record
+    firsts_after = pd.Index([record - 2 - skipped for skipped, record in enumerate(blank_rows)])
+    return index + firsts_after.searchsorted(index, side='right')
+
+def read_source_csv(csv_file, **kwargs):
+    """pd.read_csv for a CSV on disk or a zip_source.ZipMember"""
+    with csv_file.open('rb') as f:
+        return pd.read_csv(f, **kwargs)
+
+def read_csv_headers(csv_file):
+    """Read only the header row of a CSV file, with encoding fallback and repair.
+
+    Returns (headers, None) on success or (None, error_message) on failure.
+    """
+    try:
+        # Try to read the file with error handling
+        try:
+            # First try with standard reading
+            df = read_source_csv(csv_file, encoding='utf-8', nrows=0)
+        except UnicodeDecodeError:
+            # Try with different encoding
+            df = read_source_csv(csv_file, encoding='big5', nrows=0)
+        except (pd.errors.EmptyDataError, pd.errors.ParserError) as e:
+            if is_tokenizing_error(e):
+                print(f"\n  ! Attempting to fix file format: {csv_file.name}")
+                # Only the header row is needed here; bad rows are dealt with when the file is loaded
+                try:
+                    return read_repaired_headers(csv_file), None
+                except Exception as fix_error:
+                    return None, f"Error: {csv_file.name} could not be fixed: {fix_error}"
+            else:
+                return None, f"Error: {csv_file.name} is empty or invalid"
+        
+        # Create a tuple of column names for comparison
+        return tuple(df.columns), None
     
-    return error_file
+    except Exception as e:
+        return None, f"Error processing {csv_file.name}: {e}"
+
+def apply_schema(df, csv_file, metrics=None, quarantine_dir=None):
+    """Convert a dtype=str chunk to the column types of the file's schema
+
+    Rows that fail conversion are quarantined instead of stopping the load.
+    """
+    metrics = {} if metrics is None else metrics
+    schema_name = lvr_schema.schema_for_file(csv_file.name)
+    if schema_name is None:
+        return df
+    
+    typed_df, failed_df = lvr_schema.convert_chunk(df, schema_name)
+    if len(failed_df):
+        sink = quarantine_sink(csv_file, quarantine_dir)
+        values = failed_df[df.columns].astype(object).where(failed_df[df.columns].notna(), None)
+        columns = list(df.columns)
+        for row, error_type, row_idx in zip(values.values.tolist(), failed_df['error_type'], failed_df.index):
+            error_file = sink.write(columns, csv_file, row_idx + 2, error_type, row)
+        sink.flush()
+        metrics['error_rows'] = metrics.get('error_rows', 0) + len(failed_df)
+        if quarantine_dir != error_sink.DISCARD:
+            print(f"\n  ! Quarantined {len(failed_df)} rows that failed type conversion to {error_file}")
+    return typed_df
+
+def load_csv_file(csv_file, source_file, read_options=None):
+    """Load a whole CSV file as strings and tag it with source_file.
 
-def fix_csv_file(file_path, encoding='utf-8'):
-    """Fix CSV files with quote/delimiter issues by reading and writing with csv module"""
+    read_options: 'prevalidate' sends files the validator flags straight to fix_csv_file,
+    'typed' converts columns to the types of the file's schema (and pre-validates too,
+    since rows failing conversion are quarantined by record number, which only the
+    validator can tell past blank lines), 'quarantine_dir' is where
+    bad rows go, 'address_cache' adds a normalized address column, 'encoding' is the
+    file's encoding when it is already known (see file_read_options).
+    Returns (df, None, metrics) on success or (None, error_message, metrics) on failure,
+    metrics being the file's run_metrics.file_metrics record.
+    """
+    read_options = read_options or {}
+    metrics = run_metrics.file_metrics(csv_file)
+    start = time.perf_counter()
     try:
-        # Read the original file
-        with open(file_path, 'r', encoding=encoding, errors='replace') as f:
-            content = f.read()
+        quarantine_dir = read_options.get('quarantine_dir')
+        encoding = read_options.get('encoding')
+        report = None
+        if read_options.get('prevalidate') or read_options.get('typed'):
+            report = prevalidate(csv_file)
+        if report is not None and report['needs_repair']:
+            # Keep the record numbers fix_csv_file puts in the index for apply_schema
+            df = pd.concat(fix_csv_file(csv_file, encoding=encoding, metrics=metrics, quarantine_dir=quarantine_dir))
+        else:
+            df = _load_raw_csv_file(csv_file, metrics, quarantine_dir, encoding,
+                                    report['blank_rows'] if report is not None else None)
         
-        # Create a string buffer
-        output = io.StringIO()
+        if read_options.get('typed'):
+            df = apply_schema(df, csv_file, metrics, quarantine_dir)
+        df = normalize_chunk_addresses(df, read_options, metrics)
+        df['source_file'] = source_file
+        metrics['rows'] = len(df)
+        return df, None, metrics
+    except Exception as e:
+        metrics['error'] = str(e)
+        return None, str(e), metrics
+    finally:
+        metrics['seconds'] = round(time.perf_counter() - start, 6)
+
+def is_tokenizing_error(error):
+    """Whether pandas failed on the file's structure, which fix_csv_file can repair"""
+    return "EOF inside string" in str(error) or "Error tokenizing data" in str(error)
+
+def _load_raw_csv_file(csv_file, metrics=None, quarantine_dir=None, encoding=None, blank_rows=None):
+    """Load a whole CSV file as strings in the given encoding, else its detected one (utf-8 or big5)
+
+    A file pandas cannot tokenize goes to fix_csv_file in that same encoding, whichever
+    it is. With the validator's blank_rows, the index holds record numbers minus 2 like
+    fix_csv_file's.
+    """
+    metrics = {} if metrics is None else metrics
+    encoding = encoding or detect_encoding(csv_file)
+    metrics.update(encoding=encoding, big5_fallback=encoding == 'big5')
+    try:
+        df = read_source_csv(csv_file, encoding=encoding, 
+                             low_memory=False, 
+                             dtype=str)
+        df.index = record_index(df.index, blank_rows)
+        return df
+    except pd.errors.ParserError as e:
+        if not is_tokenizing_error(e):
+            raise
+        print(f"  ! Attempting to fix file format: {csv_file.name}")
+        return pd.concat(fix_csv_file(csv_file, encoding=encoding, metrics=metrics, quarantine_dir=quarantine_dir))
+
+def _read_raw_csv_chunks(csv_file, chunksize, metrics=None, quarantine_dir=None, encoding=None):
+    """Yield dtype=str chunks of a CSV file in the given or detected encoding, falling back to
+    fix_csv_file the same way the in-memory combine does.
+
+    Files are always pre-validated: a chunked pd.read_csv does not reliably raise on a
+    row with too many fields (when the row starts a chunk its extra fields are dropped
+    silently), so files the validator flags go to fix_csv_file up front, exactly the
+    files a whole-file read would fail on. Either way a chunk's index holds record
+    numbers minus 2 (see record_index).
+
+    A file can fail halfway through (a bad byte or an unterminated quote deep in
+    the file), so the caller must be ready to discard chunks it already got when
+    the generator moves on to the next attempt. Each attempt is announced by
+    yielding None first.
+    """
+    metrics = {} if metrics is None else metrics
+    encoding = encoding or detect_encoding(csv_file)
+    metrics.update(encoding=encoding, big5_fallback=encoding == 'big5')
+    report = prevalidate(csv_file)
+    if report['needs_repair']:
+        yield None
+        yield from fix_csv_file(csv_file, chunksize, encoding, metrics=metrics, quarantine_dir=quarantine_dir)
+        return
+    
+    try:
+        yield None
+        with csv_file.open('rb') as f, pd.read_csv(f, encoding=encoding, dtype=str, chunksize=chunksize) as reader:
+            for chunk in reader:
+                chunk.index = record_index(chunk.index, report['blank_rows'])
+                yield chunk
+        return
+    except pd.errors.ParserError as e:
+        if not is_tokenizing_error(e):
+            raise
+
+    print(f"  ! Attempting to fix file format: {csv_file.name}")
+    yield None
+    yield from fix_csv_file(csv_file, chunksize, encoding, metrics=metrics, quarantine_dir=quarantine_dir)
+
+def normalize_chunk_addresses(df, read_options=None, metrics=None):
+    """Add the normalized address column to a chunk that has an address column, when
+    read_options has an 'address_cache' (the persistent cache file). Cache lookups and
+    hits are counted in metrics.
+    """
+    read_options = read_options or {}
+    if not read_options.get('address_cache') or address_normalizer.ADDRESS_COLUMN not in df.columns:
+        return df
+    
+    metrics = {} if metrics is None else metrics
+    normalizer = address_normalizer.get_normalizer(read_options['address_cache'],
+                                                   read_options.get('address_cache_size', 200_000))
+    lookups = normalizer.stats['lookups']
+    misses = normalizer.stats['misses']
+    df[address_normalizer.NORMALIZED_COLUMN] = normalizer.normalize(df[address_normalizer.ADDRESS_COLUMN])
+    metrics['address_lookups'] = metrics.get('address_lookups', 0) + normalizer.stats['lookups'] - lookups
+    metrics['address_misses'] = metrics.get('address_misses', 0) + normalizer.stats['misses'] - misses
+    return df
+
+def combined_columns(headers, read_options=None):
+    """Columns of a group's combined output: the files' own, the normalized address if
+    one is added, then source_file"""
+    columns = list(headers)
+    if (read_options or {}).get('address_cache') and address_normalizer.ADDRESS_COLUMN in columns:
+        columns.append(address_normalizer.NORMALIZED_COLUMN)
+    return columns + ['source_file']
+
+def file_read_options(read_options, source_files, encodings=None):
+    """read_options for each of source_files, with its encoding from encodings (source file ->
+    encoding, as HeaderRegistry.encoding knows it) so it is not detected by decoding the
+    whole file again"""
+    encodings = encodings or {}
+    return [{**(read_options or {}), 'encoding': encodings.get(source_file)} for source_file in source_files]
+
+def read_csv_chunks(csv_file, chunksize, read_options=None, metrics=None):
+    """Yield chunks of a CSV file, dtype=str unless read_options asks for 'typed' ones.
+
+    Files the validator flags always go straight to fix_csv_file (see
+    _read_raw_csv_chunks), so 'prevalidate' has nothing left to change here. read_options:
+    'typed' converts every chunk to the column types of the file's
+    schema (rows that fail are quarantined to 'quarantine_dir'), 'address_cache' adds
+    a normalized address column, 'encoding' is the file's encoding when it is already
+    known. How the file was read is noted in metrics.
+    """
+    read_options = read_options or {}
+    quarantine_dir = read_options.get('quarantine_dir')
+    for chunk in _read_raw_csv_chunks(csv_file, chunksize, metrics, quarantine_dir, read_options.get('encoding')):
+        if chunk is not None and read_options.get('typed'):
+            chunk = apply_schema(chunk, csv_file, metrics, quarantine_dir)
+        if chunk is not None:
+            chunk = normalize_chunk_addresses(chunk, read_options, metrics)
+        yield chunk
+
+def append_csv_file(csv_file, out, source_file, chunksize, read_options=None, metrics=None):
+    """Append the rows of csv_file to the open handle out, chunk by chunk.
+
+    On failure everything this file appended is truncated away before the
+    exception propagates. Returns the number of rows written.
+    """
+    file_start = out.tell()
+    file_rows = 0
+    try:
+        for chunk in read_csv_chunks(csv_file, chunksize, read_options, metrics):
+            if chunk is None:
+                # New attempt: drop whatever the previous attempt appended
+                out.seek(file_start)
+                out.truncate()
+                file_rows = 0
+                continue
+            chunk['source_file'] = source_file
+            chunk.to_csv(out, index=False, header=False)
+            file_rows += len(chunk)
+    except Exception:
+        out.seek(file_start)
+        out.truncate()
+        raise
+    
+    return file_rows
+
+def stream_csv_file_to_part(csv_file, part_path, source_file, chunksize, read_options=None):
+    """Worker side of a parallel streaming combine: write one file's rows to part_path.
+
+    Returns (rows, None, metrics) on success or (None, error_message, metrics) on failure.
+    """
+    metrics = run_metrics.file_metrics(csv_file)
+    start = time.perf_counter()
+    try:
+        with open(part_path, 'w', encoding='utf-8', newline='') as out:
+            metrics['rows'] = append_csv_file(csv_file, out, source_file, chunksize, read_options, metrics)
+            return metrics['rows'], None, metrics
+    except Exception as e:
+        metrics['error'] = str(e)
+        return None, str(e), metrics
+    finally:
+        metrics['seconds'] = round(time.perf_counter() - start, 6)
+
+def stream_combine_group(headers, files, output_path, property_infos_dir, chunksize=100_000, executor=None,
+                         read_options=None, metrics=None, append=False, encodings=None):
+    """Combine one header group by appending each file chunk by chunk to output_path.
+
+    Only one chunk is held in memory at a time, so peak memory depends on
+    chunksize rather than on how many files are in the group. With an
+    executor, each file is parsed into its own part file by a worker and the
+    parts are concatenated in file order. With append, the files are added to the
+    end of an existing output_path instead. encodings are the files' known encodings
+    (see file_read_options). Every file's record goes to the RunMetrics metrics if given.
+    Returns (rows_written, bytes_written, added) where added lists the source files
+    that made it into the output.
+    """
+    total_rows = 0
+    added = []
+    source_files = [str(csv_file.relative_to(property_infos_dir)) for csv_file in files]
+    options = file_read_options(read_options, source_files, encodings)
+    
+    with open(output_path, 'a' if append else 'w', encoding='utf-8', newline='') as out:
+        output_start = out.tell()
+        if not append:
+            # Header is written once up front; every chunk is appended without it
+            pd.DataFrame(columns=combined_columns(headers, read_options)).to_csv(out, index=False)
         
-        # Read the content as CSV and write it back properly quoted
-        csv_reader = csv.reader(io.StringIO(content))
-        csv_writer = csv.writer(output, quoting=csv.QUOTE_ALL)
+        if executor is None:
+            for csv_file, source_file, file_options in zip(files, source_files, options):
+                file_metrics = run_metrics.file_metrics(csv_file)
+                start = time.perf_counter()
+                try:
+                    file_rows = append_csv_file(csv_file, out, source_file, chunksize, file_options, file_metrics)
+                    file_metrics['rows'] = file_rows
+                    total_rows += file_rows
+                    added.append(source_file)
+                    print(f"  ✓ Added: {csv_file.name} ({file_rows} rows)")
+                except Exception as e:
+                    file_metrics['error'] = str(e)
+                    print(f"  ✗ Error processing {csv_file.name}: {e}")
+                file_metrics['seconds'] = round(time.perf_counter() - start, 6)
+                if metrics is not None:
+                    metrics.record_file(file_metrics, output=output_path.name)
+        else:
+            parts_dir = output_path.with_suffix('.parts')
+            parts_dir.mkdir(exist_ok=True)
+            part_paths = [parts_dir / f"{i:06d}.csv" for i in range(len(files))]
+            try:
+                results = executor.map(stream_csv_file_to_part, files, part_paths, source_files,
+                                       [chunksize] * len(files), options)
+                for csv_file, source_file, part_path, (file_rows, error, file_metrics) in zip(
+                        files, source_files, part_paths, results):
+                    if metrics is not None:
+                        metrics.record_file(file_metrics, output=output_path.name)
+                    if error is not None:
+                        print(f"  ✗ Error processing {csv_file.name}: {error}")
+                        continue
+                    out.flush()
+                    with open(part_path, 'r', encoding='utf-8', newline='') as part:
+                        shutil.copyfileobj(part, out)
+                    part_path.unlink()
+                    total_rows += file_rows
+                    added.append(source_file)
+                    print(f"  ✓ Added: {csv_file.name} ({file_rows} rows)")
+            finally:
+                shutil.rmtree(parts_dir, ignore_errors=True)
         
-        # Get the expected number of columns from the first row
-        header = next(csv_reader)
-        expected_columns = len(header)
-        csv_writer.writerow(header)
+        bytes_written = out.tell() - output_start
+    
+    if not added and not append:
+        output_path.unlink()
+        return 0, 0, added
+    
+    return total_rows, bytes_written, added
+
+def write_file_partition(csv_file, dataset_dir, source_file, chunksize, read_options=None):
+    """Write one file's rows into its partition of the Parquet dataset.
+
+    Returns (rows, bytes, None, metrics) on success or (None, None, error_message, metrics)
+    on failure.
+    """
+    import parquet_store
+    
+    metrics = run_metrics.file_metrics(csv_file)
+    start = time.perf_counter()
+    try:
+        output_path = parquet_store.partition_file_path(dataset_dir, csv_file.name)
+        if output_path is None:
+            metrics['error'] = f"No partition found for {csv_file.name}"
+            return None, None, metrics['error'], metrics
         
-        # Store error rows for later saving
-        error_rows = []
+        def tagged_chunks():
+            for chunk in read_csv_chunks(csv_file, chunksize, read_options, metrics):
+                if chunk is not None:
+                    chunk['source_file'] = source_file
+                yield chunk
         
-        # Process remaining rows
-        for row_idx, row in enumerate(csv_reader, 2):  # Start from 2 as 1 is header
-            if len(row) != expected_columns:
-                # Pad row with None to match header length
-                padded_row = row + [None] * (expected_columns - len(row))
-                # Trim row if too long
-                padded_row = padded_row[:expected_columns]
-                # Add source file and error information
-                error_row = padded_row + [
-                    str(file_path),
-                    f"Wrong column count (expected {expected_columns}, got {len(row)})",
-                    row_idx
-                ]
-                error_rows.append(error_row)
+        rows, bytes_written = parquet_store.write_parquet_chunks(tagged_chunks(), output_path)
+        metrics['rows'] = rows
+        return rows, bytes_written, None, metrics
+    except Exception as e:
+        metrics['error'] = str(e)
+        return None, None, str(e), metrics
+    finally:
+        metrics['seconds'] = round(time.perf_counter() - start, 6)
+
+def write_group_partitions(files, dataset_dir, property_infos_dir, chunksize=100_000, executor=None,
+                           read_options=None, metrics=None, encodings=None):
+    """Write one header group into the partitioned Parquet dataset, one file per source CSV.
+
+    encodings are the files' known encodings (see file_read_options).
+    Every file's record goes to the RunMetrics metrics if given.
+    Returns (rows_written, bytes_written, added) over the whole group, where added
+    lists the source files whose partition was written.
+    """
+    total_rows = 0
+    total_bytes = 0
+    added = []
+    source_files = [str(csv_file.relative_to(property_infos_dir)) for csv_file in files]
+    
+    results = map_files(executor, write_file_partition, files, [dataset_dir] * len(files),
+                        source_files, [chunksize] * len(files), file_read_options(read_options, source_files, encodings))
+    for csv_file, source_file, (file_rows, file_bytes, error, file_metrics) in zip(files, source_files, results):
+        if metrics is not None:
+            metrics.record_file(file_metrics, output=str(dataset_dir))
+        if error is not None:
+            print(f"  ✗ Error processing {csv_file.name}: {error}")
+            continue
+        total_rows += file_rows
+        total_bytes += file_bytes
+        added.append(source_file)
+        print(f"  ✓ Added: {csv_file.name} ({file_rows} rows)")
+    
+    return total_rows, total_bytes, added
+
+def file_cube_summaries(csv_file, chunksize, read_options=None):
+    """Worker side of the cube update: the aggregate summaries of one main table file.
+
+    Returns (summaries, None, metrics) on success or (None, error_message, metrics) on failure.
+    """
+    metrics = run_metrics.file_metrics(csv_file)
+    start = time.perf_counter()
+    try:
+        parts = []
+        for chunk in read_csv_chunks(csv_file, chunksize, read_options, metrics):
+            if chunk is None:
+                # New attempt: forget what the previous one summarized
+                parts = []
+                metrics['rows'] = 0
                 continue
-            csv_writer.writerow(row)
-        
-        # Save error rows if any
-        if error_rows:
-            error_file = save_error_rows(error_rows, header, file_path.parent)
-            print(f"\n  ! Saved {len(error_rows)} problematic rows to {error_file}")
-        
-        # Return the fixed content as a string buffer
-        output.seek(0)
-        return output
-        
+            parts.append(aggregate_cubes.chunk_summaries(chunk, csv_file.name))
+            metrics['rows'] += len(chunk)
+        return aggregate_cubes.merge_summaries(parts), None, metrics
     except Exception as e:
-        print(f"  ✗ Error fixing CSV file: {e}")
-        # Try to save the entire file content as error data if possible
-        try:
-            error_rows = [[str(file_path), f"File parsing error: {str(e)}", 0]]
-            error_file = save_error_rows(error_rows, [], file_path.parent)
-            print(f"  ! Saved error information to {error_file}")
-        except Exception as save_error:
-            print(f"  ✗ Could not save error information: {save_error}")
-        return None
+        metrics['error'] = str(e)
+        return None, str(e), metrics
+    finally:
+        metrics['seconds'] = round(time.perf_counter() - start, 6)
+
+def update_aggregate_cubes(csv_files, property_infos_dir, chunksize=100_000, executor=None, read_options=None,
+                           metrics=None, encodings=None):
+    """Bring the aggregate cube in property-infos/cubes.sqlite up to date with csv_files.
+
+    Only main tables count. Like the combine, the cube keeps a manifest
+    (manifest-cubes.json) so only new or changed files are read; each file's
+    summaries replace its old ones and only the cells of the partitions (city,
+    transaction type, quarter) they touch are materialized again, so adding a quarter
+    costs about as much as reading that quarter. The cube is exported to aggregates.csv.
+    encodings are the files' known encodings (see file_read_options).
+    """
+    property_infos_dir = Path(property_infos_dir)
+    manifest = Manifest(property_infos_dir / "manifest-cubes.json")
+    store = aggregate_cubes.CubeStore(property_infos_dir / "cubes.sqlite")
+    
+    # Every file was just read (and its bad rows quarantined) by the combine, unless it
+    # was unchanged; rows dropped again here are not quarantined a second time
+    read_options = {**(read_options or {}), 'typed': False, 'quarantine_dir': error_sink.DISCARD,
+                    'address_cache': None}
+    
+    main_files = [f for f in csv_files if (lvr_schema.file_keys(f.name) or {}).get('table') == 'main']
+    source_files = [str(csv_file.relative_to(property_infos_dir)) for csv_file in main_files]
+    summarized = store.sources()
+    to_read = []
+    for csv_file, source_file in zip(main_files, source_files):
+        changed, entry = manifest.check(source_file, csv_file)
+        if changed or source_file not in summarized:
+            to_read.append((csv_file, source_file, entry))
+    removed = manifest.removed()
+    print(f"Cube: {len(to_read)} new or changed main tables, {len(removed)} removed, "
+          f"{len(main_files) - len(to_read)} unchanged")
+    
+    # Cells of the files' old rows and of their new ones are materialized again
+    partitions = store.partitions_of([source_file for _, source_file, _ in to_read] + list(removed))
+    for source_file in removed:
+        store.remove(source_file)
+        manifest.forget(source_file)
+    
+    files = [csv_file for csv_file, _, _ in to_read]
+    options = file_read_options(read_options, [source_file for _, source_file, _ in to_read], encodings)
+    results = map_files(executor, file_cube_summaries, files, [chunksize] * len(files), options)
+    for (csv_file, source_file, entry), (summaries, error, file_metrics) in zip(to_read, results):
+        if metrics is not None:
+            metrics.record_file(file_metrics, phase='cubes')
+        if error is not None:
+            print(f"  ✗ Error summarizing {csv_file.name}: {error}")
+            continue
+        store.replace(source_file, summaries)
+        if summaries is not None:
+            cells = summaries['cells']
+            partitions.update(zip(cells['city'], cells['trans_type'], cells['quarter']))
+        manifest.record(source_file, entry)
+        print(f"  ✓ Summarized: {csv_file.name} ({file_metrics['rows']} rows)")
+    
+    store.materialize(partitions)
+    cube = store.cube()
+    store.close()
+    manifest.save()
+    
+    output_path = property_infos_dir / "aggregates.csv"
+    cube.to_csv(output_path, index=False, encoding='utf-8')
+    print(f"  ✓ Cube: {len(partitions)} partitions refreshed, {len(cube)} cells saved to {output_path}")
+    return cube
 
-def analyze_and_combine_csv_files():
+def resolve_header_group(registry, csv_file, source_file, fingerprint, record, error=None):
+    """Register a file by the fingerprint of its header record and return its group id
+
+    A layout new to the registry is decoded from that record, or read by pandas when
+    the record alone cannot be parsed. A record too long to be fingerprinted is read by
+    pandas and fingerprinted from its column names.
+    Returns (group_id, None) on success or (None, error_message) on failure.
+    """
+    if error is not None:
+        return None, error
+    headers = encoding = None
+    if fingerprint is None or not registry.known(fingerprint):
+        decoded = header_registry.decode_header(record) if fingerprint is not None else None
+        if decoded is None:
+            headers, error = read_csv_headers(csv_file)
+            if error is not None:
+                return None, error
+        else:
+            headers, encoding = decoded
+        fingerprint = fingerprint or header_registry.headers_fingerprint(headers)
+    return registry.register(source_file, csv_file, fingerprint, headers, encoding), None
+
+def record_group(manifest, group_id, headers, output, source_files, file_entries, loaded, file_outputs=None):
+    """Remember which header group and output every loaded file of a processed group went to
+
+    Files of the group that failed to load are dropped from the manifest, so the next
+    run sees them as new and tries them again. file_outputs maps a source file to its
+    own output when files do not share one.
+    """
+    manifest.groups[group_id] = {'headers': list(headers), 'output': output}
+    loaded = set(loaded)
+    for source_file in source_files:
+        if source_file not in loaded:
+            manifest.forget(source_file)
+            continue
+        entry = dict(file_entries[source_file], group=group_id, headers=list(headers))
+        entry['output'] = file_outputs[source_file] if file_outputs else output
+        manifest.record(source_file, entry)
+
+def analyze_and_combine_csv_files(streaming=False, chunksize=100_000, workers=1, output='csv', dataset_dir=None,
+                                  incremental=False, prevalidate=False, typed=False, report=None, profile=None,
+                                  trace_memory=False, property_infos_dir="property-infos", analyze_only=False,
+                                  cubes=False, normalize_addresses=False, address_cache_size=200_000):
     print("\n=== Starting CSV Analysis and Combination Process ===")
     
     # Get the property-infos directory and verify it exists
-    property_infos_dir = Path("property-infos")
+    property_infos_dir = Path(property_infos_dir)
     if not property_infos_dir.exists():
         print(f"Error: Directory not found: {property_infos_dir.absolute()}")
         return
     
-    # Initialize error data file
-    error_file = property_infos_dir / "error-data.csv"
-    if error_file.exists():
-        print(f"Found existing error-data.csv, will append new errors to it")
+    # Phase timings and one record per parsed file, written to report as JSON + CSV;
+    # profile/trace_memory profile this process (not the workers) into the same report
+    metrics = run_metrics.RunMetrics('processor', {
+        'streaming': streaming, 'chunksize': chunksize, 'workers': workers, 'output': output,
+        'incremental': incremental, 'prevalidate': prevalidate, 'typed': typed,
+        'property_infos_dir': str(property_infos_dir), 'analyze_only': analyze_only, 'cubes': cubes,
+        'normalize_addresses': normalize_addresses, 'address_cache_size': address_cache_size,
+    })
+    metrics.start_profiling(profile, trace_memory)
+    
+    # Parquet output goes next to the combined CSVs unless told otherwise
+    dataset_dir = Path(dataset_dir) if dataset_dir else property_infos_dir / "dataset"
+    if output == 'parquet':
+        # pyarrow is only needed for Parquet output
+        import parquet_store
+    
+    # dedup_index.py writes its deduplicated combined CSVs in here by default; they are not inputs
+    deduped_dir = property_infos_dir / "deduped"
+    
+    # Rows that cannot be loaded go to one errors-<group>.csv per header group in here
+    quarantine_dir = property_infos_dir / "quarantine"
+    if error_sink.quarantine_files(quarantine_dir):
+        print(f"Found existing quarantine files in {quarantine_dir}, will append new errors to them")
+    
+    # How every file is read, passed along to the workers. Normalized addresses are
+    # cached in a file every worker shares, so an address is normalized once per history
+    address_cache = property_infos_dir / "address-cache.sqlite" if normalize_addresses else None
+    read_options = {'prevalidate': prevalidate, 'typed': typed, 'quarantine_dir': str(quarantine_dir),
+                    'address_cache': str(address_cache) if address_cache else None,
+                    'address_cache_size': address_cache_size}
     
     # Initialize dictionaries to store header types and corresponding dataframes
     header_types = defaultdict(list)  # Will store file paths for each header type
-    header_samples = {}  # Will store a sample of each unique header type
+    group_ids = {}  # Registry group id of each header type
     problem_files = []  # Store files with inconsistent columns
     
     # Counter for progress tracking
     total_files_processed = 0
     total_files_failed = 0
     
+    # With a manifest only new or changed files are parsed and only their groups rebuilt
+    manifest = None
+    file_entries = {}  # Fresh size/mtime/hash of every file seen this run
+    changed_files = set()  # New or modified files
+    new_files = set()  # Files the manifest has no entry for, a subset of changed_files
+    affected_groups = set()  # Groups that lost a file or whose file changed header layout
+    if incremental:
+        # Typed and string outputs, with or without normalized addresses, share file
+        # names, so each keeps its own manifest
+        manifest = Manifest(property_infos_dir / f"manifest-{output}{'-typed' if typed else ''}"
+                                                 f"{'-addresses' if normalize_addresses else ''}.json")
+        print(f"Incremental run, {len(manifest.files)} files in manifest")
+    
+    # Header layouts by first-line fingerprint, and every file's fingerprint by size/mtime,
+    # kept across runs; group ids and output names come from it, so they are stable
+    registry = header_registry.HeaderRegistry(property_infos_dir / "header-registry.json")
+    
+    # Per-file parsing runs in a process pool when more than one worker is asked for
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    if executor is not None:
+        print(f"Using {workers} worker processes")
+    
     # First pass: Analyze headers
     print("\n=== Phase 1: Analyzing CSV Headers ===")
+    metrics.begin_phase('analyze headers')
     
-    # Get all subdirectories first
-    folders = [f for f in property_infos_dir.iterdir() if f.is_dir()]
+    # Get all subdirectories first, in name order: the first file registered with a layout
+    # names its output, so it must not depend on the order the filesystem lists them in
+    folders = sorted(f for f in property_infos_dir.iterdir()
+                     if f.is_dir() and f not in (dataset_dir, quarantine_dir, deduped_dir))
     total_folders = len(folders)
     
     print(f"Found {total_folders} folders to process")
@@ -119,69 +772,74 @@ def analyze_and_combine_csv_files():
     for folder_idx, folder in enumerate(folders, 1):
         print(f"\nScanning folder [{folder_idx}/{total_folders}]: {folder.relative_to(property_infos_dir)}")
         
-        csv_files = list(folder.glob("*.csv"))
+        # Files on disk plus any CSVs the grouper indexed inside zip archives
+        # (error-data.csv is what older runs quarantined rows to, it is not an input),
+        # sorted by name so a zip member takes the place its copy would have
+        csv_files = [f for f in folder.glob("*.csv") if f.name != "error-data.csv"]
+        csv_files += zip_source.read_zip_index(folder)
+        csv_files.sort(key=lambda f: f.name)
         total_files = len(csv_files)
         
         if total_files == 0:
             print(f"  No CSV files found in {folder.name}")
             continue
         
-        for file_idx, csv_file in enumerate(csv_files, 1):
-            try:
-                print(f"  Reading file [{file_idx}/{total_files}]: {csv_file.name}", end='\r')
-                
-                # Try to read the file with error handling
-                try:
-                    # First try with standard reading
-                    df = pd.read_csv(csv_file, encoding='utf-8', nrows=0)
-                except UnicodeDecodeError:
-                    # Try with different encoding
-                    df = pd.read_csv(csv_file, encoding='big5', nrows=0)
-                except (pd.errors.EmptyDataError, pd.errors.ParserError) as e:
-                    if "EOF inside string" in str(e) or "Error tokenizing data" in str(e):
-                        print(f"\n  ! Attempting to fix file format: {csv_file.name}")
-                        # Try to fix the file format
-                        try:
-                            fixed_content = fix_csv_file(csv_file, encoding='utf-8')
-                            if fixed_content is not None:
-                                df = pd.read_csv(fixed_content, dtype=str)
-                            else:
-                                fixed_content = fix_csv_file(csv_file, encoding='big5')
-                                if fixed_content is not None:
-                                    df = pd.read_csv(fixed_content, dtype=str)
-                                else:
-                                    raise Exception("Failed to fix file format")
-                        except Exception as fix_error:
-                            print(f"  ✗ Error: {csv_file.name} could not be fixed: {fix_error}")
-                            total_files_failed += 1
-                            continue
+        source_files = [str(csv_file.relative_to(property_infos_dir)) for csv_file in csv_files]
+        
+        if manifest is not None:
+            for csv_file, source_file in zip(csv_files, source_files):
+                changed, entry = manifest.check(source_file, csv_file)
+                file_entries[source_file] = entry
+                if changed:
+                    changed_files.add(source_file)
+                    if source_file in manifest.files:
+                        affected_groups.add(manifest.files[source_file].get('group'))
                     else:
-                        print(f"  ✗ Error: {csv_file.name} is empty or invalid")
-                        total_files_failed += 1
-                        continue
-                
-                # Create a tuple of column names for comparison
-                headers = tuple(df.columns)
-                
-                # Store file path under this header type
-                header_types[headers].append(csv_file)
-                
-                # Store a sample of the header if we haven't seen it before
-                if headers not in header_samples:
-                    header_samples[headers] = csv_file.name
-                
-                total_files_processed += 1
-                
-            except Exception as e:
-                print(f"  ✗ Error processing {csv_file.name}: {e}")
+                        new_files.add(source_file)
+        
+        # Files with the size and mtime the registry knows are not opened; the others only
+        # have their first line read, and only a layout never seen before gets parsed
+        cached_groups = {source_file: registry.cached(source_file, csv_file)
+                         for csv_file, source_file in zip(csv_files, source_files)}
+        to_read = [f for f, source_file in zip(csv_files, source_files) if cached_groups[source_file] is None]
+        signatures = iter(map_files(executor, header_registry.read_signature, to_read))
+        for file_idx, (csv_file, source_file) in enumerate(zip(csv_files, source_files), 1):
+            print(f"  Reading file [{file_idx}/{total_files}]: {csv_file.name}", end='\r')
+            
+            group_id, error = cached_groups[source_file], None
+            if group_id is None:
+                group_id, error = resolve_header_group(registry, csv_file, source_file, *next(signatures))
+            if error is not None:
+                print(f"  ✗ {error}")
                 total_files_failed += 1
+                continue
+            
+            # Store file path under this header type
+            headers = registry.headers(group_id)
+            header_types[headers].append(csv_file)
+            group_ids[headers] = group_id
+            
+            total_files_processed += 1
+    
+    registry.save()
+    metrics.count('header registry hits', registry.hits)
+    print(f"\n\nHeader registry: {registry.hits} of {total_files_processed + total_files_failed} files unchanged, "
+          f"{len(registry.groups)} known layouts ({registry.path})")
+    
+    if manifest is not None:
+        for entry in manifest.removed().values():
+            affected_groups.add(entry.get('group'))
+        print(f"New or changed files: {len(changed_files)}, removed files: {len(manifest.removed())}")
     
     # Report findings
     print("\n\n=== Header Analysis Results ===")
     print(f"Found {len(header_types)} different header types:")
     for idx, (headers, files) in enumerate(header_types.items(), 1):
         print(f"\nType {idx}:")
-        print(f"Sample file: {header_samples[headers]}")
+        group = registry.groups[group_ids[headers]]
+        print(f"Group: {group_ids[headers]}")
+        print(f"Sample file: {group['sample']}")
+        print(f"Schema: {group['schema'] or 'none (kept as text)'}")
         print(f"Headers: {', '.join(headers)}")
         print(f"Number of files: {len(files)}")
     
@@ -191,67 +849,237 @@ def analyze_and_combine_csv_files():
             print(f"File: {file.name}")
             print(f"Error: {error}")
     
-    # Ask user if they want to proceed with combination
-    while True:
-        response = input("\nWould you like to combine files with matching headers? (y/n): ").lower()
-        if response in ['y', 'n']:
-            break
-    
-    if response == 'y':
+    # analyze_only stops after the header report, nothing is written
+    metrics.end_phase()
+    if not analyze_only:
         print("\n=== Phase 2: Combining Files ===")
+        metrics.begin_phase('combine')
+        # Encodings found by earlier reads of unchanged files, so they are not detected again
+        encodings = {source_file: registry.encoding(source_file) for source_file in registry.seen}
         for idx, (headers, files) in enumerate(header_types.items(), 1):
             print(f"\nProcessing group {idx} ({len(files)} files)...")
-            all_dataframes = []
             
-            for csv_file in files:
-                try:
-                    try:
-                        df = pd.read_csv(csv_file, encoding='utf-8', 
-                                       low_memory=False, 
-                                       dtype=str)
-                    except (UnicodeDecodeError, pd.errors.ParserError) as e:
-                        if "EOF inside string" in str(e) or "Error tokenizing data" in str(e):
-                            print(f"  ! Attempting to fix file format: {csv_file.name}")
-                            fixed_content = fix_csv_file(csv_file, encoding='utf-8')
-                            if fixed_content is not None:
-                                df = pd.read_csv(fixed_content, dtype=str)
-                            else:
-                                fixed_content = fix_csv_file(csv_file, encoding='big5')
-                                if fixed_content is not None:
-                                    df = pd.read_csv(fixed_content, dtype=str)
-                                else:
-                                    raise Exception("Failed to fix file format")
-                        else:
-                            df = pd.read_csv(csv_file, encoding='big5', 
-                                           low_memory=False, 
-                                           dtype=str)
-                    
-                    df['source_file'] = str(csv_file.relative_to(property_infos_dir))
-                    all_dataframes.append(df)
-                    print(f"  ✓ Added: {csv_file.name}")
-                except Exception as e:
-                    print(f"  ✗ Error processing {csv_file.name}: {e}")
+            group_id = group_ids[headers]
+            source_files = [str(csv_file.relative_to(property_infos_dir)) for csv_file in files]
             
-            if all_dataframes:
-                # Combine all dataframes of this type
-                combined_df = pd.concat(all_dataframes, ignore_index=True)
+            # Name the output after the first file ever seen with this layout and the
+            # group id, neither of which depends on the order files are found in
+            sample_name = Path(registry.groups[group_id]['sample']).stem
+            output_path = property_infos_dir / f"combined_{sample_name}_{group_id}.csv"
+            if manifest is not None and manifest.groups.get(group_id, {}).get('output'):
+                # Keep the name this group's output had on the last run
+                output_path = property_infos_dir / manifest.groups[group_id]['output']
+            
+            if output == 'parquet':
+                # Recorded relative to the dataset, like the grouper records its copies, so
+                # a run from another working directory finds the same partitions
+                partition_paths = {source_file: parquet_store.partition_file_path(dataset_dir, csv_file.name)
+                                   for csv_file, source_file in zip(files, source_files)}
+                partition_paths = {source_file: str(path.relative_to(dataset_dir)) if path else None
+                                   for source_file, path in partition_paths.items()}
+                to_write = files
+                if manifest is not None:
+                    to_write = [csv_file for csv_file, source_file in zip(files, source_files)
+                                if source_file in changed_files or not partition_paths[source_file]
+                                or not (dataset_dir / partition_paths[source_file]).exists()]
+                    if not to_write:
+                        print(f"  ✓ Unchanged, keeping partitions in: {dataset_dir}")
+                        record_group(manifest, group_id, headers, None, source_files, file_entries, source_files,
+                                     partition_paths)
+                        continue
+                    print(f"  Unchanged files skipped: {len(files) - len(to_write)}")
                 
-                # Create a descriptive filename based on the first file in the group
-                sample_name = Path(header_samples[headers]).stem
-                output_path = property_infos_dir / f"combined_{sample_name}_group{idx}.csv"
+                rows_written, bytes_written, added = write_group_partitions(
+                    to_write, dataset_dir, property_infos_dir, chunksize, executor, read_options, metrics,
+                    encodings
+                )
+                print(f"  ✓ Partitions written to: {dataset_dir}")
+                print(f"  ✓ Total rows: {rows_written}")
+                print(f"  ✓ Bytes written: {bytes_written}")
                 
+                if manifest is not None:
+                    written = {str(csv_file.relative_to(property_infos_dir)) for csv_file in to_write}
+                    loaded = [source_file for source_file in source_files
+                              if source_file not in written or source_file in added]
+                    record_group(manifest, group_id, headers, None, source_files, file_entries, loaded,
+                                 partition_paths)
+                continue
+            
+            # Files already in the output are kept; with nothing removed or changed in the
+            # group, new files are appended to it rather than the group rebuilt
+            kept = []
+            if (manifest is not None and group_id not in affected_groups and output_path.exists()
+                    and not any(source_file in changed_files - new_files for source_file in source_files)):
+                kept = [source_file for source_file in source_files if source_file not in new_files]
+            if kept and len(kept) == len(source_files):
+                print(f"  ✓ Unchanged, keeping: {output_path}")
+                record_group(manifest, group_id, headers, output_path.name, source_files, file_entries, source_files)
+                continue
+            append = bool(kept)
+            if append:
+                files = [csv_file for csv_file, source_file in zip(files, source_files) if source_file not in kept]
+                print(f"  Appending {len(files)} new files to: {output_path}")
+            
+            added = []
+            if streaming:
                 try:
-                    combined_df.to_csv(output_path, index=False, encoding='utf-8')
-                    print(f"  ✓ Combined CSV saved to: {output_path}")
-                    print(f"  ✓ Total rows: {len(combined_df)}")
+                    rows_written, bytes_written, added = stream_combine_group(
+                        headers, files, output_path, property_infos_dir, chunksize, executor, read_options,
+                        metrics, append, encodings
+                    )
+                    if rows_written or bytes_written:
+                        print(f"  ✓ Combined CSV saved to: {output_path}")
+                        print(f"  ✓ Total rows: {rows_written}")
+                        print(f"  ✓ Bytes written: {bytes_written}")
                 except Exception as e:
                     print(f"  ✗ Error saving combined file: {e}")
+            else:
+                all_dataframes = []
+                loaded = []
+                
+                file_keys = [str(csv_file.relative_to(property_infos_dir)) for csv_file in files]
+                results = map_files(executor, load_csv_file, files, file_keys,
+                                    file_read_options(read_options, file_keys, encodings))
+                for csv_file, source_file, (df, error, file_metrics) in zip(files, file_keys, results):
+                    metrics.record_file(file_metrics, output=output_path.name)
+                    if error is not None:
+                        print(f"  ✗ Error processing {csv_file.name}: {error}")
+                        continue
+                    all_dataframes.append(df)
+                    loaded.append(source_file)
+                    print(f"  ✓ Added: {csv_file.name}")
+                
+                if all_dataframes:
+                    # Combine all dataframes of this type
+                    combined_df = lvr_schema.concat_typed(all_dataframes)
+                    
+                    try:
+                        if append:
+                            combined_df.to_csv(output_path, mode='a', header=False, index=False, encoding='utf-8')
+                        else:
+                            combined_df.to_csv(output_path, index=False, encoding='utf-8')
+                        added = loaded
+                        print(f"  ✓ Combined CSV saved to: {output_path}")
+                        print(f"  ✓ Total rows: {len(combined_df)}")
+                    except Exception as e:
+                        print(f"  ✗ Error saving combined file: {e}")
+            
+            if manifest is not None:
+                record_group(manifest, group_id, headers, output_path.name, source_files, file_entries,
+                             kept + added)
+        
+        if manifest is not None:
+            metrics.begin_phase('manifest')
+            # Drop outputs of files and groups that no longer exist
+            current_groups = set(group_ids.values())
+            for source_file, entry in manifest.removed().items():
+                partition_path = dataset_dir / entry['output'] if output == 'parquet' and entry.get('output') else None
+                if partition_path is not None and partition_path.exists():
+                    partition_path.unlink()
+                    print(f"  ✓ Removed partition of deleted file: {partition_path}")
+                manifest.forget(source_file)
+            for group_id in list(manifest.groups):
+                if group_id in current_groups:
+                    continue
+                group_output = manifest.groups.pop(group_id)['output']
+                if group_output and (property_infos_dir / group_output).exists():
+                    (property_infos_dir / group_output).unlink()
+                    print(f"  ✓ Removed output of empty group: {group_output}")
+            manifest.save()
+            print(f"\nManifest saved to: {manifest.path}")
+        
+        if address_cache is not None:
+            # Lookups are the distinct addresses of each chunk; misses had to be normalized
+            lookups = sum(record.get('address_lookups', 0) for record in metrics.files)
+            misses = sum(record.get('address_misses', 0) for record in metrics.files)
+            metrics.count('address lookups', lookups)
+            metrics.count('address cache misses', misses)
+            hit_rate = (lookups - misses) / lookups if lookups else 0.0
+            print(f"\nAddress cache: {lookups} lookups, {hit_rate:.1%} hit rate, {misses} normalized "
+                  f"({address_cache})")
+        
+        # Price statistics per city/district/transaction type/quarter, kept up to date
+        # incrementally whether or not the combine itself ran incrementally
+        if cubes:
+            print("\n=== Phase 3: Updating Aggregate Cube ===")
+            metrics.begin_phase('cubes')
+            all_files = [csv_file for files in header_types.values() for csv_file in files]
+            update_aggregate_cubes(all_files, property_infos_dir, chunksize, executor, read_options, metrics,
+                                   encodings)
+        
+        # Keep the encodings this run found for the next one
+        source_files = {str(csv_file): str(csv_file.relative_to(property_infos_dir))
+                        for files in header_types.values() for csv_file in files}
+        for record in metrics.files:
+            if record['file'] in source_files and not record.get('error'):
+                registry.record_encoding(source_files[record['file']], record.get('encoding'))
+        registry.save()
+    
+    if executor is not None:
+        executor.shutdown()
+    metrics.end_phase()
     
     print("\n=== Process Complete ===")
     print(f"Total files processed: {total_files_processed}")
     print(f"Total files failed: {total_files_failed}")
     if problem_files:
         print(f"Files with inconsistent columns: {len(problem_files)}")
+    
+    metrics.count('files processed', total_files_processed)
+    metrics.count('files failed', total_files_failed)
+    metrics.stop_profiling()
+    if report:
+        report_path, files_path = metrics.write_report(report)
+        print(f"Run report saved to: {report_path} (files: {files_path})")
 
 if __name__ == "__main__":
-    analyze_and_combine_csv_files()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Analyze and combine LVR CSV files by header type")
+    parser.add_argument('--streaming', action='store_true',
+                        help="append each file in chunks instead of concatenating in memory")
+    parser.add_argument('--chunksize', type=int, default=100_000,
+                        help="rows per chunk in streaming mode (default: 100000)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="parse files in a pool of N processes (default: 1, serial)")
+    parser.add_argument('--output', choices=['csv', 'parquet'], default='csv',
+                        help="combined CSV per header group, or a Parquet dataset partitioned "
+                             "by city/trans_type/table/quarter (default: csv)")
+    parser.add_argument('--dataset-dir',
+                        help="where the Parquet dataset goes (default: property-infos/dataset)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only parse new or changed files and rebuild the outputs they affect, "
+                             "tracked in property-infos/manifest-<output>.json")
+    parser.add_argument('--prevalidate', action='store_true',
+                        help="scan each file's bytes first and send malformed files straight to the repair path "
+                             "(chunked reads - streaming, Parquet - always do)")
+    parser.add_argument('--typed', action='store_true',
+                        help="convert columns to the types of their schema (numbers, dates, categories) "
+                             "instead of keeping everything as text")
+    parser.add_argument('--property-infos', default="property-infos",
+                        help="folder holding the grouped transaction folders (default: property-infos)")
+    parser.add_argument('--analyze-only', action='store_true',
+                        help="only report the header groups, without combining anything")
+    parser.add_argument('--report',
+                        help="write a JSON run report (phase timings, one record per file) to this path, "
+                             "with the file records also as CSV next to it")
+    parser.add_argument('--profile',
+                        help="run under cProfile and dump the stats to this path (main process only)")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="trace allocations with tracemalloc and add the top sites to the report")
+    parser.add_argument('--cubes', action='store_true',
+                        help="also update the aggregate cube (price statistics per city/district/"
+                             "trans_type/quarter) in property-infos/cubes.sqlite and aggregates.csv")
+    parser.add_argument('--normalize-addresses', action='store_true',
+                        help="add a normalized_address column (full/half width, numerals, 臺/台 unified), "
+                             "cached across runs in property-infos/address-cache.sqlite")
+    parser.add_argument('--address-cache-size', type=int, default=200_000,
+                        help="addresses each process keeps in its in-memory LRU (default: 200000)")
+    args = parser.parse_args()
+    
+    analyze_and_combine_csv_files(streaming=args.streaming, chunksize=args.chunksize,
+                                  workers=args.workers, output=args.output,
+                                  dataset_dir=args.dataset_dir, incremental=args.incremental,
+                                  prevalidate=args.prevalidate, typed=args.typed, report=args.report,
+                                  profile=args.profile, trace_memory=args.trace_memory,
+                                  property_infos_dir=args.property_infos, analyze_only=args.analyze_only,
+                                  cubes=args.cubes, normalize_addresses=args.normalize_addresses,
+                                  address_cache_size=args.address_cache_size)
\ No newline at end of file
@@ -0,0 +1,183 @@
+import argparse
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+
+ADDRESS_COLUMN = '土地位置建物門牌'
+NORMALIZED_COLUMN = 'normalized_address'
+
+# Bump whenever the rules below change: a persistent cache written under another
+# version is cleared instead of serving addresses normalized the old way
+VERSION = 2
+
+# Zero is also written with the circles ○ and ◯, as in 一○五號
+CHINESE_DIGITS = {'〇': 0, '○': 0, '◯': 0, '零': 0, '一': 1, '二': 2, '兩': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7,
+                  '八': 8, '九': 9}
+CHINESE_UNITS = {'十': 10, '百': 100, '千': 1000}
+CHINESE_NUMERALS = ''.join(CHINESE_DIGITS) + ''.join(CHINESE_UNITS)
+CHINESE_NUMBER = f"[{CHINESE_NUMERALS}]+"
+
+# Parts of an address a number is counted in: section, lane, alley, number, floor, neighborhood
+ADDRESS_UNITS = '段巷弄號樓鄰'
+
+# (pattern, replacement) applied in order to whole columns of addresses
+RULES = [
+    (r'\s+', ''),
+    ('台', '臺'),
+    ('ㄧ', '一'),  # bopomofo yi typed for the numeral
+    ('衖', '弄'),
+    (rf'(?<=[\d{CHINESE_NUMERALS}])-(?=(?:\d+|{CHINESE_NUMBER})號)', '之'),  # 12-3號 -> 12之3號
+    (rf'{CHINESE_NUMBER}(?=[{ADDRESS_UNITS}之])', lambda m: str(chinese_number(m.group(0)))),
+    (rf'(?<=之){CHINESE_NUMBER}', lambda m: str(chinese_number(m.group(0)))),
+    (rf'(?<!\d)0+(?=\d+[{ADDRESS_UNITS}之])', ''),
+    (r'\d+鄰', ''),  # the neighborhood is administrative, the road and number locate the property
+]
+
+def chinese_number(text):
+    """Value of a Chinese numeral, positional (一百零五) or digit by digit (一○五)
+    Example: 二十三 -> 23, 十 -> 10, 一一四 -> 114
+    """
+    if not any(char in CHINESE_UNITS for char in text):
+        return int(''.join(str(CHINESE_DIGITS[char]) for char in text))
+
+    total = 0
+    digit = None
+    for char in text:
+        if char in CHINESE_DIGITS:
+            digit = CHINESE_DIGITS[char]
+        else:
+            total += (1 if digit is None else digit) * CHINESE_UNITS[char]
+            digit = None
+    return total + (digit or 0)
+
+def normalize_addresses(addresses):
+    """Normalize a Series of addresses with vectorized string transforms
+
+    Full-width characters become half-width (NFKC), 台 becomes 臺, Chinese numerals
+    counting sections, lanes, alleys, numbers and floors become digits without leading
+    zeros, and 12-3號 becomes 12之3號, so spellings of one address share one key.
+    Example: 台北市大安區忠孝東路四段１２３巷五弄０７號十二樓 -> 臺北市大安區忠孝東路4段123巷5弄7號12樓
+    """
+    addresses = addresses.astype(object).where(addresses.notna()).str.normalize('NFKC')
+    for pattern, replacement in RULES:
+        addresses = addresses.str.replace(pattern, replacement, regex=True)
+    return addresses
+
+class AddressNormalizer:
+    """Normalizes address columns chunk by chunk, each distinct raw address only once.
+
+    Normalized addresses are kept in a bounded LRU in memory and, with a cache_path, in
+    SQLite, so addresses repeated across quarters, runs and worker processes are looked
+    up rather than normalized again. stats counts the distinct addresses per chunk
+    (lookups) and where they were found.
+    """
+
+    def __init__(self, cache_path=None, max_entries=200_000):
+        self.max_entries = max_entries
+        self.memory = OrderedDict()
+        self.stats = {'lookups': 0, 'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        self.db = None
+        if cache_path:
+            # Worker processes share the cache file; waiting on each other's writes is fine
+            self.db = sqlite3.connect(cache_path, timeout=60)
+            self.db.execute("PRAGMA journal_mode = WAL")
+            self.db.execute("PRAGMA synchronous = OFF")
+            self.db.execute("CREATE TABLE IF NOT EXISTS addresses (raw TEXT PRIMARY KEY, normalized TEXT)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            found = self.db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if found is None or found[0] != str(VERSION):
+                self.db.execute("DELETE FROM addresses")
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(VERSION),))
+            self.db.commit()
+
+    def normalize(self, addresses):
+        """The normalized form of every address in a Series, NaN where there is none"""
+        raw = pd.unique(addresses.dropna().astype(str))
+        mapping = {}
+        missing = []
+        for address in raw:
+            normalized = self.memory.get(address)
+            if normalized is None:
+                missing.append(address)
+            else:
+                self.memory.move_to_end(address)
+                mapping[address] = normalized
+        self.stats['lookups'] += len(raw)
+        self.stats['memory_hits'] += len(raw) - len(missing)
+
+        if missing and self.db is not None:
+            found = dict(self._read_cache(missing))
+            self.stats['disk_hits'] += len(found)
+            mapping.update(found)
+            missing = [address for address in missing if address not in found]
+
+        if missing:
+            normalized = normalize_addresses(pd.Series(missing, dtype=object)).tolist()
+            fresh = dict(zip(missing, normalized))
+            self.stats['misses'] += len(fresh)
+            mapping.update(fresh)
+            if self.db is not None:
+                self.db.executemany("INSERT OR IGNORE INTO addresses VALUES (?, ?)", fresh.items())
+                self.db.commit()
+
+        for address in raw:
+            self.memory[address] = mapping[address]
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+        return addresses.astype(object).map(mapping)
+
+    def _read_cache(self, addresses):
+        """(raw, normalized) of the given addresses found in the persistent cache, in one query"""
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS lookup (raw TEXT PRIMARY KEY)")
+        self.db.execute("DELETE FROM lookup")
+        self.db.executemany("INSERT OR IGNORE INTO lookup VALUES (?)", ((address,) for address in addresses))
+        found = self.db.execute("SELECT a.raw, a.normalized FROM lookup l JOIN addresses a ON a.raw = l.raw").fetchall()
+        # End the read transaction: a snapshot kept open could not be upgraded to write
+        # once another process has written, and the insert would fail instead of waiting
+        self.db.commit()
+        return found
+
+    def hit_rate(self):
+        """Share of lookups answered from the memory or disk cache"""
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        return hits / self.stats['lookups'] if self.stats['lookups'] else 0.0
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+_normalizers = {}
+
+def get_normalizer(cache_path=None, max_entries=200_000):
+    """This process's normalizer for a cache file, opened on first use"""
+    key = (str(cache_path) if cache_path else None, max_entries)
+    if key not in _normalizers:
+        _normalizers[key] = AddressNormalizer(cache_path, max_entries)
+    return _normalizers[key]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalize the addresses of LVR CSV files and report cache hit rates")
+    parser.add_argument('files', nargs='+', type=Path, help="main table CSVs (x_lvr_land_a.csv ...)")
+    parser.add_argument('--cache', type=Path, help="persistent cache (SQLite) shared between runs")
+    parser.add_argument('--max-entries', type=int, default=200_000,
+                        help="addresses kept in the in-memory LRU (default: 200000)")
+    parser.add_argument('--chunksize', type=int, default=100_000, help="rows per chunk (default: 100000)")
+    args = parser.parse_args()
+
+    normalizer = AddressNormalizer(args.cache, args.max_entries)
+    changed = 0
+    for path in args.files:
+        for chunk in pd.read_csv(path, dtype=str, usecols=[ADDRESS_COLUMN], chunksize=args.chunksize):
+            normalized = normalizer.normalize(chunk[ADDRESS_COLUMN])
+            changed += int((normalized != chunk[ADDRESS_COLUMN]).sum())
+    normalizer.close()
+
+    stats = normalizer.stats
+    print(f"{stats['lookups']} distinct addresses per chunk looked up, {changed} rows changed by normalization")
+    print(f"Hit rate: {normalizer.hit_rate():.1%} (memory {stats['memory_hits']}, disk {stats['disk_hits']}, "
+          f"normalized {stats['misses']})")
@@ -0,0 +1,292 @@
+import argparse
+import math
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import lvr_schema
+
+# Cube cells: one per city, district, transaction type and quarter
+KEYS = ['city', 'district', 'trans_type', 'quarter']
+DISTRICT_COLUMN = '鄉鎮市區'
+SERIAL_COLUMN = '編號'
+
+SQUARE_METERS_PER_PING = 3.305785
+
+# Measure -> (column per transaction type, factor applied to the column's values)
+MEASURES = {
+    'total_price': ({'a': '總價元', 'b': '總價元', 'c': '總額元'}, 1.0),
+    'unit_price_ping': ({'a': '單價元平方公尺', 'b': '單價元平方公尺', 'c': '單價元平方公尺'}, SQUARE_METERS_PER_PING),
+    'building_area_m2': ({'a': '建物移轉總面積平方公尺', 'b': '建物移轉總面積平方公尺', 'c': '建物總面積平方公尺'}, 1.0),
+}
+
+QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+# Quantile sketches are log-spaced histograms (as in DDSketch): a value v > 0 falls in
+# bucket ceil(log(v) / log(GAMMA)), so any quantile read back is within RELATIVE_ACCURACY
+# of a true sample value. Two sketches merge by adding their bucket counts.
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+ZERO_BUCKET = -(1 << 31)  # zeros (and anything not positive)
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cells (
+    source_file TEXT, city TEXT, district TEXT, trans_type TEXT, quarter TEXT, transactions INTEGER
+);
+CREATE TABLE IF NOT EXISTS measures (
+    source_file TEXT, city TEXT, district TEXT, trans_type TEXT, quarter TEXT, measure TEXT,
+    count INTEGER, sum REAL, min REAL, max REAL
+);
+CREATE TABLE IF NOT EXISTS sketches (
+    source_file TEXT, city TEXT, district TEXT, trans_type TEXT, quarter TEXT, measure TEXT,
+    bucket INTEGER, count INTEGER
+);
+CREATE INDEX IF NOT EXISTS cells_source ON cells (source_file);
+CREATE INDEX IF NOT EXISTS measures_source ON measures (source_file);
+CREATE INDEX IF NOT EXISTS sketches_source ON sketches (source_file);
+CREATE INDEX IF NOT EXISTS cells_partition ON cells (city, trans_type, quarter);
+CREATE INDEX IF NOT EXISTS measures_partition ON measures (city, trans_type, quarter);
+CREATE INDEX IF NOT EXISTS sketches_partition ON sketches (city, trans_type, quarter);
+"""
+
+def bucket_of(values):
+    """Sketch bucket of every value"""
+    values = np.asarray(values, dtype='float64')
+    positive = values > 0
+    buckets = np.full(len(values), ZERO_BUCKET, dtype=np.int64)
+    buckets[positive] = np.ceil(np.log(values[positive]) / math.log(GAMMA)).astype(np.int64)
+    return buckets
+
+def bucket_value(buckets):
+    """Value a bucket stands for: the middle of its range in relative terms"""
+    buckets = np.asarray(buckets, dtype=np.int64)
+    values = 2 * np.power(GAMMA, buckets.astype('float64')) / (GAMMA + 1)
+    return np.where(buckets == ZERO_BUCKET, 0.0, values)
+
+def numeric(column):
+    """Numbers of a text or typed column; thousands separators are dropped, the rest is NaN"""
+    if column.dtype == object or isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype(object).where(column.notna()).astype(str).str.replace(',', '', regex=False)
+    return pd.to_numeric(column, errors='coerce').astype('float64')
+
+def chunk_summaries(chunk, file_name):
+    """Cell counts, measure sums and sketch buckets of one chunk of a main table, or None
+
+    Returns {'cells', 'measures', 'sketches'} DataFrames keyed by KEYS; each is a partial
+    that adds up with the partials of the file's other chunks.
+    """
+    keys = lvr_schema.file_keys(file_name)
+    if keys is None or keys['table'] != 'main' or keys['quarter'] is None:
+        return None
+
+    if SERIAL_COLUMN in chunk.columns:
+        serial = chunk[SERIAL_COLUMN].astype(object).where(chunk[SERIAL_COLUMN].notna(), '').astype(str)
+        chunk = chunk[serial.str.strip().str.lower() != lvr_schema.ENGLISH_HEADER_SERIAL]
+    district = (chunk[DISTRICT_COLUMN].astype(object).where(chunk[DISTRICT_COLUMN].notna(), '')
+                if DISTRICT_COLUMN in chunk.columns else pd.Series('', index=chunk.index))
+    district = district.astype(str).str.strip()
+
+    cells = district.value_counts().rename('transactions').rename_axis('district').reset_index()
+    measures = []
+    sketches = []
+    for measure, (columns, factor) in MEASURES.items():
+        column = columns.get(keys['trans_type'])
+        if column not in chunk.columns:
+            continue
+        values = numeric(chunk[column]) * factor
+        present = values.notna()
+        frame = pd.DataFrame({'district': district[present], 'value': values[present]})
+        if frame.empty:
+            continue
+
+        stats = frame.groupby('district')['value'].agg(['count', 'sum', 'min', 'max']).reset_index()
+        stats.insert(1, 'measure', measure)
+        measures.append(stats)
+
+        frame['bucket'] = bucket_of(frame['value'].to_numpy())
+        buckets = frame.groupby(['district', 'bucket']).size().rename('count').reset_index()
+        buckets.insert(1, 'measure', measure)
+        sketches.append(buckets)
+
+    summaries = {
+        'cells': cells,
+        'measures': pd.concat(measures, ignore_index=True) if measures else None,
+        'sketches': pd.concat(sketches, ignore_index=True) if sketches else None,
+    }
+    for name, df in summaries.items():
+        if df is None:
+            continue
+        for key in ['city', 'trans_type', 'quarter']:
+            df.insert(0, key, keys[key])
+    return summaries
+
+def merge_summaries(parts):
+    """Add up the partial summaries of several chunks (or files) into one"""
+    parts = [part for part in parts if part is not None]
+    if not parts:
+        return None
+
+    def merged(name, group_by, aggregations):
+        frames = [part[name] for part in parts if part[name] is not None]
+        if not frames:
+            return None
+        return pd.concat(frames, ignore_index=True).groupby(group_by, sort=False).agg(aggregations).reset_index()
+
+    return {
+        'cells': merged('cells', KEYS, {'transactions': 'sum'}),
+        'measures': merged('measures', KEYS + ['measure'], {'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'}),
+        'sketches': merged('sketches', KEYS + ['measure', 'bucket'], {'count': 'sum'}),
+    }
+
+def sketch_quantiles(sketches, group_by, quantiles=QUANTILES):
+    """Quantiles per group from merged sketch buckets: one column p10, p25, ... per quantile"""
+    sketches = sketches.groupby(group_by + ['bucket'], sort=False)['count'].sum().reset_index()
+    sketches = sketches.sort_values(group_by + ['bucket'], kind='stable')
+    grouped = sketches.groupby(group_by, sort=False)['count']
+    cumulative = grouped.cumsum()
+    total = grouped.transform('sum')
+
+    result = None
+    for q in quantiles:
+        # First bucket whose running count passes the rank of the quantile
+        hit = sketches[cumulative > q * (total - 1)]
+        first = hit.groupby(group_by, sort=False)['bucket'].first()
+        column = pd.Series(bucket_value(first.to_numpy()), index=first.index, name=f"p{round(q * 100)}")
+        result = column.to_frame() if result is None else result.join(column)
+    return result.reset_index()
+
+def cube_table(cells, measures, sketches, group_by=KEYS):
+    """Wide cube at the grain of group_by: transactions, then per measure count, sum, mean,
+    min, max and the sketch quantiles"""
+    table = cells.groupby(group_by, sort=False)['transactions'].sum().reset_index()
+    if measures is None or measures.empty:
+        return table
+
+    stats = measures.groupby(group_by + ['measure'], sort=False).agg(
+        {'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'}).reset_index()
+    stats['mean'] = stats['sum'] / stats['count']
+    stats = stats.merge(sketch_quantiles(sketches, group_by + ['measure']), on=group_by + ['measure'], how='left')
+    for measure in MEASURES:
+        part = stats[stats['measure'] == measure].drop(columns='measure')
+        part = part.rename(columns={col: f"{measure}_{col}" for col in part.columns if col not in group_by})
+        table = table.merge(part, on=group_by, how='left')
+    return table.sort_values(group_by, kind='stable').reset_index(drop=True)
+
+class CubeStore:
+    """Per-source-file summaries in SQLite, plus the cube materialized from them.
+
+    Each main table file contributes the cells of its own city, transaction type and
+    quarter, so a new or changed file only replaces its own rows and only its
+    partition's cells are materialized again.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.db = sqlite3.connect(self.path)
+        self.db.executescript(STORE_SCHEMA)
+
+    def sources(self):
+        return {row[0] for row in self.db.execute("SELECT DISTINCT source_file FROM cells")}
+
+    def partitions_of(self, source_files):
+        """(city, trans_type, quarter) of the given source files' rows"""
+        source_files = list(source_files)
+        if not source_files:
+            return set()
+        marks = ','.join('?' * len(source_files))
+        return set(self.db.execute(f"SELECT DISTINCT city, trans_type, quarter FROM cells "
+                                   f"WHERE source_file IN ({marks})", source_files))
+
+    def remove(self, source_file):
+        for table in ['cells', 'measures', 'sketches']:
+            self.db.execute(f"DELETE FROM {table} WHERE source_file = ?", (source_file,))
+
+    def replace(self, source_file, summaries):
+        """Swap a file's summaries for new ones"""
+        self.remove(source_file)
+        if summaries is None:
+            return
+        for table, df in summaries.items():
+            if df is not None and not df.empty:
+                df = df.assign(source_file=source_file)
+                df.to_sql(table, self.db, if_exists='append', index=False)
+
+    def read(self, table, partitions=None):
+        """A summary table, optionally only the rows of some (city, trans_type, quarter) partitions
+
+        The partitions are joined in from a temp table, so only their rows are read, through
+        the table's partition index.
+        """
+        if partitions is None:
+            return pd.read_sql_query(f"SELECT * FROM {table}", self.db).drop(columns='source_file')
+
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS wanted ("
+                        "city TEXT, trans_type TEXT, quarter TEXT, PRIMARY KEY (city, trans_type, quarter))")
+        self.db.execute("DELETE FROM wanted")
+        self.db.executemany("INSERT OR IGNORE INTO wanted VALUES (?, ?, ?)", list(partitions))
+        # CROSS JOIN keeps wanted the outer loop, so the table is searched by partition, not scanned
+        df = pd.read_sql_query(
+            f"SELECT t.* FROM wanted w CROSS JOIN {table} t "
+            f"ON t.city = w.city AND t.trans_type = w.trans_type AND t.quarter IS w.quarter "
+            f"ORDER BY t.rowid", self.db)
+        return df.drop(columns='source_file')
+
+    def materialize(self, partitions=None):
+        """Rebuild the cube rows of the given partitions (all when None) in the cube table"""
+        cells = self.read('cells', partitions)
+        measures = self.read('measures', partitions)
+        sketches = self.read('sketches', partitions)
+        cube = cube_table(cells, measures, sketches) if not cells.empty else None
+
+        exists = self.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'cube'").fetchone()
+        if exists and partitions is None:
+            self.db.execute("DELETE FROM cube")
+        elif exists:
+            self.db.executemany("DELETE FROM cube WHERE city = ? AND trans_type = ? AND quarter = ?",
+                                list(partitions))
+        if cube is not None:
+            if exists:
+                # Measures a partition lacks are NULL; columns new to the table are added
+                columns = {row[1] for row in self.db.execute("PRAGMA table_info(cube)")}
+                for col in cube.columns:
+                    if col not in columns:
+                        self.db.execute(f'ALTER TABLE cube ADD COLUMN "{col}"')
+            cube.to_sql('cube', self.db, if_exists='append', index=False)
+        self.db.commit()
+
+    def cube(self, group_by=None):
+        """The cube at full grain, or rolled up to group_by (e.g. ['city', 'quarter']) by merging
+        the summaries, never the cube's own quantiles"""
+        if group_by is None or list(group_by) == KEYS:
+            exists = self.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'cube'").fetchone()
+            if not exists:
+                return pd.DataFrame(columns=KEYS)
+            return pd.read_sql_query("SELECT * FROM cube", self.db).sort_values(KEYS, kind='stable',
+                                                                                   ignore_index=True)
+        return cube_table(self.read('cells'), self.read('measures'), self.read('sketches'), list(group_by))
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the aggregate cube kept by the processor (--cubes)")
+    parser.add_argument('--store', type=Path, default=Path("property-infos/cubes.sqlite"),
+                        help="cube store (default: property-infos/cubes.sqlite)")
+    parser.add_argument('--by', nargs='+', choices=KEYS,
+                        help="roll up to these keys (default: city district trans_type quarter)")
+    parser.add_argument('--output', type=Path, help="CSV to write (default: print)")
+    args = parser.parse_args()
+
+    store = CubeStore(args.store)
+    try:
+        cube = store.cube(args.by)
+    finally:
+        store.close()
+    if args.output:
+        cube.to_csv(args.output, index=False, encoding='utf-8')
+        print(f"Wrote {len(cube)} cells to {args.output}")
+    else:
+        print(cube.to_string(index=False))
@@ -0,0 +1,179 @@
+import argparse
+import csv
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import synthetic_lvr
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+GROUPER_SCRIPT = SCRIPT_DIR / "rawdata-grouper.py"
+PROCESSOR_SCRIPT = SCRIPT_DIR / "[archived]rawdata-processor.py"
+TRANSACTION_FOLDERS = ['property-sales', 'pre-construction-sales', 'property-rentals']
+
+# Runs one function of a script in a fresh interpreter so every stage starts cold, then
+# writes its peak RSS. On Linux that is VmHWM: ru_maxrss of an exec'd child still
+# carries the high-water mark of the process it was forked from.
+# The module is registered as 'stage' and workers are forked, so functions sent to a
+# process pool unpickle in the workers.
+STAGE_RUNNER = """
+import importlib.util, json, multiprocessing, resource, sys
+sys.path.insert(0, sys.argv[1])
+multiprocessing.set_start_method('fork')
+try:
+    spec = importlib.util.spec_from_file_location('stage', sys.argv[2])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['stage'] = module
+    spec.loader.exec_module(module)
+    getattr(module, sys.argv[3])(*json.loads(sys.argv[4]), **json.loads(sys.argv[5]))
+finally:
+    try:
+        with open('/proc/self/status') as f:
+            peak = next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmHWM:'))
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak if sys.platform == 'darwin' else peak * 1024
+    with open(sys.argv[6], 'w') as f:
+        f.write(str(peak))
+"""
+
+RESULT_FIELDS = ['timestamp', 'commit', 'stage', 'rows_per_file', 'files', 'rows', 'input_mb',
+                 'wall_s', 'peak_rss_mb', 'rows_per_s', 'options', 'exit_code']
+
+def run_stage(script, function, args, kwargs, cwd, log_path):
+    """Run script's function in a child process; returns (wall seconds, peak RSS bytes, exit code)
+
+    Peak RSS is the child's own; worker processes it starts are not counted.
+    """
+    peak_path = Path(log_path).with_suffix('.peak')
+    command = [sys.executable, '-c', STAGE_RUNNER, str(SCRIPT_DIR), str(script), function,
+               json.dumps(args), json.dumps(kwargs), str(peak_path.resolve())]
+    with open(log_path, 'w', encoding='utf-8') as log:
+        start = time.perf_counter()
+        proc = subprocess.run(command, cwd=cwd, stdin=subprocess.DEVNULL, stdout=log,
+                              stderr=subprocess.STDOUT)
+        elapsed = time.perf_counter() - start
+
+    peak_rss = int(peak_path.read_text()) if peak_path.exists() else 0
+    peak_path.unlink(missing_ok=True)
+    return elapsed, peak_rss, proc.returncode
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+def benchmark_scale(work_dir, rows_per_file, quarters, cities, processor_options, malformed_rate, seed):
+    """Generate one tree, then time the grouper and the processor on it. Returns a result row per stage."""
+    scale_dir = Path(work_dir) / f"rows-{rows_per_file}"
+    if scale_dir.exists():
+        shutil.rmtree(scale_dir)
+    raw_dir = scale_dir / "raw"
+
+    print(f"\n=== Scale: {rows_per_file} rows per main file ===")
+    stats = synthetic_lvr.generate_tree(raw_dir, quarters, rows_per_file, cities=cities,
+                                        malformed_rate=malformed_rate, seed=seed)
+    input_mb = stats['bytes'] / (1024 * 1024)
+    print(f"Generated {stats['files']} files, {stats['rows']} rows, {input_mb:.2f} MB")
+
+    results = []
+    stages = [
+        ('organize_files', GROUPER_SCRIPT, [str(raw_dir)], {}),
+        ('analyze_and_combine_csv_files', PROCESSOR_SCRIPT, [], processor_options),
+    ]
+    for function, script, args, kwargs in stages:
+        if function == 'analyze_and_combine_csv_files':
+            # The processor reads the grouped folders from ./property-infos
+            property_infos_dir = scale_dir / "property-infos"
+            property_infos_dir.mkdir()
+            for folder in TRANSACTION_FOLDERS:
+                if (raw_dir / folder).exists():
+                    (raw_dir / folder).rename(property_infos_dir / folder)
+
+        log_path = scale_dir / f"{function}.log"
+        elapsed, peak_rss, exit_code = run_stage(script, function, args, kwargs, scale_dir, log_path)
+        results.append({
+            'stage': function,
+            'rows_per_file': rows_per_file,
+            'files': stats['files'],
+            'rows': stats['rows'],
+            'input_mb': round(input_mb, 2),
+            'wall_s': round(elapsed, 3),
+            'peak_rss_mb': round(peak_rss / (1024 * 1024), 1),
+            'rows_per_s': round(stats['rows'] / elapsed),
+            'options': json.dumps(kwargs, sort_keys=True),
+            'exit_code': exit_code,
+        })
+        status = "✓" if exit_code == 0 else f"✗ exit code {exit_code}, see {log_path}"
+        print(f"  {status} {function}: {elapsed:.2f}s, peak RSS {peak_rss / (1024 * 1024):.1f} MB, "
+              f"{stats['rows'] / elapsed:,.0f} rows/s")
+
+    return results
+
+def save_results(results_path, results):
+    """Append result rows to a CSV so runs from different commits can be compared"""
+    results_path = Path(results_path)
+    new_file = not results_path.exists()
+    with open(results_path, 'a', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        if new_file:
+            writer.writeheader()
+        writer.writerows(results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the grouper and processor on synthetic LVR trees")
+    parser.add_argument('--scales', type=int, nargs='+', default=[100, 1000, 10000],
+                        help="rows per main file for each run (default: 100 1000 10000)")
+    parser.add_argument('--quarters', type=int, default=2, help="quarters per tree (default: 2)")
+    parser.add_argument('--cities', nargs='+', choices=list(synthetic_lvr.CITIES),
+                        help="only these city codes (default: all 22)")
+    parser.add_argument('--malformed-rate', type=float, default=0.001,
+                        help="share of broken data rows (default: 0.001)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', type=Path, help="where the trees are generated (default: a temporary folder)")
+    parser.add_argument('--keep', action='store_true', help="keep the generated trees and outputs")
+    parser.add_argument('--results', type=Path, default=Path("benchmark-results.csv"),
+                        help="CSV the results are appended to (default: benchmark-results.csv)")
+    parser.add_argument('--streaming', action='store_true', help="run the processor with streaming=True")
+    parser.add_argument('--chunksize', type=int, default=100_000, help="processor chunksize (default: 100000)")
+    parser.add_argument('--workers', type=int, default=1, help="processor workers (default: 1)")
+    parser.add_argument('--output', choices=['csv', 'parquet'], default='csv', help="processor output (default: csv)")
+    args = parser.parse_args()
+
+    processor_options = {'streaming': args.streaming, 'chunksize': args.chunksize,
+                         'workers': args.workers, 'output': args.output}
+    work_dir = args.work_dir or Path(tempfile.mkdtemp(prefix="lvr-benchmark-"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    quarters = synthetic_lvr.quarter_range('2020Q3', args.quarters)
+
+    timestamp = datetime.now().isoformat(timespec='seconds')
+    commit = current_commit()
+    all_results = []
+    try:
+        for rows_per_file in args.scales:
+            results = benchmark_scale(work_dir, rows_per_file, quarters, args.cities, processor_options,
+                                      args.malformed_rate, args.seed)
+            for result in results:
+                result.update(timestamp=timestamp, commit=commit)
+            all_results.extend(results)
+            if not args.keep:
+                shutil.rmtree(work_dir / f"rows-{rows_per_file}")
+    finally:
+        if all_results:
+            save_results(args.results, all_results)
+        if not args.keep and args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("\n=== Benchmark Results ===")
+    print(f"{'stage':<32}{'rows':>10}{'wall s':>10}{'peak MB':>10}{'rows/s':>12}")
+    for result in all_results:
+        print(f"{result['stage']:<32}{result['rows']:>10}{result['wall_s']:>10.2f}"
+              f"{result['peak_rss_mb']:>10.1f}{result['rows_per_s']:>12,}")
+    print(f"\nResults appended to: {args.results}")
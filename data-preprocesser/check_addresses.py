@@ -0,0 +1,96 @@
+import argparse
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+import address_normalizer
+
+# (raw, normalized) spellings of addresses as they appear in the released files
+CASES = [
+    ('桃園市中壢區環中東路二段一○五號', '桃園市中壢區環中東路2段105號'),
+    ('二段一○五號', '2段105號'),
+    ('二段一◯五號', '2段105號'),
+    ('二段一〇五號', '2段105號'),
+    ('二段一百零五號', '2段105號'),
+    ('台北市大安區忠孝東路四段１２３巷五弄０７號十二樓', '臺北市大安區忠孝東路4段123巷5弄7號12樓'),
+    ('新北市板橋區文化路一段12-3號', '新北市板橋區文化路1段12之3號'),
+    ('臺中市西屯區十二鄰市政路五○○號', '臺中市西屯區市政路500號'),
+]
+
+def check_chinese_numbers():
+    for text, value in [('二十三', 23), ('十', 10), ('一一四', 114), ('一○五', 105), ('一◯五', 105),
+                        ('五○○', 500), ('一百零五', 105)]:
+        assert address_normalizer.chinese_number(text) == value, (text, address_normalizer.chinese_number(text))
+
+def check_normalize_addresses():
+    raw, expected = zip(*CASES)
+    normalized = address_normalizer.normalize_addresses(pd.Series(raw)).tolist()
+    wrong = [(r, n, e) for r, n, e in zip(raw, normalized, expected) if n != e]
+    assert not wrong, wrong
+
+def check_missing_addresses():
+    normalized = address_normalizer.normalize_addresses(pd.Series(['二段一○五號', None], dtype=object))
+    assert normalized[0] == '2段105號' and pd.isna(normalized[1]), normalized.tolist()
+
+def check_cache(cache_dir):
+    cache_path = cache_dir / 'addresses.sqlite'
+    raw = pd.Series([raw for raw, _ in CASES])
+    first = address_normalizer.AddressNormalizer(cache_path)
+    first.normalize(raw)
+    first.close()
+    second = address_normalizer.AddressNormalizer(cache_path)
+    normalized = second.normalize(raw).tolist()
+    second.close()
+    assert normalized == [expected for _, expected in CASES], normalized
+    assert second.stats['disk_hits'] == len(CASES) and second.stats['misses'] == 0, second.stats
+
+def check_stale_cache(cache_dir):
+    # A cache written under another version of the rules is cleared, not served
+    cache_path = cache_dir / 'addresses.sqlite'
+    address_normalizer.AddressNormalizer(cache_path).close()
+    db = sqlite3.connect(cache_path)
+    db.execute("UPDATE meta SET value = '0' WHERE key = 'version'")
+    db.execute("INSERT INTO addresses VALUES ('二段一○五號', '2段一○5號')")
+    db.commit()
+    db.close()
+    normalizer = address_normalizer.AddressNormalizer(cache_path)
+    normalized = normalizer.normalize(pd.Series(['二段一○五號'])).tolist()
+    normalizer.close()
+    assert normalized == ['2段105號'] and normalizer.stats['misses'] == 1, (normalized, normalizer.stats)
+
+CHECKS = [check_chinese_numbers, check_normalize_addresses, check_missing_addresses, check_cache, check_stale_cache]
+
+def run_checks(names=None):
+    """Run the checks, each with a fresh temporary folder for its cache. Returns the failures."""
+    failures = []
+    for check in CHECKS:
+        if names and check.__name__ not in names:
+            continue
+        try:
+            with tempfile.TemporaryDirectory(prefix="lvr-address-check-") as cache_dir:
+                if check.__code__.co_argcount:
+                    check(Path(cache_dir))
+                else:
+                    check()
+            print(f"  ✓ {check.__name__}")
+        except Exception as e:
+            failures.append(check.__name__)
+            print(f"  ✗ {check.__name__}: {type(e).__name__}: {e}")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check address_normalizer's rules and cache on known spellings")
+    parser.add_argument('checks', nargs='*',
+                        help=f"only these checks (default: all): {', '.join(check.__name__ for check in CHECKS)}")
+    args = parser.parse_args()
+    unknown = set(args.checks) - {check.__name__ for check in CHECKS}
+    if unknown:
+        parser.error(f"unknown checks: {', '.join(sorted(unknown))}")
+
+    print("=== Address normalizer checks ===")
+    failures = run_checks(args.checks)
+    print(f"\n{len(failures)} failed" if failures else "\nAll checks passed")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,218 @@
+import argparse
+import io
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import zipfile
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import download_engine
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    """Serves server.files[name] at /<name>.zip the way the open data site does: Range
+    requests get a 206 from the asked offset, or a 416 with the full size past the end.
+
+    server.drops[name] bytes are sent of the next full answer for name before the
+    connection is cut, server.ignore_range answers every request with a 200, and every
+    request is logged to server.log as (name, range offset or None, status).
+    """
+
+    def do_GET(self):
+        name = self.path.lstrip('/').removesuffix('.zip')
+        data = self.server.files.get(name)
+        if data is None:
+            self.send_error(404)
+            self.server.log.append((name, None, 404))
+            return
+
+        offset = None
+        range_header = self.headers.get('Range')
+        if range_header and not self.server.ignore_range:
+            offset = int(range_header.removeprefix('bytes=').split('-')[0])
+        if offset is not None and offset >= len(data):
+            self.send_response(416)
+            self.send_header('Content-Range', f"bytes */{len(data)}")
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            self.server.log.append((name, offset, 416))
+            return
+
+        status = 206 if offset is not None else 200
+        body = data[offset or 0:]
+        self.send_response(status)
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {offset}-{len(data) - 1}/{len(data)}")
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.server.log.append((name, offset, status))
+
+        drop = self.server.drops.pop(name, None)
+        if drop is None:
+            self.wfile.write(body)
+            return
+        # Cut the connection mid-transfer, as a flaky link would
+        self.wfile.write(body[:drop])
+        self.wfile.flush()
+        self.connection.shutdown(socket.SHUT_RDWR)
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ArchiveHandler)
+    server.files = {}
+    server.drops = {}
+    server.ignore_range = False
+    server.log = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def make_archive(size=300_000, seed=0):
+    """A zip of one stored member, so its bytes are the member's and a flipped byte breaks its CRC"""
+    content = (bytes(range(seed, 251)) + bytes(range(seed))) * (size // 251 + 1)
+    content = content[:size]
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        archive.writestr('rawdata/a_lvr_land_a.csv', content)
+    return buffer.getvalue()
+
+def fetch(server, season, download_dir, checksums=None):
+    """download_engine.download_season against the local server, under the season's own name"""
+    session = download_engine.make_session(pool_size=1, retries=0)
+    url_template = f"http://127.0.0.1:{server.server_port}/{{season}}.zip"
+    return download_engine.download_season(session, season, download_dir, url_template, name=season,
+                                           checksums=checksums)
+
+def part_path(download_dir, season):
+    path = download_engine.archive_path(download_dir, season)
+    return path.with_name(path.name + '.part')
+
+def check_download(server, download_dir):
+    server.files['plain'] = make_archive()
+    result = fetch(server, 'plain', download_dir)
+    assert result['status'] == 'downloaded', result
+    assert Path(result['path']).read_bytes() == server.files['plain']
+    assert result['sha256'] == download_engine.file_sha256(result['path'])
+
+def check_resume_after_drop(server, download_dir):
+    # Blocks of the download_file chunk size reach the part file whole, so the cut comes
+    # after the first one and the retry asks for the rest from its end
+    server.files['dropped'] = make_archive(size=3 << 20, seed=1)
+    server.drops['dropped'] = 3 << 19
+    result = fetch(server, 'dropped', download_dir)
+    assert result['status'] == 'downloaded', result
+    assert Path(result['path']).read_bytes() == server.files['dropped']
+    assert server.log == [('dropped', None, 200), ('dropped', 1 << 20, 206)], server.log
+
+def check_resume_part_file(server, download_dir):
+    data = server.files['partial'] = make_archive(seed=2)
+    part_path(download_dir, 'partial').write_bytes(data[:123_456])
+    result = fetch(server, 'partial', download_dir)
+    assert result['status'] == 'downloaded' and result['resumed_from'] == 123_456, result
+    assert Path(result['path']).read_bytes() == data
+    assert server.log == [('partial', 123_456, 206)], server.log
+
+def check_complete_part_416(server, download_dir):
+    data = server.files['complete'] = make_archive(seed=3)
+    part_path(download_dir, 'complete').write_bytes(data)
+    result = fetch(server, 'complete', download_dir)
+    assert result['status'] == 'downloaded', result
+    assert Path(result['path']).read_bytes() == data
+    assert server.log == [('complete', len(data), 416)], server.log
+
+def check_stale_part_416(server, download_dir):
+    data = server.files['stale'] = make_archive(seed=4)
+    part_path(download_dir, 'stale').write_bytes(b'x' * (len(data) + 10))
+    result = fetch(server, 'stale', download_dir)
+    assert result['status'] == 'downloaded', result
+    assert Path(result['path']).read_bytes() == data
+    assert server.log == [('stale', len(data) + 10, 416), ('stale', None, 200)], server.log
+
+def check_range_ignored(server, download_dir):
+    data = server.files['norange'] = make_archive(seed=5)
+    part_path(download_dir, 'norange').write_bytes(b'junk')
+    server.ignore_range = True
+    result = fetch(server, 'norange', download_dir)
+    assert result['status'] == 'downloaded', result
+    assert Path(result['path']).read_bytes() == data
+
+def check_checksum_mismatch(server, download_dir):
+    server.files['badsum'] = make_archive(seed=6)
+    name = download_engine.archive_path(download_dir, 'badsum').name
+    result = fetch(server, 'badsum', download_dir, checksums={name: '0' * 64})
+    assert result['status'] == 'failed' and 'sha256' in result['error'], result
+    assert not Path(result['path']).exists() and not part_path(download_dir, 'badsum').exists()
+
+def check_not_a_zip(server, download_dir):
+    server.files['notzip'] = b'<html>Service unavailable</html>' * 100
+    result = fetch(server, 'notzip', download_dir)
+    assert result['status'] == 'failed' and 'not a zip archive' in result['error'], result
+    assert not part_path(download_dir, 'notzip').exists()
+
+def check_crc_mismatch(server, download_dir):
+    data = bytearray(make_archive(seed=7))
+    data[len(data) // 2] ^= 0xFF
+    server.files['badcrc'] = bytes(data)
+    result = fetch(server, 'badcrc', download_dir)
+    assert result['status'] == 'failed' and 'CRC mismatch' in result['error'], result
+
+def check_existing_archive(server, download_dir):
+    server.files['again'] = make_archive(seed=8)
+    assert fetch(server, 'again', download_dir)['status'] == 'downloaded'
+    result = fetch(server, 'again', download_dir)
+    assert result['status'] == 'exists', result
+    assert len(server.log) == 1, server.log
+
+def check_current_period(server, download_dir):
+    data = server.files['current'] = make_archive(seed=9)
+    results = download_engine.download_seasons(
+        [download_engine.CURRENT_SEASON], download_dir, workers=1,
+        url_template=f"http://127.0.0.1:{server.server_port}/current.zip",
+        names={download_engine.CURRENT_SEASON: download_engine.current_name()})
+    expected = download_engine.archive_path(download_dir, f"本期{date.today():%Y%m%d}")
+    assert results[0]['status'] == 'downloaded' and results[0]['path'] == str(expected), results
+    assert expected.read_bytes() == data
+
+CHECKS = [check_download, check_resume_after_drop, check_resume_part_file, check_complete_part_416,
+          check_stale_part_416, check_range_ignored, check_checksum_mismatch, check_not_a_zip,
+          check_crc_mismatch, check_existing_archive, check_current_period]
+
+def run_checks(names=None):
+    """Run the checks against a fresh local server each, in a temporary folder. Returns the failures."""
+    failures = []
+    for check in CHECKS:
+        if names and check.__name__ not in names:
+            continue
+        server = start_server()
+        download_dir = Path(tempfile.mkdtemp(prefix="lvr-download-check-"))
+        try:
+            check(server, download_dir)
+            print(f"  ✓ {check.__name__}")
+        except Exception as e:
+            failures.append(check.__name__)
+            print(f"  ✗ {check.__name__}: {type(e).__name__}: {e}")
+        finally:
+            server.shutdown()
+            server.server_close()
+            shutil.rmtree(download_dir, ignore_errors=True)
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check download_engine's resume, 416 and verification paths "
+                                                 "against a local HTTP server")
+    parser.add_argument('checks', nargs='*',
+                        help=f"only these checks (default: all): {', '.join(check.__name__ for check in CHECKS)}")
+    args = parser.parse_args()
+    unknown = set(args.checks) - {check.__name__ for check in CHECKS}
+    if unknown:
+        parser.error(f"unknown checks: {', '.join(sorted(unknown))}")
+
+    print("=== Download engine checks ===")
+    failures = run_checks(args.checks)
+    print(f"\n{len(failures)} failed" if failures else "\nAll checks passed")
+    sys.exit(1 if failures else 0)
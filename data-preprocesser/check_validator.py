@@ -0,0 +1,94 @@
+import argparse
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import csv_validator
+
+# (name, file contents, bad_rows, unbalanced_quote_spans) as csv.reader and pandas read them
+CASES = [
+    ('clean', b'h0,h1\n1,2\n3,4\n', [], []),
+    ('quote mid field', b'h0,h1\n12"3,4\n5,6\n', [], []),
+    ('quote ending unquoted field', b'h0,h1\nb",\n1b,ab\n11b,"1"\n', [], []),
+    ('quote ending unquoted field, then comma', b'h0,h1\na"b",1\n2,3\n', [], []),
+    ('quote ending unquoted field at line end', b'h0,h1\n1,b"\n2,3\n', [], []),
+    ('text after closing quote', b'h0,h1\n"a"b,1\n2,3\n', [], []),
+    ('escaped quotes', b'h0,h1\n"a ""b"", c",1\n2,3\n', [], []),
+    ('quoted newline and comma', b'h0,h1\n"a\nb,c",1\n2,3\n', [], []),
+    ('empty quoted field', b'h0,h1\n"",1\n2,3\n', [], []),
+    ('too many fields', b'h0,h1\n1,2\n3,4,5\n', [(3, 3, 3)], []),
+    ('too few fields after blank line', b'h0,h1\n\n1\n2,3\n', [(3, 3, 1)], []),
+    ('mid field quote before extra field', b'h0,h1\n4,5\n1",2,3\n', [(3, 3, 3)], []),
+    ('unclosed quote', b'h0,h1\n1,"2\n3,4\n', [], [(2, 3)]),
+    ('unclosed quote after a closed one', b'h0,h1\n"1",2\n3,"4,5\n6\n', [], [(3, 4)]),
+    ('quoted header with comma', b'"h,0",h1\n1,2\n', [], []),
+    ('byte order mark', b'\xef\xbb\xbf"h,0",h1\n1,2\n', [], []),
+]
+
+def write_case(directory, name, content):
+    path = directory / f"{name.replace(' ', '-').replace(',', '')}.csv"
+    path.write_bytes(content)
+    return path
+
+def check_cases(directory):
+    wrong = []
+    for name, content, bad_rows, spans in CASES:
+        report = csv_validator.validate_csv(write_case(directory, name, content))
+        if report['bad_rows'] != bad_rows or report['unbalanced_quote_spans'] != spans:
+            wrong.append((name, report['bad_rows'], report['unbalanced_quote_spans']))
+    assert not wrong, wrong
+
+def check_needs_repair(directory):
+    # Only records with too many fields or a quote left open make pd.read_csv fail
+    for name, content, bad_rows, spans in CASES:
+        report = csv_validator.validate_csv(write_case(directory, name, content))
+        expected = bool(spans) or any(fields > report['header_fields'] for _, _, fields in bad_rows)
+        assert report['needs_repair'] == expected, (name, report)
+
+def check_blank_rows(directory):
+    # Blank records, \r\n ones and a last \r included, but not a record of empty fields
+    path = write_case(directory, 'blank rows', b'h0,h1\n1,2\n\n3,4\r\n\r\n,\n"\n\n",5\n\n6,7\n\r')
+    report = csv_validator.validate_csv(path)
+    assert report['blank_rows'] == [3, 5, 8, 10] and report['bad_rows'] == [], report
+
+def check_block_sizes(directory):
+    # Runs of quotes, \r\n and records split across blocks give the same report
+    for name, content, _, _ in CASES:
+        path = write_case(directory, name, content)
+        report = csv_validator.validate_csv(path)
+        for block_size in (1, 2, 3, 5):
+            assert csv_validator.validate_csv(path, block_size) == report, (name, block_size)
+
+CHECKS = [check_cases, check_needs_repair, check_blank_rows, check_block_sizes]
+
+def run_checks(names=None):
+    """Run the checks, each writing its cases to a fresh temporary folder. Returns the failures."""
+    failures = []
+    for check in CHECKS:
+        if names and check.__name__ not in names:
+            continue
+        directory = Path(tempfile.mkdtemp(prefix="lvr-validator-check-"))
+        try:
+            check(directory)
+            print(f"  ✓ {check.__name__}")
+        except Exception as e:
+            failures.append(check.__name__)
+            print(f"  ✗ {check.__name__}: {type(e).__name__}: {e}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check csv_validator's reports on known quoting cases")
+    parser.add_argument('checks', nargs='*',
+                        help=f"only these checks (default: all): {', '.join(check.__name__ for check in CHECKS)}")
+    args = parser.parse_args()
+    unknown = set(args.checks) - {check.__name__ for check in CHECKS}
+    if unknown:
+        parser.error(f"unknown checks: {', '.join(sorted(unknown))}")
+
+    print("=== CSV validator checks ===")
+    failures = run_checks(args.checks)
+    print(f"\n{len(failures)} failed" if failures else "\nAll checks passed")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,257 @@
+import mmap
+import sys
+
+import numpy as np
+
+import zip_source
+
+QUOTE = ord('"')
+DELIMITER = ord(',')
+NEWLINE = ord('\n')
+CARRIAGE_RETURN = ord('\r')
+START_OF_FILE = -1  # stands for the byte before the first one
+BOM = b'\xef\xbb\xbf'
+
+# Bytes after which a field starts, so a quote opens it
+FIELD_STARTS = [DELIMITER, NEWLINE, START_OF_FILE]
+
+def has_bom(path):
+    """Whether a file starts with the UTF-8 byte order mark"""
+    with path.open('rb') if isinstance(path, zip_source.ZipMember) else open(path, 'rb') as f:
+        return f.read(len(BOM)) == BOM
+
+def iter_blocks(path, block_size, start=0):
+    """Yield the raw bytes of a file from offset start as uint8 arrays; files on disk are
+    memory-mapped, not read
+
+    The map is not closed explicitly: the arrays handed out keep it alive and it goes
+    away with the last of them.
+    """
+    if isinstance(path, zip_source.ZipMember):
+        with path.open('rb') as f:
+            f.read(start)
+            for block in iter(lambda: f.read(block_size), b''):
+                yield np.frombuffer(block, dtype=np.uint8)
+        return
+
+    with open(path, 'rb') as f:
+        size = f.seek(0, 2)
+        if size <= start:
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    for offset in range(start, size, block_size):
+        yield np.frombuffer(mm, dtype=np.uint8, count=min(block_size, size - offset), offset=offset)
+
+def quote_runs(b, quotes, before_block):
+    """Runs of consecutive quotes in a block: (positions, lengths, field_starts)
+
+    field_starts tells whether the byte before a run starts a field; before_block is
+    the byte before the block.
+    """
+    run_starts = np.flatnonzero(np.diff(quotes, prepend=-2) != 1)
+    positions = quotes[run_starts]
+    lengths = np.diff(np.append(run_starts, len(quotes)))
+    # int16, so START_OF_FILE is not wrapped to a byte value
+    before = np.where(positions > 0, b[np.maximum(positions - 1, 0)].astype(np.int16), before_block)
+    return positions, lengths, np.isin(before, FIELD_STARTS)
+
+def quoted_after_runs(lengths, field_starts, quoted):
+    """Whether a quoted field is open after each run of quotes, quoted telling whether one
+    was open before the first run
+
+    The csv module and pandas read quotes this way: a quote opens a quoted field only as
+    the first byte of a field, inside a quoted field "" is an escaped quote and a single
+    quote closes it, and anywhere else a quote is text. So a run of odd length at a field
+    start opens a quoted field or closes the open one, a run of odd length elsewhere
+    leaves none open, and a run of even length changes nothing. Opening and closing
+    toggle, so the state after a run is the parity of the toggles since the last run
+    that left none open.
+    """
+    odd = (lengths & 1) == 1
+    toggles = np.cumsum(odd & field_starts)
+    last_close = np.maximum.accumulate(np.where(odd & ~field_starts, np.arange(len(lengths)), -1))
+    return np.where(last_close >= 0, toggles - toggles[np.maximum(last_close, 0)], toggles + quoted) & 1 == 1
+
+def outside_quotes(where, runs, quoted_after, quoted):
+    """The positions in where that are not inside a quoted field, given the positions of
+    the runs of quotes and quoted_after_runs for them"""
+    runs_before = np.searchsorted(runs, where)
+    inside = np.where(runs_before > 0, quoted_after[np.maximum(runs_before - 1, 0)], quoted)
+    return where[~inside]
+
+def validate_csv(path, block_size=16 << 20):
+    """Check quote balance and per-record field counts without parsing the file
+
+    The bytes are scanned block by block with NumPy: whether a quoted field is open is
+    worked out for every run of quotes (see quoted_after_runs), the commas and newlines
+    outside quoted fields then separate fields and end records. Both UTF-8 and big5 are
+    safe to scan this way, since neither uses bytes below 0x40 inside a multi-byte
+    character.
+
+    Returns a report dict:
+        header_fields   field count of the header row
+        records         records after the header (blank lines included, as csv.reader counts them)
+        bad_rows        [(record_number, line_number, field_count)] for every non-blank record
+                        whose field count differs from the header; record_number counts the
+                        header as 1 like fix_csv_file does, line_number is the physical line
+        blank_rows      record numbers of the blank records, which pd.read_csv skips
+        too_many_fields whether any record has more fields than the header
+        unbalanced_quote_spans  [(start_line, end_line)] of quoted fields never closed
+        needs_repair    True when pd.read_csv would fail on the file (too many fields or an
+                        unclosed quote); records with too few fields are padded by pandas
+    """
+    header_fields = None
+    records = 0
+    bad_rows = []
+    blank_rows = []
+    too_many_fields = False
+
+    quoted = False  # whether a quoted field is open at the end of the previous block
+    offset = 0  # offset of the current block from where the scan started
+    lines_before = 0  # physical newlines before the current block
+    carry_delims = 0  # delimiters seen so far in the record still open at the block end
+    record_start = 0  # absolute offset where the open record starts
+    record_start_line = 1
+    last_byte = START_OF_FILE  # last byte of the previous block, for \r\n split across blocks
+    open_quote_line = None  # line of the quote that opened the last quoted field
+    pending = 0  # quotes ending the previous block, whose run the next block may continue
+    pending_field_start = False  # whether that run starts a field
+    pending_line = None
+
+    # The byte order mark is not part of the first field, so the scan starts after it
+    for b in iter_blocks(path, block_size, len(BOM) if has_bom(path) else 0):
+        quotes = np.flatnonzero(b == QUOTE)
+        newlines = np.flatnonzero(b == NEWLINE)
+        delims = np.flatnonzero(b == DELIMITER)
+
+        if len(quotes) == len(b):
+            # The whole block continues the pending run
+            if not pending:
+                pending_field_start, pending_line = last_byte in FIELD_STARTS, lines_before + 1
+            pending += len(b)
+            offset += len(b)
+            last_byte = QUOTE
+            continue
+
+        runs, run_lengths, run_field_starts = quote_runs(b, quotes, last_byte)
+        run_lines = lines_before + np.searchsorted(newlines, runs) + 1
+
+        # A run reaching the end of the block may go on in the next one
+        tail = None
+        if len(runs) and runs[-1] + run_lengths[-1] == len(b):
+            tail = int(run_lengths[-1]), bool(run_field_starts[-1]), int(run_lines[-1])
+            runs, run_lengths, run_field_starts, run_lines = runs[:-1], run_lengths[:-1], run_field_starts[:-1], run_lines[:-1]
+
+        if pending and len(runs) and runs[0] == 0:
+            # The block starts by continuing the pending run
+            run_lengths[0] += pending
+            run_field_starts[0] = pending_field_start
+            run_lines[0] = pending_line
+        elif pending:
+            # The pending run ended with the previous block, before any byte of this one
+            runs = np.insert(runs, 0, -1)
+            run_lengths = np.insert(run_lengths, 0, pending)
+            run_field_starts = np.insert(run_field_starts, 0, pending_field_start)
+            run_lines = np.insert(run_lines, 0, pending_line)
+
+        quoted_after = quoted_after_runs(run_lengths, run_field_starts, quoted)
+        if len(runs):
+            opened = np.flatnonzero(quoted_after & ~np.insert(quoted_after[:-1], 0, quoted))
+            if len(opened):
+                open_quote_line = int(run_lines[opened[-1]])
+            ends = outside_quotes(newlines, runs, quoted_after, quoted)
+            delims = outside_quotes(delims, runs, quoted_after, quoted)
+        elif quoted:
+            ends = delims = newlines[:0]
+        else:
+            ends = newlines
+
+        # Delimiters per record: completed records first, the open record in the last bucket
+        delims_before_end = np.searchsorted(delims, ends)
+        counts = np.diff(delims_before_end, prepend=0, append=len(delims))
+        counts[0] += carry_delims
+
+        if len(ends):
+            starts = np.empty(len(ends), dtype=np.int64)
+            starts[0] = record_start
+            starts[1:] = ends[:-1] + 1 + offset
+            lengths = ends + offset - starts
+
+            # A blank line is empty or only a \r; the \r may sit at the end of the previous block
+            before_end = np.where(ends > 0, b[np.maximum(ends - 1, 0)], last_byte)
+            blank = (lengths == 0) | ((lengths == 1) & (before_end == CARRIAGE_RETURN))
+
+            fields = counts[:-1] + 1
+            start_lines = np.empty(len(ends), dtype=np.int64)
+            start_lines[0] = record_start_line
+            start_lines[1:] = lines_before + np.searchsorted(newlines, ends[:-1], side='right') + 1
+
+            first = 0
+            if header_fields is None:
+                header_fields = int(fields[0])
+                first = 1
+            bad = np.flatnonzero((fields[first:] != header_fields) & ~blank[first:]) + first
+            record_numbers = records + bad + (2 - first)
+            bad_rows.extend(zip(record_numbers.tolist(), start_lines[bad].tolist(), fields[bad].tolist()))
+            blank_rows.extend((records + np.flatnonzero(blank[first:]) + 2).tolist())
+            too_many_fields = too_many_fields or bool(np.any(fields[first:] > header_fields))
+            records += len(ends) - first
+
+            record_start = int(ends[-1]) + 1 + offset
+            record_start_line = lines_before + int(np.searchsorted(newlines, ends[-1], side='right')) + 1
+            carry_delims = int(counts[-1])
+        else:
+            carry_delims = int(counts[0])
+
+        if len(runs):
+            quoted = bool(quoted_after[-1])
+        pending, pending_field_start, pending_line = tail or (0, False, None)
+        offset += len(b)
+        lines_before += len(newlines)
+        last_byte = int(b[-1])
+
+    # A run of quotes ending the file
+    if pending:
+        quoted_after = quoted_after_runs(np.array([pending]), np.array([pending_field_start]), quoted)
+        if quoted_after[0] and not quoted:
+            open_quote_line = pending_line
+        quoted = bool(quoted_after[0])
+
+    # A last record without a trailing newline
+    if offset > record_start:
+        fields = carry_delims + 1
+        if header_fields is None:
+            header_fields = fields
+        else:
+            records += 1
+            if offset - record_start == 1 and last_byte == CARRIAGE_RETURN:
+                blank_rows.append(records + 1)
+            elif fields != header_fields:
+                bad_rows.append((records + 1, record_start_line, fields))
+                too_many_fields = too_many_fields or fields > header_fields
+
+    unbalanced_quote_spans = []
+    if quoted:
+        end_line = lines_before + (1 if last_byte != NEWLINE else 0)
+        unbalanced_quote_spans.append((open_quote_line, end_line))
+
+    return {
+        'header_fields': header_fields,
+        'records': records,
+        'bad_rows': bad_rows,
+        'blank_rows': blank_rows,
+        'too_many_fields': too_many_fields,
+        'unbalanced_quote_spans': unbalanced_quote_spans,
+        'needs_repair': too_many_fields or bool(unbalanced_quote_spans),
+    }
+
+if __name__ == "__main__":
+    for file_path in sys.argv[1:]:
+        report = validate_csv(file_path)
+        status = "needs repair" if report['needs_repair'] else "ok"
+        print(f"{file_path}: {status} ({report['records']} records, {report['header_fields']} fields)")
+        for record_number, line_number, field_count in report['bad_rows']:
+            print(f"  Row {record_number} (line {line_number}): {field_count} fields")
+        for start_line, end_line in report['unbalanced_quote_spans']:
+            print(f"  Unclosed quote from line {start_line} to {end_line}")
@@ -0,0 +1,305 @@
+import argparse
+import os
+import re
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import lvr_schema
+import manifest
+import zip_source
+
+SERIAL_COLUMN = '編號'
+
+# What flag mode writes in STATUS_COLUMN; drop mode keeps only LATEST and UNKEYED rows
+STATUS_COLUMN = 'dedup_status'
+LATEST = 'latest'  # from the newest quarter that has the transaction
+REPEAT = 'repeat'  # an older quarter's copy, identical to a row of the latest version
+SUPERSEDED = 'superseded'  # an older quarter's copy that the latest version changed
+UNKEYED = 'unkeyed'  # no serial number or no quarter to compare by
+
+# Transactions are keyed by a 64-bit hash of dataset and serial number: integer keys keep
+# the B-trees small and fast, and a collision is unlikely below billions of transactions
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS latest (
+    key INTEGER PRIMARY KEY, rank INTEGER
+);
+CREATE TABLE IF NOT EXISTS versions (
+    key INTEGER, rank INTEGER, content_hash INTEGER,
+    PRIMARY KEY (key, rank, content_hash)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sources (
+    source_file TEXT, content_hash TEXT, size INTEGER, mtime REAL, rows INTEGER,
+    PRIMARY KEY (source_file, content_hash)
+) WITHOUT ROWID;
+"""
+
+# content_hash of a source file that can no longer be found; it is matched by name alone
+UNKNOWN_HASH = ''
+
+
+def quarter_rank(quarter):
+    """Sortable number for a quarter suffix, a partial quarter just below the full one
+    Example: 2020Q4 -> 202041
+    Example: 114Q1-partial -> 202510 (ROC years are converted)
+    """
+    match = re.fullmatch(r'(\d{3,4})Q([1-4])(-partial)?', quarter or '')
+    if not match:
+        return None
+
+    year = int(match.group(1))
+    if year < 1911:
+        year += 1911
+    return year * 100 + int(match.group(2)) * 10 + (0 if match.group(3) else 1)
+
+def source_keys(source_file):
+    """(dataset, rank) of a source_file value: which table the rows belong to and how new they are
+
+    The dataset is city, transaction type and table, so the build/land/park rows that
+    share a serial number with their main record are indexed apart from it.
+    """
+    keys = lvr_schema.file_keys(source_file)
+    rank = quarter_rank(keys['quarter']) if keys else None
+    if rank is None:
+        return None, None
+    return f"{keys['city']}_{keys['trans_type']}_{keys['table']}", rank
+
+def source_path(base_dir, source_file):
+    """The file a source_file value names, on disk or in its folder's zip index, None if it is gone"""
+    path = Path(base_dir) / source_file
+    if path.exists():
+        return path
+    for member in zip_source.read_zip_index(path.parent):
+        if member.name == path.name:
+            return member
+    return None
+
+def chunk_keys(chunk):
+    """Index keys for every row of a combined CSV chunk, only the rows that can be keyed
+
+    The content hash covers every column but source_file (and a status column from
+    an earlier flag run), so the same record from two quarters hashes the same.
+    """
+    sources = chunk['source_file']
+    keys = {source: source_keys(source) for source in sources.unique()}
+    dataset = sources.map({source: key[0] for source, key in keys.items()})
+    rank = sources.map({source: key[1] for source, key in keys.items()})
+
+    serial = chunk[SERIAL_COLUMN].str.strip()
+    unkeyed = serial.isna() | serial.eq('') | serial.str.lower().eq(lvr_schema.ENGLISH_HEADER_SERIAL)
+    keyed = ~unkeyed & dataset.notna()
+    chunk = chunk[keyed]
+
+    key = pd.util.hash_pandas_object(pd.DataFrame({'dataset': dataset[keyed], 'serial': serial[keyed]}),
+                                     index=False)
+    content = chunk.drop(columns=['source_file', STATUS_COLUMN], errors='ignore')
+    content_hash = pd.util.hash_pandas_object(content, index=False)
+
+    return pd.DataFrame({'key': key.to_numpy().view(np.int64), 'rank': rank[keyed].astype(np.int64),
+                         'content_hash': content_hash.to_numpy().view(np.int64)}, index=chunk.index)
+
+class DedupIndex:
+    """Every transaction version seen so far, kept in SQLite so it can grow past memory.
+
+    latest holds the newest quarter each (dataset, serial) appeared in, versions the
+    content hash of every row per quarter, and sources the source files already
+    indexed by name and content hash, so a later run only has to add the rows of new
+    files and of files whose content changed under the same name. Versions of a
+    changed file's old content stay in the index until it is rebuilt.
+    """
+
+    def __init__(self, path, rebuild=False, cache_mb=256):
+        self.path = Path(path)
+        if rebuild:
+            for path in [self.path, Path(f"{self.path}-wal"), Path(f"{self.path}-shm")]:
+                if path.exists():
+                    path.unlink()
+        self.db = sqlite3.connect(self.path)
+        # The index can always be rebuilt, so trade durability for speed; the page cache is capped
+        self.db.execute("PRAGMA synchronous = OFF")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA temp_store = MEMORY")
+        self.db.execute(f"PRAGMA cache_size = -{cache_mb * 1024}")
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(sources)")]
+        if columns and 'content_hash' not in columns:
+            # Sources of an older index were keyed by name only; their rows are added again,
+            # which leaves latest and versions as they were
+            self.db.execute("DROP TABLE sources")
+        self.db.executescript(INDEX_SCHEMA)
+
+    def indexed_sources(self):
+        """(source_file, content_hash) of every source file already indexed"""
+        return set(self.db.execute("SELECT source_file, content_hash FROM sources"))
+
+    def source_version(self, base_dir, source_file):
+        """(content_hash, size, mtime) of a source file, UNKNOWN_HASH if it cannot be found
+
+        The file is only hashed when its size or mtime differ from what was stored for it.
+        """
+        path = source_path(base_dir, source_file)
+        if path is None:
+            return UNKNOWN_HASH, None, None
+        stat = path.stat()
+        found = self.db.execute("SELECT content_hash FROM sources WHERE source_file = ? AND size = ? AND mtime = ?",
+                                (source_file, stat.st_size, stat.st_mtime)).fetchone()
+        content_hash = found[0] if found else manifest.content_hash(path)
+        return content_hash, stat.st_size, stat.st_mtime
+
+    def add(self, keys):
+        """Add the keyed rows of a chunk"""
+        if keys.empty:
+            return
+
+        # Sorted batches touch the B-trees in order instead of at random
+        latest = keys.groupby('key')['rank'].max()
+        self.db.executemany(
+            "INSERT INTO latest VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET rank = max(rank, excluded.rank)",
+            zip(latest.index.tolist(), latest.tolist()),
+        )
+        versions = keys.drop_duplicates().sort_values(['key', 'rank', 'content_hash'])
+        self.db.executemany(
+            "INSERT OR IGNORE INTO versions VALUES (?, ?, ?)",
+            zip(versions['key'].tolist(), versions['rank'].tolist(), versions['content_hash'].tolist()),
+        )
+
+    def mark_indexed(self, source_rows, versions):
+        """Record the rows indexed per source file under the (content_hash, size, mtime) in versions"""
+        self.db.executemany("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)",
+                            [(source, *versions[source], rows) for source, rows in source_rows.items()])
+        self.db.commit()
+
+    def classify(self, chunk):
+        """Dedup status of every row of a chunk, looked up in one query"""
+        status = pd.Series(UNKEYED, index=chunk.index)
+        keyed = chunk_keys(chunk)
+        if keyed.empty:
+            return status
+
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS chunk ("
+                        "pos INTEGER PRIMARY KEY, key INTEGER, content_hash INTEGER)")
+        self.db.execute("DELETE FROM chunk")
+        self.db.executemany(
+            "INSERT INTO chunk VALUES (?, ?, ?)",
+            zip(range(len(keyed)), keyed['key'].tolist(), keyed['content_hash'].tolist()),
+        )
+        found = self.db.execute(
+            "SELECT c.pos, l.rank, EXISTS ("
+            "  SELECT 1 FROM versions v WHERE v.key = c.key AND v.rank = l.rank AND v.content_hash = c.content_hash) "
+            "FROM chunk c JOIN latest l ON l.key = c.key"
+        ).fetchall()
+
+        latest_rank = np.full(len(keyed), -1, dtype=np.int64)
+        in_latest = np.zeros(len(keyed), dtype=bool)
+        if found:
+            pos, ranks, exists = (np.array(col) for col in zip(*found))
+            latest_rank[pos] = ranks
+            in_latest[pos] = exists.astype(bool)
+
+        # Rows the index has not seen yet count as latest rather than being dropped
+        rank = keyed['rank'].to_numpy()
+        keyed_status = np.where((rank >= latest_rank) | (latest_rank < 0), LATEST,
+                                np.where(in_latest, REPEAT, SUPERSEDED))
+        status[keyed.index] = keyed_status
+        return status
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+def read_combined_chunks(csv_path, chunksize):
+    return pd.read_csv(csv_path, encoding='utf-8', dtype=str, chunksize=chunksize)
+
+def dedup_files(input_paths, output_dir, index_path, mode='drop', chunksize=100_000, rebuild=False):
+    """Deduplicate combined CSVs across quarters into output_dir, two streaming passes over each.
+
+    The first pass adds the rows of source files the index has not seen to it, the second
+    writes every row whose source quarter is the newest for its serial number (drop
+    mode), or every row with its dedup_status (flag mode). Returns counts per status.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    index = DedupIndex(index_path, rebuild=rebuild)
+    counts = {LATEST: 0, REPEAT: 0, SUPERSEDED: 0, UNKEYED: 0}
+
+    try:
+        # Pass 1: index only the rows of new or changed source files
+        indexed = index.indexed_sources()
+        indexed_names = {source for source, _ in indexed}
+        print(f"\n=== Indexing ({len(indexed)} source files already in {index.path}) ===")
+        versions = {}
+        is_indexed = {}
+        usable = []
+        for csv_path in input_paths:
+            source_rows = {}
+            for chunk in read_combined_chunks(csv_path, chunksize):
+                if SERIAL_COLUMN not in chunk.columns or 'source_file' not in chunk.columns:
+                    print(f"  ✗ Skipping {csv_path.name}: no {SERIAL_COLUMN} or source_file column")
+                    break
+                # source_file is relative to the folder the combined CSVs are written to
+                for source in chunk['source_file'].dropna().unique():
+                    if source not in versions:
+                        versions[source] = index.source_version(csv_path.parent, source)
+                        content_hash = versions[source][0]
+                        is_indexed[source] = ((source, content_hash) in indexed if content_hash != UNKNOWN_HASH
+                                              else source in indexed_names)
+                new_rows = chunk[~chunk['source_file'].map(is_indexed).fillna(False).astype(bool)]
+                index.add(chunk_keys(new_rows))
+                for source, rows in new_rows['source_file'].value_counts().items():
+                    source_rows[source] = source_rows.get(source, 0) + rows
+            else:
+                usable.append(csv_path)
+                index.mark_indexed(source_rows, versions)
+                print(f"  ✓ {csv_path.name}: {sum(source_rows.values())} new rows from {len(source_rows)} source files")
+
+        # Pass 2: rewrite every input against the complete index
+        print(f"\n=== Writing ({mode}) to {output_dir} ===")
+        for csv_path in usable:
+            output_path = output_dir / csv_path.name
+            tmp_path = output_dir / f".{csv_path.name}.tmp"
+            file_counts = dict.fromkeys(counts, 0)
+            with open(tmp_path, 'w', encoding='utf-8', newline='') as out:
+                header_written = False
+                for chunk in read_combined_chunks(csv_path, chunksize):
+                    status = index.classify(chunk)
+                    for name, rows in status.value_counts().items():
+                        file_counts[name] += rows
+                    if mode == 'flag':
+                        chunk[STATUS_COLUMN] = status
+                    else:
+                        chunk = chunk[status.isin([LATEST, UNKEYED])]
+                    chunk.to_csv(out, index=False, header=not header_written)
+                    header_written = True
+            os.replace(tmp_path, output_path)
+            for name in counts:
+                counts[name] += file_counts[name]
+            print(f"  ✓ {csv_path.name}: {file_counts[LATEST] + file_counts[UNKEYED]} kept, "
+                  f"{file_counts[REPEAT]} repeats, {file_counts[SUPERSEDED]} superseded")
+    finally:
+        index.close()
+
+    return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drop or flag transactions repeated across quarterly releases")
+    parser.add_argument('inputs', nargs='*', type=Path,
+                        help="combined CSVs (default: property-infos/combined_*.csv)")
+    parser.add_argument('--output-dir', type=Path, default=Path("property-infos/deduped"),
+                        help="where the deduplicated CSVs go, same names (default: property-infos/deduped)")
+    parser.add_argument('--index', type=Path, default=Path("property-infos/dedup-index.sqlite"),
+                        help="persistent index file (default: property-infos/dedup-index.sqlite)")
+    parser.add_argument('--mode', choices=['drop', 'flag'], default='drop',
+                        help="drop older copies, or keep every row with a dedup_status column (default: drop)")
+    parser.add_argument('--chunksize', type=int, default=100_000, help="rows per chunk (default: 100000)")
+    parser.add_argument('--rebuild', action='store_true', help="start a new index instead of adding to the old one")
+    args = parser.parse_args()
+
+    inputs = args.inputs or sorted(Path("property-infos").glob("combined_*.csv"))
+    counts = dedup_files(inputs, args.output_dir, args.index, mode=args.mode,
+                         chunksize=args.chunksize, rebuild=args.rebuild)
+
+    print("\n=== Dedup Complete ===")
+    print(f"Latest: {counts[LATEST]}, repeats: {counts[REPEAT]}, superseded: {counts[SUPERSEDED]}, "
+          f"unkeyed: {counts[UNKEYED]}")
@@ -0,0 +1,237 @@
+import argparse
+import hashlib
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Where the open data site serves a past season's CSV archive; {season} is the value of
+# the season picker, e.g. 113S4. Any server answering the same way (a local stand-in in
+# tests) can be used instead.
+DOWNLOAD_URL = "https://plvr.land.moi.gov.tw/DownloadSeason?season={season}&type=zip&fileName=lvr_landcsv.zip"
+
+# The current period (本期), re-released every ten days, is always served at this one URL
+CURRENT_URL = "https://plvr.land.moi.gov.tw/Download?type=zip&fileName=lvr_landcsv.zip"
+CURRENT_SEASON = 'current'
+
+SEASON_PATTERN = re.compile(r'(\d{2,3})S([1-4])')
+
+def season_name(season):
+    """Name of a season as the site shows it, which folder-renamer.py parses
+    Example: 113S4 -> 113年第4季
+    """
+    match = SEASON_PATTERN.fullmatch(season)
+    if not match:
+        raise ValueError(f"Not a season: {season}")
+    return f"{match.group(1)}年第{match.group(2)}季"
+
+def current_name(day=None):
+    """Name of the current period's archive fetched on a day, so one release is never kept for the next
+    Example: 2026-10-17 -> 本期20261017
+    """
+    return f"本期{(day or date.today()):%Y%m%d}"
+
+def archive_path(download_dir, name):
+    """Deterministic path of a season's archive, whatever the server calls the file"""
+    return Path(download_dir) / f"property_data_{name}.zip"
+
+def make_session(pool_size=4, retries=3):
+    """One HTTP session whose connections are pooled and reused by every download thread
+
+    Connection errors and 5xx answers are retried with backoff before a download gives up.
+    """
+    retry = Retry(total=retries, backoff_factor=1, status_forcelist=[500, 502, 503, 504],
+                  allowed_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def file_sha256(path, block_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def read_checksums(path):
+    """{file name: sha256} from a sha256sum-style file ("<hex>  property_data_113年第4季.zip")"""
+    checksums = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                digest, name = line.split(maxsplit=1)
+                checksums[name.strip().lstrip('*')] = digest.lower()
+    return checksums
+
+def verify_archive(path, expected_size=None, sha256=None):
+    """Check a downloaded archive's size, its sha256 if one is known and every member's CRC
+
+    Returns the file's sha256; raises ValueError on the first check that fails.
+    """
+    size = os.path.getsize(path)
+    if expected_size is not None and size != expected_size:
+        raise ValueError(f"size is {size} bytes, expected {expected_size}")
+    digest = file_sha256(path)
+    if sha256 and digest != sha256.lower():
+        raise ValueError(f"sha256 is {digest}, expected {sha256}")
+    try:
+        with zipfile.ZipFile(path) as archive:
+            bad_member = archive.testzip()
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"not a zip archive: {e}")
+    if bad_member is not None:
+        raise ValueError(f"CRC mismatch in {bad_member}")
+    return digest
+
+def content_range_total(response):
+    """Full size from a Content-Range header (bytes 100-199/1000 or bytes */1000)"""
+    total = response.headers.get('Content-Range', '').rpartition('/')[2]
+    return int(total) if total.isdigit() else None
+
+def download_file(session, url, dest_path, sha256=None, chunk_size=1 << 20, attempts=3, timeout=60):
+    """Download url to dest_path through a .part file that later attempts resume with Range requests
+
+    The part file only replaces dest_path once its size matches what the server announced
+    and verify_archive passes; a corrupt download is deleted, an interrupted one kept for
+    the next attempt or run. Returns (bytes, bytes resumed from, sha256).
+    """
+    dest_path = Path(dest_path)
+    part_path = dest_path.with_name(dest_path.name + '.part')
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    resumed_from = part_path.stat().st_size if part_path.exists() else 0
+
+    for attempt in range(1, attempts + 1):
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        headers = {'Range': f"bytes={offset}-"} if offset else {}
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 416:
+                    # Nothing left to send: the part file already holds the whole archive
+                    total = content_range_total(response)
+                    if total != offset:
+                        part_path.unlink()
+                        continue
+                else:
+                    response.raise_for_status()
+                    if response.status_code == 206:
+                        start = int(response.headers['Content-Range'].split()[1].split('-')[0])
+                        if start != offset:
+                            raise IOError(f"server resumed at byte {start}, not {offset}")
+                        total = content_range_total(response)
+                        mode = 'ab'
+                    else:
+                        # The server ignored the Range header and is sending everything again
+                        length = response.headers.get('Content-Length')
+                        total = int(length) if length and length.isdigit() else None
+                        mode = 'wb'
+
+                    with open(part_path, mode) as f:
+                        for block in response.iter_content(chunk_size):
+                            f.write(block)
+
+            size = part_path.stat().st_size
+            if total is not None and size < total:
+                raise IOError(f"connection closed at {size} of {total} bytes")
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                IOError) as e:
+            if attempt == attempts or isinstance(e, requests.HTTPError):
+                raise
+            print(f"  ! {dest_path.name}: {e}, resuming (attempt {attempt + 1}/{attempts})")
+            time.sleep(attempt)
+            continue
+
+        try:
+            digest = verify_archive(part_path, expected_size=total, sha256=sha256)
+        except ValueError:
+            part_path.unlink()
+            raise
+        os.replace(part_path, dest_path)
+        return size, resumed_from, digest
+
+    raise IOError(f"{dest_path.name}: gave up after {attempts} attempts")
+
+def download_season(session, season, download_dir, url_template=DOWNLOAD_URL, name=None, checksums=None):
+    """Fetch one season's archive to its deterministic path; an archive already there is
+    kept if it verifies. Returns a result dict (season, path, status, bytes, seconds, ...).
+    """
+    name = name or season_name(season)
+    dest_path = archive_path(download_dir, name)
+    sha256 = (checksums or {}).get(dest_path.name)
+    result = {'season': season, 'path': str(dest_path), 'status': None, 'bytes': 0, 'resumed_from': 0,
+              'seconds': 0.0, 'sha256': None, 'error': None}
+    start = time.perf_counter()
+
+    try:
+        if dest_path.exists():
+            try:
+                result['sha256'] = verify_archive(dest_path, sha256=sha256)
+                result.update(status='exists', bytes=dest_path.stat().st_size)
+                return result
+            except ValueError as e:
+                print(f"  ! {dest_path.name} is there but does not verify ({e}), downloading again")
+                dest_path.unlink()
+
+        size, resumed_from, digest = download_file(session, url_template.format(season=season), dest_path,
+                                                   sha256=sha256)
+        result.update(status='downloaded', bytes=size, resumed_from=resumed_from, sha256=digest)
+    except Exception as e:
+        result.update(status='failed', error=str(e))
+    finally:
+        result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+def download_seasons(seasons, download_dir, workers=4, url_template=DOWNLOAD_URL, names=None, checksums=None,
+                     session=None):
+    """Download several seasons at once over one pooled session. Returns the results in season order.
+
+    names maps a season to the name the site shows for it, when it is known; checksums
+    maps archive file names to their expected sha256.
+    """
+    session = session or make_session(pool_size=workers)
+    names = names or {}
+    print(f"\n=== Downloading {len(seasons)} seasons to {download_dir} ({workers} at a time) ===")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(download_season, session, season, download_dir, url_template,
+                                   names.get(season), checksums)
+                   for season in seasons]
+        results = []
+        for future in futures:
+            result = future.result()
+            results.append(result)
+            name = Path(result['path']).name
+            if result['status'] == 'failed':
+                print(f"  ✗ {name}: {result['error']}")
+            elif result['status'] == 'exists':
+                print(f"  ✓ Already downloaded: {name}")
+            else:
+                resumed = f", resumed at {result['resumed_from']} bytes" if result['resumed_from'] else ""
+                print(f"  ✓ Downloaded: {name} ({result['bytes'] / (1024 * 1024):.1f} MB in "
+                      f"{result['seconds']:.1f}s{resumed})")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download past seasons' CSV archives of the LVR open data")
+    parser.add_argument('seasons', nargs='+', help="season values as in the site's picker (113S4 ...)")
+    parser.add_argument('--download-dir', type=Path, default=Path("~/Downloads").expanduser(),
+                        help="where property_data_<season>.zip files go (default: ~/Downloads)")
+    parser.add_argument('--workers', type=int, default=4, help="seasons downloaded at once (default: 4)")
+    parser.add_argument('--url-template', default=DOWNLOAD_URL,
+                        help="archive URL with a {season} placeholder (default: the open data site)")
+    parser.add_argument('--checksums', type=Path, help="sha256sum-style file of expected archive checksums")
+    args = parser.parse_args()
+
+    checksums = read_checksums(args.checksums) if args.checksums else None
+    results = download_seasons(args.seasons, args.download_dir, workers=args.workers,
+                               url_template=args.url_template, checksums=checksums)
+    failed = [result for result in results if result['status'] == 'failed']
+    print(f"\n=== Download Complete: {len(results) - len(failed)} ok, {len(failed)} failed ===")
@@ -0,0 +1,177 @@
+import argparse
+import csv
+import hashlib
+import io
+import os
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not locked
+    fcntl = None
+
+# Every quarantine file has these columns whatever the layout of the rows it holds;
+# raw_line is the row as a CSV line in its group's header layout
+COLUMNS = ['source_file', 'row_number', 'error_type', 'raw_line']
+
+# The first record of a group's file holds the group's header line, so the file
+# can be parsed back into the group's columns without the original inputs
+HEADER_RECORD = 'header'
+
+# Errors about a whole file rather than a row (no header known) share one file
+UNPARSED_GROUP = 'unparsed'
+
+# Quarantine "directory" of a read that drops bad rows without writing them, for files
+# an earlier read in the same run has quarantined already
+DISCARD = ':discard:'
+
+def group_id(headers):
+    """Stable id for a header layout, used to name a group's outputs across runs"""
+    return hashlib.sha1('\x1f'.join(headers).encode('utf-8')).hexdigest()[:12]
+
+def raw_line(fields):
+    """A row's fields as one CSV line, without the line terminator"""
+    line = io.StringIO()
+    csv.writer(line).writerow(['' if field is None else field for field in fields])
+    return line.getvalue().rstrip('\r\n')
+
+class ErrorSink:
+    """Buffered quarantine writer for one directory: one errors-<group>.csv per header group.
+
+    Rows are buffered per group and appended in batches through a file descriptor
+    kept open for the life of the process. Each batch is one write under an exclusive
+    lock, so any number of worker processes can share the directory; the header
+    record is written by whichever process finds the file empty.
+    """
+
+    def __init__(self, directory, batch_rows=10_000):
+        self.directory = Path(directory)
+        self.batch_rows = batch_rows
+        self.headers = {}
+        self.buffers = {}
+        self.fds = {}
+
+    def path(self, headers):
+        name = group_id(headers) if headers else UNPARSED_GROUP
+        return self.directory / f"errors-{name}.csv"
+
+    def write(self, headers, source_file, row_number, error_type, fields=()):
+        """Buffer one quarantined row; fields are the row's values in the layout of headers"""
+        headers = tuple(headers or ())
+        key = group_id(headers) if headers else UNPARSED_GROUP
+        self.headers[key] = headers
+        buffer = self.buffers.setdefault(key, [])
+        buffer.append([str(source_file), row_number, error_type, raw_line(fields) if fields else ''])
+        if len(buffer) >= self.batch_rows:
+            self._flush_group(key)
+        return self.path(headers)
+
+    def flush(self):
+        """Write out every buffered row; call at the end of each file so workers lose nothing"""
+        for key in list(self.buffers):
+            self._flush_group(key)
+
+    def close(self):
+        self.flush()
+        for fd in self.fds.values():
+            os.close(fd)
+        self.fds = {}
+
+    def _flush_group(self, key):
+        rows = self.buffers.pop(key, None)
+        if not rows:
+            return
+
+        fd = self.fds.get(key)
+        if fd is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path(self.headers[key]), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self.fds[key] = fd
+
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            out = io.StringIO()
+            writer = csv.writer(out)
+            if os.fstat(fd).st_size == 0:
+                writer.writerow(COLUMNS)
+                if self.headers[key]:
+                    writer.writerow(['', 1, HEADER_RECORD, raw_line(self.headers[key])])
+            writer.writerows(rows)
+            data = memoryview(out.getvalue().encode('utf-8'))
+            while data:
+                data = data[os.write(fd, data):]
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+class DiscardSink:
+    """Takes rows like an ErrorSink and drops them"""
+
+    def write(self, headers, source_file, row_number, error_type, fields=()):
+        return Path(os.devnull)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+_sinks = {}
+
+def get_sink(directory):
+    """This process's sink for a quarantine directory, opened on first use"""
+    if directory == DISCARD:
+        return DiscardSink()
+    directory = Path(directory)
+    if directory not in _sinks:
+        _sinks[directory] = ErrorSink(directory)
+    return _sinks[directory]
+
+def quarantine_files(directory):
+    return sorted(Path(directory).glob('errors-*.csv'))
+
+def read_quarantine(directory):
+    """Every quarantined row of a directory in the common layout, plus the group it belongs to"""
+    frames = []
+    for path in quarantine_files(directory):
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+        df = df[df['error_type'] != HEADER_RECORD]
+        df.insert(0, 'group', path.stem.removeprefix('errors-'))
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=['group'] + COLUMNS)
+    records = pd.concat(frames, ignore_index=True)
+    records['row_number'] = pd.to_numeric(records['row_number'], errors='coerce').astype('Int64')
+    return records
+
+def read_group_rows(path):
+    """The quarantined rows of one group's file parsed back into the group's columns
+
+    Rows keep however many fields they had when quarantined; short rows are padded
+    and long ones have their extra fields dropped, as the repair path did.
+    """
+    records = pd.read_csv(path, dtype=str, keep_default_na=False)
+    header = records[records['error_type'] == HEADER_RECORD]
+    if header.empty:
+        raise ValueError(f"{path} has no header record")
+    columns = next(csv.reader([header['raw_line'].iloc[0]]))
+    records = records[records['error_type'] != HEADER_RECORD]
+
+    rows = [(fields + [None] * len(columns))[:len(columns)] for fields in csv.reader(records['raw_line'].tolist())]
+    values = pd.DataFrame(rows, columns=columns, index=records.index, dtype=object)
+    return pd.concat([values, records[['source_file', 'row_number', 'error_type']]], axis=1).reset_index(drop=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the rows quarantined by the processor")
+    parser.add_argument('directory', nargs='?', type=Path, default=Path("property-infos/quarantine"),
+                        help="quarantine directory (default: property-infos/quarantine)")
+    args = parser.parse_args()
+
+    records = read_quarantine(args.directory)
+    print(f"{len(records)} quarantined rows in {len(quarantine_files(args.directory))} files")
+    if len(records):
+        summary = records.groupby(['group', 'error_type']).size().rename('rows').reset_index()
+        print(summary.to_string(index=False))
@@ -1,5 +1,6 @@
 import os
 import re
+import argparse
 
 def convert_year(chinese_year):
     # Convert Chinese year to Western year (add 1911)
@@ -15,32 +16,52 @@ def convert_quarter(quarter_text):
     }
     return quarter_map.get(quarter_text, "")
 
-# Get current directory
-directory = "."
+def renamed_folder(folder):
+    """New name of a downloaded season folder, None if it is not one
+    Example: property_data_109年第4季 -> rawdata-2020Q4
+    """
+    if not folder.startswith("property_data_"):
+        return None
+    
+    # Extract year and quarter using regex
+    year_match = re.search(r'(\d+)年', folder)
+    quarter_match = re.search(r'(第[1-4]季)', folder)
+    if not (year_match and quarter_match):
+        return None
+    
+    chinese_year = year_match.group(1)
+    quarter = quarter_match.group(1)
+    
+    # Convert to new format
+    western_year = convert_year(chinese_year)
+    q_format = convert_quarter(quarter)
+    
+    # Handle special case for 114年
+    if "現有資料只到0228" in folder:
+        return f"rawdata-114Q1-partial"
+    return f"rawdata-{western_year}{q_format}"
 
-# Loop through directories
-for folder in os.listdir(directory):
-    if folder.startswith("property_data_"):
-        # Extract year and quarter using regex
-        year_match = re.search(r'(\d+)年', folder)
-        quarter_match = re.search(r'(第[1-4]季)', folder)
-        
-        if year_match and quarter_match:
-            chinese_year = year_match.group(1)
-            quarter = quarter_match.group(1)
-            
-            # Convert to new format
-            western_year = convert_year(chinese_year)
-            q_format = convert_quarter(quarter)
-            
-            # Handle special case for 114年
-            if "現有資料只到0228" in folder:
-                new_name = f"rawdata-114Q1-partial"
-            else:
-                new_name = f"rawdata-{western_year}{q_format}"
-            
-            # Rename folder
-            old_path = os.path.join(directory, folder)
-            new_path = os.path.join(directory, new_name)
-            os.rename(old_path, new_path)
-            print(f"Renamed: {folder} -> {new_name}")
\ No newline at end of file
+def rename_folder(directory, folder):
+    """Rename one season folder in directory; returns the new name, or None if it was left alone"""
+    new_name = renamed_folder(folder)
+    if new_name is None:
+        return None
+    
+    # Rename folder
+    old_path = os.path.join(directory, folder)
+    new_path = os.path.join(directory, new_name)
+    os.rename(old_path, new_path)
+    print(f"Renamed: {folder} -> {new_name}")
+    return new_name
+
+def rename_folders(directory="."):
+    # Loop through directories
+    for folder in os.listdir(directory):
+        rename_folder(directory, folder)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rename downloaded property_data_* season folders to rawdata-YYYYQn")
+    parser.add_argument('directory', nargs='?', default=".", help="folder holding the season folders (default: .)")
+    args = parser.parse_args()
+    
+    rename_folders(args.directory)
@@ -0,0 +1,175 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import csv_validator
+import error_sink
+import lvr_schema
+
+# A header record longer than this is not fingerprinted from its bytes; the file's
+# header is read by pandas and fingerprinted from the column names
+MAX_HEADER_BYTES = 64 * 1024
+
+# Bump whenever fingerprints are computed differently: a registry saved under another
+# version keeps its groups, but its fingerprints and cached files are dropped
+VERSION = 2
+
+def header_record_end(data):
+    """Offset of the newline ending the first record of data, None if no record ends in it
+
+    A newline inside a quoted column name does not end the record, so a header with
+    multi-line names is taken whole (see csv_validator.quoted_after_runs).
+    """
+    b = np.frombuffer(data, dtype=np.uint8)
+    start = len(csv_validator.BOM) if data.startswith(csv_validator.BOM) else 0
+    newlines = np.flatnonzero(b[start:] == csv_validator.NEWLINE)
+    quotes = np.flatnonzero(b[start:] == csv_validator.QUOTE)
+    if len(quotes):
+        runs, lengths, field_starts = csv_validator.quote_runs(b[start:], quotes, csv_validator.START_OF_FILE)
+        quoted_after = csv_validator.quoted_after_runs(lengths, field_starts, False)
+        newlines = csv_validator.outside_quotes(newlines, runs, quoted_after, False)
+    return start + int(newlines[0]) if len(newlines) else None
+
+def read_signature(csv_file, max_bytes=MAX_HEADER_BYTES):
+    """Fingerprint of a file's raw header record, read as bytes without decoding or parsing
+
+    Returns (fingerprint, raw record, None) or (None, None, error_message); the fingerprint
+    and record are None when the record does not end within max_bytes.
+    """
+    try:
+        with csv_file.open('rb') as f:
+            data = f.read(max_bytes + 1)
+    except Exception as e:
+        return None, None, f"Error processing {csv_file.name}: {e}"
+    if not data.strip():
+        return None, None, f"Error: {csv_file.name} is empty or invalid"
+    end = header_record_end(data)
+    if end is None and len(data) > max_bytes:
+        return None, None, None
+    record = data[:end].rstrip(b'\r\n')
+    return hashlib.sha1(record).hexdigest()[:16], record, None
+
+def headers_fingerprint(headers):
+    """Fingerprint of a header read by pandas, for records too long for read_signature"""
+    return 'columns-' + hashlib.sha1('\n'.join(headers).encode('utf-8')).hexdigest()[:16]
+
+def decode_header(record):
+    """Column names and encoding of a raw header record, named as pd.read_csv names them
+
+    Returns (headers, encoding), or None when pandas cannot read the record on its own
+    (a quote never closed) and the file has to be read.
+    """
+    try:
+        text, encoding = record.decode('utf-8-sig'), 'utf-8-sig'
+    except UnicodeDecodeError:
+        text, encoding = record.decode('big5', errors='replace'), 'big5'
+    try:
+        return tuple(pd.read_csv(io.StringIO(text), nrows=0).columns), encoding
+    except pd.errors.ParserError:
+        return None
+
+class HeaderRegistry:
+    """Header layouts seen across runs, keyed by the fingerprint of a file's header record.
+
+    signatures maps a fingerprint to its group id and encoding; groups maps a group id
+    (error_sink.group_id of the headers, so quarantine files share it) to the headers,
+    schema name and the first file seen with them; files maps a file to its size,
+    mtime, fingerprint and, once a read has found it, the encoding of its contents.
+    An unchanged file is resolved from its stat alone and a new file with a known
+    fingerprint from the bytes of its header, so only new layouts are ever decoded and
+    parsed, and an unchanged file's encoding is never detected again.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.signatures = {}
+        self.groups = {}
+        self.files = {}
+        self.seen = set()
+        self.hits = 0
+
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # Groups are named after their headers, so they hold under any fingerprint
+            self.groups = data.get('groups', {})
+            if data.get('version') == VERSION:
+                self.signatures = data.get('signatures', {})
+                self.files = data.get('files', {})
+
+    def cached(self, key, path):
+        """Group id of a file whose size and mtime match the last run, else None"""
+        self.seen.add(key)
+        entry = self.files.get(key)
+        if entry is None or entry['signature'] not in self.signatures:
+            return None
+        stat = path.stat()
+        if entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+            return None
+        self.hits += 1
+        return self.signatures[entry['signature']]['group']
+
+    def known(self, fingerprint):
+        return fingerprint in self.signatures
+
+    def register(self, key, path, fingerprint, headers=None, encoding=None):
+        """Record a file's fingerprint; headers are only needed for a new fingerprint.
+        Returns the file's group id.
+        """
+        self.seen.add(key)
+        if fingerprint not in self.signatures:
+            group_id = error_sink.group_id(headers)
+            self.groups.setdefault(group_id, {
+                'headers': list(headers),
+                'schema': lvr_schema.schema_for_file(path.name),
+                'sample': path.name,
+            })
+            self.signatures[fingerprint] = {'group': group_id, 'encoding': encoding}
+
+        stat = path.stat()
+        self.files[key] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'signature': fingerprint}
+        return self.signatures[fingerprint]['group']
+
+    def headers(self, group_id):
+        return tuple(self.groups[group_id]['headers'])
+
+    def encoding(self, key):
+        """Encoding a read found for the file's contents while it had its current size and
+        mtime, None if it has not been read since"""
+        return self.files.get(key, {}).get('encoding')
+
+    def record_encoding(self, key, encoding):
+        """Remember the encoding a read found for a file registered this run"""
+        if key in self.files and encoding:
+            self.files[key]['encoding'] = encoding
+
+    def save(self):
+        """Write the registry, dropping files not seen this run; fingerprints and groups are kept"""
+        self.files = {key: entry for key, entry in self.files.items() if key in self.seen}
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': VERSION, 'signatures': self.signatures, 'groups': self.groups,
+                       'files': self.files}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the header groups known to the processor's registry")
+    parser.add_argument('registry', nargs='?', type=Path, default=Path("property-infos/header-registry.json"),
+                        help="registry file (default: property-infos/header-registry.json)")
+    args = parser.parse_args()
+
+    registry = HeaderRegistry(args.registry)
+    files_per_group = {}
+    for entry in registry.files.values():
+        group_id = registry.signatures.get(entry['signature'], {}).get('group')
+        files_per_group[group_id] = files_per_group.get(group_id, 0) + 1
+    print(f"{len(registry.groups)} groups, {len(registry.signatures)} fingerprints, {len(registry.files)} files")
+    for group_id, group in registry.groups.items():
+        print(f"  {group_id}  {group['schema'] or 'none':<18} {files_per_group.get(group_id, 0):>6} files  "
+              f"sample {group['sample']}  ({len(group['headers'])} columns)")
@@ -0,0 +1,183 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import lvr_schema
+import parquet_store
+
+SERIAL_COLUMN = '編號'
+DETAIL_TABLES = ['build', 'land', 'park']
+
+# Joined partitions keep the dataset layout, under their own table name, so
+# parquet_store.read_dataset reads them like any other table
+JOINED_TABLE = 'joined'
+
+NUMERIC_KINDS = (lvr_schema.INTEGER, lvr_schema.SMALL_INTEGER, lvr_schema.FLOAT)
+
+def list_partitions(dataset_dir, cities=None, quarters=None):
+    """(city, trans_type, quarter) of every partition with a main table, optionally filtered"""
+    partitions = []
+    for path in sorted(Path(dataset_dir).glob('city=*/trans_type=*/table=main/quarter=*')):
+        keys = dict(part.split('=', 1) for part in path.relative_to(dataset_dir).parts)
+        if cities and keys['city'] not in cities:
+            continue
+        if quarters and keys['quarter'] not in quarters:
+            continue
+        partitions.append((keys['city'], keys['trans_type'], keys['quarter']))
+    return partitions
+
+def serial_keys(df):
+    """Stripped serial numbers, None for rows without one (or the English header row)"""
+    serial = df[SERIAL_COLUMN].astype(object).where(df[SERIAL_COLUMN].notna())
+    serial = serial.str.strip()
+    no_serial = serial.isna() | serial.eq('') | serial.str.lower().eq(lvr_schema.ENGLISH_HEADER_SERIAL)
+    return serial.where(~no_serial)
+
+def detail_values(detail):
+    """The columns of a detail table worth carrying over: not the source or partition columns"""
+    return detail.drop(columns=['source_file'] + parquet_store.PARTITION_COLUMNS, errors='ignore')
+
+def aggregate_details(detail, serial, table):
+    """Hash-aggregate a detail table by serial: a row count plus the sum of every numeric column
+
+    Which columns are numeric comes from the table's schema, so text (untyped) and
+    typed datasets aggregate the same way.
+    """
+    types = lvr_schema.SCHEMAS[lvr_schema.SCHEMA_FILES[(table, None)]]
+    numeric = [col for col in detail.columns if types.get(col) in NUMERIC_KINDS]
+
+    values = pd.DataFrame({col: pd.to_numeric(detail[col].astype(object).str.replace(',', '', regex=False)
+                                              if detail[col].dtype == object else detail[col], errors='coerce')
+                           for col in numeric}, index=detail.index)
+    grouped = values.groupby(serial, sort=False)
+    aggregated = grouped.sum(min_count=1).add_prefix(f"{table}_").add_suffix('_sum')
+    aggregated.insert(0, f"{table}_count", grouped.size())
+    return aggregated
+
+def nest_details(main_serial, detail, serial):
+    """list<struct> column holding, for every main row, its detail rows in file order
+
+    The detail rows are sorted by serial once; each main row then finds its run of rows
+    with two binary searches, and the runs are gathered with a single take.
+    """
+    keyed = serial.notna().to_numpy()
+    values = detail_values(detail)[keyed]
+    detail_serials = serial[keyed].to_numpy(dtype=object)
+
+    order = np.argsort(detail_serials, kind='stable')
+    sorted_serials = detail_serials[order]
+    lookup = main_serial.fillna('').to_numpy(dtype=object)
+    starts = np.searchsorted(sorted_serials, lookup, side='left')
+    ends = np.searchsorted(sorted_serials, lookup, side='right')
+    lengths = np.where(main_serial.notna().to_numpy(), ends - starts, 0)
+
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int32)
+    np.cumsum(lengths, out=offsets[1:])
+    positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+    indices = order[positions]
+
+    table = pa.Table.from_pandas(values, schema=parquet_store.arrow_schema(values), preserve_index=False)
+    structs = pa.StructArray.from_arrays([col.combine_chunks() for col in table.columns], fields=list(table.schema))
+    return pa.ListArray.from_arrays(pa.array(offsets), structs.take(pa.array(indices, type=pa.int64())))
+
+def join_partition(dataset_dir, output_dir, city, trans_type, quarter, mode='aggregate'):
+    """Join one city/transaction type/quarter partition's main table with its detail tables.
+
+    Only this partition's tables are ever in memory. Returns
+    (rows, {table: matched detail rows}, {table: orphan detail rows}, bytes_written).
+    """
+    partition = {'city': city, 'trans_type': trans_type, 'quarter': quarter}
+    main = parquet_store.read_dataset(dataset_dir, table='main', **partition)
+    main = main.drop(columns=parquet_store.PARTITION_COLUMNS, errors='ignore')
+    main_serial = serial_keys(main)
+    main_serials = set(main_serial.dropna())
+
+    matched = {}
+    orphans = {}
+    nested = {}
+    for table in DETAIL_TABLES:
+        detail = parquet_store.read_dataset(dataset_dir, table=table, **partition)
+        if detail.empty or SERIAL_COLUMN not in detail.columns:
+            detail = pd.DataFrame({SERIAL_COLUMN: pd.Series(dtype=object)})
+        serial = serial_keys(detail)
+        in_main = serial.isin(main_serials)
+        matched[table] = int(in_main.sum())
+        orphans[table] = int((serial.notna() & ~in_main).sum())
+
+        if mode == 'nested':
+            nested[table] = nest_details(main_serial, detail, serial)
+        else:
+            aggregated = aggregate_details(detail, serial, table).reindex(main_serial.to_numpy())
+            main = pd.concat([main, aggregated.set_axis(main.index)], axis=1)
+            main[f"{table}_count"] = main[f"{table}_count"].fillna(0).astype('int64')
+        del detail
+
+    file_name = f"{city}_lvr_land_{trans_type}-{quarter}.parquet"
+    output_path = (Path(output_dir) / f"city={city}" / f"trans_type={trans_type}" / f"table={JOINED_TABLE}"
+                   / f"quarter={quarter}" / file_name)
+    if mode == 'nested':
+        joined = pa.Table.from_pandas(main, schema=parquet_store.arrow_schema(main),
+                                      preserve_index=False).replace_schema_metadata(None)
+        for table, column in nested.items():
+            joined = joined.append_column(table, column)
+        rows, bytes_written = parquet_store.write_parquet_chunks([joined], output_path)
+    else:
+        rows, bytes_written = parquet_store.write_parquet_chunks([main.reset_index(drop=True)], output_path)
+
+    return rows, matched, orphans, bytes_written
+
+def join_dataset(dataset_dir, output_dir, mode='aggregate', workers=1, cities=None, quarters=None):
+    """Join every partition of the dataset, one partition per task. Returns (rows, bytes) over all of them."""
+    partitions = list_partitions(dataset_dir, cities, quarters)
+    print(f"\n=== Joining {len(partitions)} partitions ({mode}) into {output_dir} ===")
+
+    partition_cities, trans_types, partition_quarters = (list(col) for col in zip(*partitions)) if partitions else ([], [], [])
+    args = [[dataset_dir] * len(partitions), [output_dir] * len(partitions),
+            partition_cities, trans_types, partition_quarters, [mode] * len(partitions)]
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    results = executor.map(join_partition, *args) if executor else map(join_partition, *args)
+
+    total_rows = 0
+    total_bytes = 0
+    try:
+        for (city, trans_type, quarter), (rows, matched, orphans, bytes_written) in zip(partitions, results):
+            total_rows += rows
+            total_bytes += bytes_written
+            details = ', '.join(f"{table} {matched[table]}" for table in DETAIL_TABLES)
+            print(f"  ✓ city={city} trans_type={trans_type} quarter={quarter}: {rows} transactions ({details})")
+            if any(orphans.values()):
+                missing = ', '.join(f"{table} {count}" for table, count in orphans.items() if count)
+                print(f"    ! Detail rows with no transaction: {missing}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return total_rows, total_bytes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Join main tables with their build/land/park details, "
+                                                 "one city/quarter partition at a time")
+    parser.add_argument('dataset_dir', nargs='?', type=Path, default=Path("property-infos/dataset"),
+                        help="Parquet dataset written by the processor with --output parquet "
+                             "(default: property-infos/dataset)")
+    parser.add_argument('--output-dir', type=Path, default=Path("property-infos/joined"),
+                        help="where the joined partitions go (default: property-infos/joined)")
+    parser.add_argument('--mode', choices=['aggregate', 'nested'], default='aggregate',
+                        help="per-table counts and sums of numeric columns, or the detail rows "
+                             "themselves as list columns (default: aggregate)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="join N partitions at a time in separate processes (default: 1)")
+    parser.add_argument('--city', nargs='+', help="only these cities (a, b, ...)")
+    parser.add_argument('--quarter', nargs='+', help="only these quarters (2020Q4, ...)")
+    args = parser.parse_args()
+
+    rows, bytes_written = join_dataset(args.dataset_dir, args.output_dir, mode=args.mode, workers=args.workers,
+                                       cities=args.city, quarters=args.quarter)
+
+    print("\n=== Join Complete ===")
+    print(f"Transactions written: {rows}")
+    print(f"Output size: {bytes_written / (1024 * 1024):.2f} MB")
@@ -0,0 +1,183 @@
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import roc_date
+
+# Column kinds; columns a schema does not list stay strings
+INTEGER = 'Int64'  # prices and money amounts, nullable
+SMALL_INTEGER = 'Int16'  # counts and floor numbers, nullable
+FLOAT = 'float64'  # areas and unit prices
+CATEGORY = 'category'  # low-cardinality text
+ROC_DATE = 'roc_date'  # ROC (Minguo) dates such as 1090911
+
+# Table kind and transaction type -> schema file, as in the readme tables
+SCHEMA_FILES = {
+    ('main', 'a'): 'schema-main',
+    ('main', 'b'): 'schema-main-sale',
+    ('main', 'c'): 'schema-main-rent',
+    ('build', None): 'schema-build',
+    ('land', None): 'schema-land',
+    ('park', None): 'schema-park',
+}
+
+_MAIN_COMMON = {
+    '鄉鎮市區': CATEGORY,
+    '都市土地使用分區': CATEGORY,
+    '非都市土地使用分區': CATEGORY,
+    '非都市土地使用編定': CATEGORY,
+    '總樓層數': CATEGORY,
+    '建物型態': CATEGORY,
+    '主要用途': CATEGORY,
+    '主要建材': CATEGORY,
+    '建築完成年月': ROC_DATE,
+    '建物現況格局-房': SMALL_INTEGER,
+    '建物現況格局-廳': SMALL_INTEGER,
+    '建物現況格局-衛': SMALL_INTEGER,
+    '建物現況格局-隔間': CATEGORY,
+    '有無管理組織': CATEGORY,
+    '單價元平方公尺': FLOAT,
+    '車位類別': CATEGORY,
+}
+
+_MAIN_SALE = {
+    **_MAIN_COMMON,
+    '交易標的': CATEGORY,
+    '土地移轉總面積平方公尺': FLOAT,
+    '交易年月日': ROC_DATE,
+    '移轉層次': CATEGORY,
+    '建物移轉總面積平方公尺': FLOAT,
+    '總價元': INTEGER,
+    '車位移轉總面積平方公尺': FLOAT,
+    '車位移轉總面積(平方公尺)': FLOAT,
+    '車位總價元': INTEGER,
+    '主建物面積': FLOAT,
+    '附屬建物面積': FLOAT,
+    '陽台面積': FLOAT,
+    '電梯': CATEGORY,
+}
+
+SCHEMAS = {
+    'schema-main': _MAIN_SALE,
+    'schema-main-sale': _MAIN_SALE,
+    'schema-main-rent': {
+        **_MAIN_COMMON,
+        '租賃標的': CATEGORY,
+        '土地面積平方公尺': FLOAT,
+        '租賃年月日': ROC_DATE,
+        '租賃層次': CATEGORY,
+        '建物總面積平方公尺': FLOAT,
+        '有無附傢俱': CATEGORY,
+        '總額元': INTEGER,
+        '車位面積平方公尺': FLOAT,
+        '車位總額元': INTEGER,
+        '出租型態': CATEGORY,
+        '有無管理員': CATEGORY,
+        '有無電梯': CATEGORY,
+        '租賃住宅服務': CATEGORY,
+    },
+    'schema-build': {
+        '屋齡': FLOAT,
+        '建物移轉面積平方公尺': FLOAT,
+        '建物移轉面積': FLOAT,
+        '主要用途': CATEGORY,
+        '主要建材': CATEGORY,
+        '建築完成日期': ROC_DATE,
+        '總層數': CATEGORY,
+        '建物分層': CATEGORY,
+        '移轉情形': CATEGORY,
+    },
+    'schema-land': {
+        '土地移轉面積平方公尺': FLOAT,
+        '使用分區或編定': CATEGORY,
+        '權利人持分分母': INTEGER,
+        '權利人持分分子': INTEGER,
+        '移轉情形': CATEGORY,
+    },
+    'schema-park': {
+        '車位類別': CATEGORY,
+        '車位價格': INTEGER,
+        '車位面積平方公尺': FLOAT,
+        '車位所在樓層': CATEGORY,
+    },
+}
+
+# Newer releases repeat the header in English as the first data row
+ENGLISH_HEADER_SERIAL = 'serial number'
+
+# a_lvr_land_a_build-2020Q4.csv -> city a, transaction type a, table build, quarter 2020Q4
+FILE_NAME_PATTERN = re.compile(r'^([a-z])_lvr_land_([abc])(?:_(build|land|park))?(?:-(.+))?$')
+
+def file_keys(file_name):
+    """Get city, transaction type, table and quarter of an LVR file from its name
+    Example: h_lvr_land_a_park-2020Q4.csv -> {'city': 'h', 'trans_type': 'a', 'table': 'park', 'quarter': '2020Q4'}
+    Example: h_lvr_land_a.csv -> {'city': 'h', 'trans_type': 'a', 'table': 'main', 'quarter': None}
+    """
+    match = FILE_NAME_PATTERN.match(Path(file_name).stem)
+    if not match:
+        return None
+
+    city, trans_type, table, quarter = match.groups()
+    return {'city': city, 'trans_type': trans_type, 'table': table or 'main', 'quarter': quarter}
+
+def schema_for_file(file_name):
+    """Get the schema name of an LVR file from its name
+    Example: a_lvr_land_b.csv -> 'schema-main-sale'
+    Example: a_lvr_land_c_park-2020Q4.csv -> 'schema-park'
+    """
+    keys = file_keys(file_name)
+    if keys is None:
+        return None
+
+    if keys['table'] != 'main':
+        return SCHEMA_FILES[(keys['table'], None)]
+    return SCHEMA_FILES[('main', keys['trans_type'])]
+
+def convert_chunk(df, schema_name):
+    """Convert a dtype=str chunk to the column types of its schema
+
+    Returns (typed_df, failed_df). Rows with a value that cannot be read as the number its
+    column holds are taken out into failed_df, with the offending columns in an 'error_type'
+    column, instead of failing the whole load. Unreadable ROC dates are common in otherwise
+    good records (e.g. completion dates), so those become NaT and keep the row.
+    """
+    types = SCHEMAS.get(schema_name, {})
+
+    if '編號' in df.columns:
+        english_header = df['編號'].str.strip().str.lower().eq(ENGLISH_HEADER_SERIAL)
+        df = df[~english_header.fillna(False)]
+    raw_df = df
+    df = df.copy()
+
+    failed_columns = pd.Series('', index=df.index)
+    for col, kind in types.items():
+        if col not in df.columns:
+            continue
+        raw = df[col]
+
+        if kind in (INTEGER, SMALL_INTEGER, FLOAT):
+            numbers = pd.to_numeric(raw.str.replace(',', '', regex=False).str.strip(), errors='coerce')
+            bad = raw.notna() & raw.str.strip().ne('') & numbers.isna()
+            if kind != FLOAT:
+                limits = np.iinfo(kind.lower())
+                bad |= numbers.notna() & ((numbers % 1 != 0) | (numbers < limits.min) | (numbers > limits.max))
+            failed_columns.loc[bad] += f"{col};"
+            df[col] = numbers.where(~bad).astype(kind)
+        elif kind == CATEGORY:
+            df[col] = raw.astype('category')
+        elif kind == ROC_DATE:
+            df[col] = roc_date.roc_to_datetime64(raw)
+
+    failed = failed_columns.ne('')
+    failed_df = raw_df.loc[failed].assign(error_type="Type conversion failed: " + failed_columns[failed].str.rstrip(';'))
+    return df[~failed], failed_df
+
+def concat_typed(frames):
+    """pd.concat that keeps categorical columns categorical when their categories differ"""
+    combined = pd.concat(frames, ignore_index=True)
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype) and not isinstance(combined[col].dtype, pd.CategoricalDtype):
+            combined[col] = combined[col].astype('category')
+    return combined
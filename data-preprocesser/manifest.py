@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import zip_source
+
+def content_hash(path, block_size=1 << 20):
+    """Hash a file's bytes; zip members use the CRC32 the archive already stores"""
+    if isinstance(path, zip_source.ZipMember):
+        return f"crc32:{path.info().CRC:08x}"
+
+    sha = hashlib.sha256()
+    with path.open('rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return f"sha256:{sha.hexdigest()}"
+
+class Manifest:
+    """Input files seen by the last run, keyed by relative path.
+
+    Each entry holds the file's size, mtime and content hash, plus whatever the
+    caller records about what the file produced (header group, output path
+    relative to the output folder, so the manifest holds wherever the run starts).
+    The content is only hashed when size or mtime moved, so checking an
+    unchanged tree costs one stat per file.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.files = {}
+        self.groups = {}
+        self.seen = set()
+
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.files = data.get('files', {})
+            self.groups = data.get('groups', {})
+
+    def check(self, key, path):
+        """Return (changed, entry) for a file; entry is what to record for it if it gets processed"""
+        self.seen.add(key)
+        stat = path.stat()
+        old = self.files.get(key)
+
+        if old and old['size'] == stat.st_size and old['mtime'] == stat.st_mtime:
+            return False, dict(old)
+
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': content_hash(path)}
+        if old and old['hash'] == entry['hash']:
+            # Touched but identical: keep what it produced, remember the new mtime
+            return False, {**old, **entry}
+        return True, entry
+
+    def record(self, key, entry):
+        self.files[key] = entry
+
+    def removed(self):
+        """Entries for files that were in the last run but not checked in this one"""
+        return {key: entry for key, entry in self.files.items() if key not in self.seen}
+
+    def forget(self, key):
+        self.files.pop(key, None)
+
+    def save(self):
+        """Write the manifest, replacing the old one only once the new one is complete"""
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'files': self.files, 'groups': self.groups}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,124 @@
+import os
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import lvr_schema
+
+# Hive-style partition folders, outermost first: city=a/trans_type=a/table=main/quarter=2020Q4
+PARTITION_COLUMNS = ['city', 'trans_type', 'table', 'quarter']
+
+# Integer columns come back as nullable pandas integers, not floats, when they have gaps
+PANDAS_INTEGER_TYPES = {pa.int16(): pd.Int16Dtype(), pa.int64(): pd.Int64Dtype()}
+
+def partition_keys(file_name):
+    """Get the partition values of a grouped LVR file from its name, the keys of
+    lvr_schema.file_keys with 'unknown' for a missing quarter
+    Example: h_lvr_land_a_park-2020Q4.csv -> {'city': 'h', 'trans_type': 'a', 'table': 'park', 'quarter': '2020Q4'}
+    Example: h_lvr_land_a.csv -> {'city': 'h', 'trans_type': 'a', 'table': 'main', 'quarter': 'unknown'}
+    """
+    keys = lvr_schema.file_keys(file_name)
+    if keys is None:
+        return None
+    return {**keys, 'quarter': keys['quarter'] or 'unknown'}
+
+def partition_file_path(dataset_dir, file_name):
+    """Return where a source file's rows live in the dataset, or None if its name has no partition"""
+    keys = partition_keys(file_name)
+    if keys is None:
+        return None
+
+    partition_dir = Path(dataset_dir).joinpath(*(f"{col}={keys[col]}" for col in PARTITION_COLUMNS))
+    return partition_dir / f"{Path(file_name).stem}.parquet"
+
+def arrow_schema(df):
+    """Arrow schema for a chunk, keeping text columns as strings even when a chunk is all empty
+
+    Categorical columns (typed loading) become dictionary<int32, string> so later
+    chunks with more categories still fit the schema of the first one.
+    """
+    schema = pa.Schema.from_pandas(df, preserve_index=False).remove_metadata()
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, pa.field(field.name, pa.string()))
+        elif pa.types.is_dictionary(field.type):
+            schema = schema.set(i, pa.field(field.name, pa.dictionary(pa.int32(), pa.string())))
+    return schema
+
+def write_parquet_chunks(chunks, output_path):
+    """Write DataFrame (or Arrow table) chunks as row groups of one Parquet file.
+
+    The file is written under a temporary name and moved into place when done,
+    so a failed write never leaves a partial partition behind. A None in chunks
+    discards everything written so far and starts over (read_csv_chunks yields
+    one before each read attempt). Returns (rows_written, bytes_written).
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    # Dot-prefixed so dataset discovery never picks it up
+    tmp_path = output_path.parent / f".{output_path.name}.tmp"
+
+    writer = None
+    schema = None
+    rows = 0
+    try:
+        for chunk in chunks:
+            if chunk is None:
+                if writer is not None:
+                    writer.close()
+                    writer = None
+                rows = 0
+                continue
+
+            if writer is None:
+                schema = chunk.schema if isinstance(chunk, pa.Table) else arrow_schema(chunk)
+                writer = pq.ParquetWriter(tmp_path, schema, compression='zstd')
+            if not isinstance(chunk, pa.Table):
+                chunk = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            writer.write_table(chunk)
+            rows += chunk.num_rows
+
+        if writer is None:
+            return 0, 0
+        writer.close()
+        writer = None
+        os.replace(tmp_path, output_path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    return rows, output_path.stat().st_size
+
+def read_dataset(dataset_dir, columns=None, **filters):
+    """Load only the partitions and columns asked for.
+
+    Each filter is a partition column with a value or a list of values:
+        read_dataset('property-infos/dataset', columns=['總價元'], city='a', quarter=['2020Q3', '2020Q4'])
+    Files with older header layouts are unified, missing columns come back empty.
+    """
+    partition_schema = pa.schema([(col, pa.string()) for col in PARTITION_COLUMNS])
+    partitioning = ds.partitioning(partition_schema, flavor='hive')
+    dataset = ds.dataset(dataset_dir, format='parquet', partitioning=partitioning)
+
+    expression = None
+    for col, value in filters.items():
+        if col not in PARTITION_COLUMNS:
+            raise ValueError(f"Unknown partition column: {col}")
+        values = [value] if isinstance(value, str) else list(value)
+        condition = ds.field(col).isin(values)
+        expression = condition if expression is None else expression & condition
+
+    # Only the footers of the selected partitions are read to merge their schemas
+    fragments = list(dataset.get_fragments(filter=expression))
+    if not fragments:
+        return pd.DataFrame()
+    schema = pa.unify_schemas([f.physical_schema for f in fragments] + [partition_schema])
+    dataset = ds.dataset([f.path for f in fragments], schema=schema, format='parquet',
+                         partitioning=partitioning, partition_base_dir=str(dataset_dir))
+
+    return dataset.to_table(columns=columns, filter=expression).to_pandas(types_mapper=PANDAS_INTEGER_TYPES.get)
@@ -0,0 +1,263 @@
+import argparse
+import importlib.util
+import json
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import download_engine
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROCESSOR_SCRIPT = SCRIPT_DIR / "[archived]rawdata-processor.py"
+
+# Every quarter goes through these in order; a quarter is done once it is combined
+STAGES = ['fetch', 'rename', 'group', 'combine']
+
+def load_script(file_name):
+    """Import one of the hyphenated scripts (rawdata-grouper.py, ...) as a module"""
+    spec = importlib.util.spec_from_file_location(re.sub(r'\W', '_', Path(file_name).stem), SCRIPT_DIR / file_name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class Checkpoints:
+    """Stages each season has completed, saved after every stage so an interrupted run resumes.
+
+    Entries are keyed by season value (113S4) and hold the season's name and, per
+    completed stage, when it finished and what it produced.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.seasons = {}
+        self.lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.seasons = json.load(f).get('seasons', {})
+
+    def done(self, season, stage):
+        return stage in self.seasons.get(season, {}).get('stages', {})
+
+    def get(self, season, stage):
+        return self.seasons.get(season, {}).get('stages', {}).get(stage)
+
+    def next_stage(self, season):
+        """First stage the season has not completed, None when it went through all of them"""
+        return next((stage for stage in STAGES if not self.done(season, stage)), None)
+
+    def complete(self, season, name, stage, **info):
+        with self.lock:
+            entry = self.seasons.setdefault(season, {'name': name, 'stages': {}})
+            entry['stages'][stage] = {'finished': datetime.now().isoformat(timespec='seconds'), **info}
+            self.save()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'seasons': self.seasons}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+def extract_season(archive, source_dir, name, renamer):
+    """Unzip a season archive to property_data_<name> and rename it the way folder-renamer.py does
+
+    Returns the rawdata-* folder. A folder left half-extracted by an interrupted run is
+    extracted again; a renamed one is complete and kept.
+    """
+    target = renamer.renamed_folder(f"property_data_{name}")
+    if target is None:
+        raise ValueError(f"No quarter in season name {name}")
+    if (Path(source_dir) / target).exists():
+        return Path(source_dir) / target
+
+    extract_dir = Path(source_dir) / f"property_data_{name}"
+    if extract_dir.exists():
+        shutil.rmtree(extract_dir)
+    with zipfile.ZipFile(archive) as zf:
+        zf.extractall(extract_dir)
+    return Path(source_dir) / renamer.rename_folder(source_dir, extract_dir.name)
+
+def combine(property_infos_dir, output='parquet', workers=1, streaming=False, typed=False, prevalidate=False,
+            cubes=False, normalize_addresses=False):
+    """Run the processor incrementally over property_infos_dir
+
+    It runs as its own process: its worker pool pickles functions by module name, which
+    only works when the processor is the main script.
+    """
+    command = [sys.executable, str(PROCESSOR_SCRIPT), '--incremental', '--property-infos', str(property_infos_dir),
+               '--output', output, '--workers', str(workers)]
+    for flag, enabled in [('--streaming', streaming), ('--typed', typed), ('--prevalidate', prevalidate),
+                          ('--cubes', cubes), ('--normalize-addresses', normalize_addresses)]:
+        if enabled:
+            command.append(flag)
+    subprocess.run(command, check=True)
+
+def run_pipeline(seasons, work_dir, names=None, fetch_workers=4, url_template=download_engine.DOWNLOAD_URL,
+                 checksums=None, group_mode='hardlink', output='parquet', workers=1, streaming=False,
+                 typed=False, prevalidate=False, cubes=False, normalize_addresses=False):
+    """Take every season from download to combined output, each season a unit of work.
+
+    Downloads run fetch_workers at a time; each season is unzipped and renamed as soon as
+    its archive is in, in season order, then handed to a downstream thread that groups and
+    combines. While that thread combines, the next seasons keep downloading. It takes
+    every season queued by the time it is free, so one grouper/processor run covers
+    them all; both run incrementally, so earlier seasons are not parsed again.
+
+    Layout under work_dir: downloads/ (archives), raw/ (rawdata-* folders and the grouper
+    manifest), property-infos/ (transaction folders and outputs) and pipeline-state.json
+    (the checkpoints). Returns the checkpoints.
+    """
+    work_dir = Path(work_dir)
+    downloads_dir = work_dir / "downloads"
+    source_dir = work_dir / "raw"
+    property_infos_dir = work_dir / "property-infos"
+    for folder in [downloads_dir, source_dir, property_infos_dir]:
+        folder.mkdir(parents=True, exist_ok=True)
+
+    names = {season: (names or {}).get(season) or download_engine.season_name(season) for season in seasons}
+    checkpoints = Checkpoints(work_dir / "pipeline-state.json")
+    renamer = load_script("folder-renamer.py")
+    grouper = load_script("rawdata-grouper.py")
+
+    pending = [season for season in seasons if checkpoints.next_stage(season) is not None]
+    print(f"\n=== Pipeline: {len(seasons)} seasons, {len(seasons) - len(pending)} already done ===")
+
+    downstream = queue.Queue()
+    failures = {}
+
+    def group_and_combine():
+        """Downstream stage: group and combine whatever seasons are ready, until None arrives"""
+        finished = False
+        while not finished:
+            batch = [downstream.get()]
+            while True:
+                try:
+                    batch.append(downstream.get_nowait())
+                except queue.Empty:
+                    break
+            finished = None in batch
+            batch = [season for season in batch if season is not None]
+            if not batch:
+                continue
+
+            try:
+                to_group = [season for season in batch if not checkpoints.done(season, 'group')]
+                if to_group:
+                    print(f"\n=== Grouping: {', '.join(names[season] for season in to_group)} ===")
+                    grouper.organize_files(str(source_dir), incremental=True, mode=group_mode,
+                                           dest_dir=str(property_infos_dir))
+                    for season in to_group:
+                        checkpoints.complete(season, names[season], 'group')
+
+                print(f"\n=== Combining: {', '.join(names[season] for season in batch)} ===")
+                combine(property_infos_dir, output=output, workers=workers, streaming=streaming, typed=typed,
+                        prevalidate=prevalidate, cubes=cubes, normalize_addresses=normalize_addresses)
+                for season in batch:
+                    checkpoints.complete(season, names[season], 'combine', output=output)
+            except Exception as e:
+                for season in batch:
+                    failures[season] = f"group/combine: {e}"
+                print(f"  ✗ Group/combine failed for {', '.join(batch)}: {e}")
+
+    consumer = threading.Thread(target=group_and_combine, name="group-combine")
+    consumer.start()
+
+    session = download_engine.make_session(pool_size=fetch_workers)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, fetch_workers)) as fetch_pool:
+            fetches = {}
+            for season in pending:
+                if not checkpoints.done(season, 'fetch'):
+                    fetches[season] = fetch_pool.submit(download_engine.download_season, session, season,
+                                                        downloads_dir, url_template, names[season], checksums)
+
+            for season in pending:
+                # Fetch: wait for this season's download, the later ones carry on meanwhile
+                if season in fetches:
+                    result = fetches[season].result()
+                    if result['status'] == 'failed':
+                        failures[season] = f"fetch: {result['error']}"
+                        print(f"  ✗ {names[season]}: download failed: {result['error']}")
+                        continue
+                    checkpoints.complete(season, names[season], 'fetch', path=result['path'],
+                                         bytes=result['bytes'], sha256=result['sha256'])
+                    print(f"  ✓ Fetched {names[season]} ({result['status']})")
+
+                # Rename: unzip into raw/ as a rawdata-* folder
+                if not checkpoints.done(season, 'rename'):
+                    try:
+                        archive = checkpoints.get(season, 'fetch')['path']
+                        folder = extract_season(archive, source_dir, names[season], renamer)
+                    except Exception as e:
+                        failures[season] = f"rename: {e}"
+                        print(f"  ✗ {names[season]}: could not unzip and rename: {e}")
+                        continue
+                    checkpoints.complete(season, names[season], 'rename', folder=folder.name)
+                    print(f"  ✓ Renamed {names[season]} -> {folder.name}")
+
+                downstream.put(season)
+    finally:
+        downstream.put(None)
+        consumer.join()
+
+    done = [season for season in seasons if checkpoints.next_stage(season) is None]
+    print("\n=== Pipeline Complete ===")
+    print(f"Seasons done: {len(done)} of {len(seasons)}")
+    for season, error in failures.items():
+        print(f"  ✗ {names[season]}: {error}")
+    print(f"Checkpoints: {checkpoints.path}")
+    return checkpoints
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch, rename, group and combine LVR seasons in one "
+                                                 "non-interactive, resumable run")
+    parser.add_argument('seasons', nargs='*', help="season values (113S4 ...); default: every past season "
+                                                   "listed on the site (needs selenium)")
+    parser.add_argument('--work-dir', type=Path, default=Path("lvr-pipeline"),
+                        help="where downloads, raw folders, outputs and checkpoints go (default: lvr-pipeline)")
+    parser.add_argument('--fetch-workers', type=int, default=4, help="seasons downloaded at once (default: 4)")
+    parser.add_argument('--url-template', default=download_engine.DOWNLOAD_URL,
+                        help="archive URL with a {season} placeholder (default: the open data site)")
+    parser.add_argument('--checksums', type=Path, help="sha256sum-style file of expected archive checksums")
+    parser.add_argument('--group-mode', choices=['copy', 'hardlink', 'reflink', 'symlink'], default='hardlink',
+                        help="how the grouper places files (default: hardlink)")
+    parser.add_argument('--output', choices=['csv', 'parquet'], default='parquet',
+                        help="processor output; Parquet partitions let each run write only the new "
+                             "seasons (default: parquet)")
+    parser.add_argument('--workers', type=int, default=1, help="processor worker processes (default: 1)")
+    parser.add_argument('--streaming', action='store_true', help="processor streaming mode (CSV output)")
+    parser.add_argument('--typed', action='store_true', help="processor typed mode")
+    parser.add_argument('--prevalidate', action='store_true', help="processor pre-validation")
+    parser.add_argument('--cubes', action='store_true',
+                        help="keep the processor's aggregate cube of price statistics up to date")
+    parser.add_argument('--normalize-addresses', action='store_true',
+                        help="add the processor's normalized_address column")
+    args = parser.parse_args()
+
+    names = None
+    seasons = args.seasons
+    if not seasons:
+        fetcher = load_script("rawdata-fetcher.py")
+        driver = fetcher.setup_driver()
+        try:
+            fetcher.navigate_to_website(driver)
+            listed = fetcher.list_history_seasons(driver)
+        finally:
+            driver.quit()
+        seasons = [value for value, _ in listed]
+        names = dict(listed)
+
+    checksums = download_engine.read_checksums(args.checksums) if args.checksums else None
+    run_pipeline(seasons, args.work_dir, names=names, fetch_workers=args.fetch_workers,
+                 url_template=args.url_template, checksums=checksums, group_mode=args.group_mode,
+                 output=args.output, workers=args.workers, streaming=args.streaming, typed=args.typed,
+                 prevalidate=args.prevalidate, cubes=args.cubes,
+                 normalize_addresses=args.normalize_addresses)
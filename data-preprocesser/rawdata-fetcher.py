@@ -6,9 +6,10 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 import time
-import os
-import glob
-from datetime import datetime
+import argparse
+from pathlib import Path
+
+import download_engine
 
 def setup_driver():
     """Setup and configure Chrome WebDriver"""
@@ -36,69 +37,70 @@ def navigate_to_website(driver):
     )
     history_link.click()
 
-def click_all_downloads(driver):
-    WebDriverWait(driver, 10).until(
-        EC.presence_of_all_elements_located((By.CLASS_NAME, "i_download"))
-    )
-    
-    download_elements = driver.find_elements(By.CLASS_NAME, "i_download")
-    
-    for download in download_elements:
-        download.click()
-        time.sleep(2)
+def download_current_data(download_dir, url=download_engine.CURRENT_URL, checksums=None):
+    """Download the current period's CSV archive to property_data_本期<date>.zip in download_dir
+
+    It goes through download_engine like the past seasons, so it is resumed, verified
+    and named the same way rather than left in the browser's download folder.
+    """
+    return download_engine.download_seasons([download_engine.CURRENT_SEASON], download_dir, workers=1,
+                                            url_template=url,
+                                            names={download_engine.CURRENT_SEASON: download_engine.current_name()},
+                                            checksums=checksums)
 
-def download_historical_data(driver):
+def list_history_seasons(driver):
+    """(season value, name) of every past season in the picker, e.g. ('113S4', '113年第4季')"""
     select_element = WebDriverWait(driver, 10).until(
         EC.presence_of_element_located((By.ID, "historySeason_id"))
     )
-    
     options = select_element.find_elements(By.TAG_NAME, "option")
+    return [(option.get_attribute('value'), option.text.strip()) for option in options
+            if option.get_attribute('value')]
 
-    format_select = WebDriverWait(driver, 10).until(
-        EC.presence_of_element_located((By.ID, "fileFormatId"))
-    )
-    format_select.click()
-    csv_option = WebDriverWait(driver, 10).until(
-        EC.presence_of_element_located((By.CSS_SELECTOR, "#fileFormatId option[value='csv']"))
-    )
-    csv_option.click()
-    time.sleep(1)
+def download_historical_data(driver, download_dir, workers=4, url_template=download_engine.DOWNLOAD_URL,
+                             checksums=None):
+    """Download every past season's CSV archive to property_data_<season>.zip in download_dir
 
-    for option in options:
-        season_name = option.text.strip()
-        option.click()
-        time.sleep(1)    
-        
-        download_button = driver.find_element(By.ID, "downloadBtnId")
-        download_button.click()
-        
-        # Wait for download to complete
-        time.sleep(5)
-        
-        # Get the download directory (adjust as needed)
-        download_dir = os.path.expanduser("~/Downloads")
-        
-        # Find the most recently downloaded file
-        list_of_files = glob.glob(f"{download_dir}/*.zip")
-        latest_file = max(list_of_files, key=os.path.getctime)
-        
-        # Create new filename with the season name
-        new_filename = os.path.join(download_dir, f"property_data_{season_name}.zip")
-        
-        # Rename the file
-        os.rename(latest_file, new_filename)
-        print(f"Downloaded and renamed: {new_filename}")
-        
-        time.sleep(3)
+    The browser is only used to read the season picker; the archives themselves are
+    fetched straight from their URLs, several at a time, by download_engine.
+    """
+    seasons = list_history_seasons(driver)
+    print(f"Found {len(seasons)} past seasons")
+    return download_engine.download_seasons([value for value, _ in seasons], download_dir, workers=workers,
+                                            url_template=url_template, names=dict(seasons),
+                                            checksums=checksums)
 
 def main():
-    driver = setup_driver()
-    navigate_to_website(driver)
-    time.sleep(3)
-    click_all_downloads(driver)
-    download_historical_data(driver)
-    time.sleep(1)  
-    driver.quit()
+    parser = argparse.ArgumentParser(description="Download the LVR open data, current and past seasons")
+    parser.add_argument('--download-dir', type=Path, default=Path("~/Downloads").expanduser(),
+                        help="where property_data_<season>.zip files go (default: ~/Downloads)")
+    parser.add_argument('--workers', type=int, default=4, help="seasons downloaded at once (default: 4)")
+    parser.add_argument('--seasons', nargs='+',
+                        help="only these past seasons (113S4 ...), without opening a browser")
+    parser.add_argument('--url-template', default=download_engine.DOWNLOAD_URL,
+                        help="archive URL with a {season} placeholder (default: the open data site)")
+    parser.add_argument('--current-url', default=download_engine.CURRENT_URL,
+                        help="URL of the current period's archive (default: the open data site)")
+    parser.add_argument('--checksums', type=Path, help="sha256sum-style file of expected archive checksums")
+    args = parser.parse_args()
+    
+    checksums = download_engine.read_checksums(args.checksums) if args.checksums else None
+    if args.seasons:
+        results = download_engine.download_seasons(args.seasons, args.download_dir, workers=args.workers,
+                                                   url_template=args.url_template, checksums=checksums)
+    else:
+        results = download_current_data(args.download_dir, url=args.current_url, checksums=checksums)
+        driver = setup_driver()
+        try:
+            navigate_to_website(driver)
+            time.sleep(3)
+            results += download_historical_data(driver, args.download_dir, workers=args.workers,
+                                                url_template=args.url_template, checksums=checksums)
+        finally:
+            driver.quit()
+    
+    failed = [result for result in results if result['status'] == 'failed']
+    print(f"\n=== Download Complete: {len(results) - len(failed)} ok, {len(failed)} failed ===")
 
 if __name__ == "__main__":
     main()
@@ -1,14 +1,36 @@
 import os
+import sys
 import shutil
-from pathlib import Path
+import argparse
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+
+try:
+    import fcntl
+except ImportError:  # Windows: no reflinks
+    fcntl = None
+
+import zip_source
+import run_metrics
+from manifest import Manifest
+
+TRANSACTION_FOLDERS = {
+    'a': 'property-sales',
+    'b': 'pre-construction-sales',
+    'c': 'property-rentals'
+}
+
+# How a file gets into its transaction folder; all but copy use no extra disk space
+PLACEMENT_MODES = ['copy', 'hardlink', 'reflink', 'symlink']
+
+# ioctl request cloning one file's extents into another (linux/fs.h), btrfs and XFS
+FICLONE = 0x40049409
 
 def create_transaction_folders(base_path):
     """Create folders for different transaction types"""
-    folders = {
-        'a': 'property-sales',
-        'b': 'pre-construction-sales',
-        'c': 'property-rentals'
-    }
+    folders = dict(TRANSACTION_FOLDERS)
     
     print("\n=== Creating Transaction Folders ===")
     for code, folder in folders.items():
@@ -33,69 +55,245 @@ def get_transaction_type(filename):
     print(f"  └─ No valid transaction type found in {filename}")
     return None
 
-def organize_files(source_dir):
-    """Organize files into appropriate folders based on transaction type"""
+def organize_zip_members(dest_dir, zip_paths, folders, stats, skipped_files, dry_run=False):
+    """Group the CSVs inside zip archives without extracting them.
+
+    Each transaction folder gets a zip index listing the members that belong to it,
+    under the same names the copy mode would use; the processor reads them straight
+    out of the archives. With dry_run the indexes are not written.
+    """
+    grouped = {}
+    for folder in folders.values():
+        # Keep members indexed by an earlier run
+        folder_path = Path(dest_dir) / folder
+        grouped[folder] = {m.name: m for m in zip_source.read_zip_index(folder_path)}
+    
+    for member in zip_source.list_zip_members(zip_paths):
+        stats['processed'] += 1
+        file = PurePosixPath(member.member).name
+        quarter_folder = member.archive.name
+        print(f"\nProcessing: {member.archive.name}/{member.member}")
+        
+        trans_type = get_transaction_type(file)
+        if not trans_type:
+            skipped_files.append(f"No transaction type: {file} in {quarter_folder}")
+            stats['skipped'] += 1
+            continue
+        
+        dest_folder = folders.get(trans_type)
+        dest_path = os.path.join(dest_dir, dest_folder, member.name)
+        if member.name in grouped[dest_folder] or os.path.exists(dest_path):
+            print(f"  └─ Skipping: File already exists at destination")
+            skipped_files.append(f"Duplicate file: {file} in {quarter_folder}")
+            stats['skipped'] += 1
+            continue
+        
+        print(f"  └─ {'Would index' if dry_run else 'Indexing'} as: {dest_path}")
+        grouped[dest_folder][member.name] = member
+        stats['moved'] += 1
+    
+    for folder, members in grouped.items():
+        if not members:
+            continue
+        if dry_run:
+            print(f"\nWould write {len(members)} zip members to {Path(dest_dir) / folder / zip_source.ZIP_INDEX_NAME}")
+            continue
+        index_path = zip_source.write_zip_index(Path(dest_dir) / folder, members.values())
+        print(f"\nWrote {len(members)} zip members to {index_path}")
+
+def remove_stale_copies(dest_dir, manifest):
+    """Delete the copies of source files that disappeared since the last run
+    Example: rawdata-114Q1-partial replaced by rawdata-2025Q1 drops the partial copies
+    """
+    removed = manifest.removed()
+    for source_file, entry in removed.items():
+        dest_path = os.path.join(dest_dir, entry['output'])
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+            print(f"  └─ Removed copy of deleted file: {dest_path}")
+        manifest.forget(source_file)
+    return len(removed)
+
+def scan_quarter_folders(source_dir):
+    """Yield (folder path, file names) for every rawdata-* folder under source_dir, top-down
+    like os.walk, but from os.scandir entries so no extra stat calls are made
+    """
+    try:
+        entries = list(os.scandir(source_dir))
+    except OSError:
+        return
+    
+    if os.path.basename(source_dir).startswith('rawdata-'):
+        yield source_dir, [entry.name for entry in entries if entry.is_file()]
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from scan_quarter_folders(entry.path)
+
+def reflink(source_path, dest_path):
+    """Clone a file's blocks copy-on-write (btrfs/XFS ioctl on Linux, clonefile on macOS)
+    Raises OSError where the filesystem cannot.
+    """
+    if sys.platform == 'darwin':
+        if subprocess.run(['cp', '-c', '-p', source_path, dest_path], capture_output=True).returncode != 0:
+            raise OSError(f"clonefile not supported for {dest_path}")
+        return
+    if fcntl is None:
+        raise OSError("reflinks not supported on this platform")
+    
+    try:
+        with open(source_path, 'rb') as src, open(dest_path, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    shutil.copystat(source_path, dest_path)
+
+def place_file(source_path, dest_path, mode='copy'):
+    """Put source_path at dest_path by the given placement mode
+    Reflinks and hardlinks the filesystem refuses (other device, no support) fall back
+    to a copy. Returns (mode used, seconds taken).
+    """
+    start = time.perf_counter()
+    if mode == 'symlink':
+        os.symlink(os.path.abspath(source_path), dest_path)
+        return mode, time.perf_counter() - start
+    
+    try:
+        if mode == 'hardlink':
+            os.link(source_path, dest_path)
+            return mode, time.perf_counter() - start
+        if mode == 'reflink':
+            reflink(source_path, dest_path)
+            return mode, time.perf_counter() - start
+    except OSError:
+        pass
+    shutil.copy2(source_path, dest_path)
+    return 'copy', time.perf_counter() - start
+
+def organize_files(source_dir, zip_paths=None, incremental=False, report=None, mode='copy', workers=8,
+                   dry_run=False, dest_dir=None):
+    """Organize files into appropriate folders based on transaction type
+    With zip_paths, the CSVs are grouped straight out of the archives instead of copied.
+    With incremental, unchanged files are skipped and changed ones re-copied, tracked in
+    grouper-manifest.json. With report, phase timings and one record per placed file
+    are written there as JSON + CSV.
+    mode is how a file is placed in its transaction folder: copy, hardlink, reflink or
+    symlink; placements run in a pool of workers threads. With dry_run nothing is
+    written, the plan is printed instead.
+    The transaction folders are created in dest_dir, source_dir itself by default.
+    """
+    dest_dir = dest_dir or source_dir
     print("\n=== Starting File Organization ===")
     print(f"Source directory: {source_dir}")
+    if dest_dir != source_dir:
+        print(f"Destination directory: {dest_dir}")
+    print(f"Placement: {mode}{' (dry run)' if dry_run else ''}")
+    
+    metrics = run_metrics.RunMetrics('grouper', {'source_dir': str(source_dir), 'dest_dir': str(dest_dir),
+                                                 'zip': bool(zip_paths), 'incremental': incremental, 'mode': mode,
+                                                 'workers': workers, 'dry_run': dry_run})
     
     # Create destination folders
-    folders = create_transaction_folders(source_dir)
+    if dry_run:
+        folders = dict(TRANSACTION_FOLDERS)
+    else:
+        folders = create_transaction_folders(dest_dir)
     
     # Lists to store skipped and unprocessed files
     skipped_files = []
     unprocessed_files = []
     
     # Counter for statistics
-    stats = {'processed': 0, 'moved': 0, 'skipped': 0, 'unprocessed': 0}
+    stats = {'processed': 0, 'moved': 0, 'skipped': 0, 'unprocessed': 0, 'unchanged': 0, 'removed': 0,
+             'copied instead': 0}
+    
+    manifest = Manifest(Path(source_dir) / "grouper-manifest.json") if incremental and not zip_paths else None
     
     # Get all CSV files
     print("\n=== Processing Files ===")
-    for root, _, files in os.walk(source_dir):
-        quarter_folder = os.path.basename(root)
-        if not quarter_folder.startswith('rawdata-'):
-            continue
-            
-        for file in files:
-            stats['processed'] += 1
-            if file.endswith('.csv') and 'lvr_land' in file:                
-                print(f"\nProcessing: {file}")
-                # Get transaction type
-                trans_type = get_transaction_type(file)
-                if trans_type:
-                    # Create new filename with quarter info
-                    filename_without_ext = os.path.splitext(file)[0]
-                    quarter_suffix = quarter_folder.replace('rawdata-', '')
-                    new_filename = f"{filename_without_ext}-{quarter_suffix}.csv"
-                    
-                    # Source and destination paths
-                    source_path = os.path.join(root, file)
-                    dest_folder = folders.get(trans_type)
-                    if dest_folder:
-                        dest_path = os.path.join(source_dir, dest_folder, new_filename)
+    metrics.begin_phase('organize')
+    planned = []  # (source path, destination path, manifest key, manifest entry)
+    planned_paths = set()  # Destinations claimed by this run, not on disk yet
+    if zip_paths:
+        organize_zip_members(dest_dir, zip_paths, folders, stats, skipped_files, dry_run)
+    else:
+        for root, files in scan_quarter_folders(source_dir):
+            quarter_folder = os.path.basename(root)
+                
+            for file in files:
+                stats['processed'] += 1
+                if file.endswith('.csv') and 'lvr_land' in file:                
+                    print(f"\nProcessing: {file}")
+                    # Get transaction type
+                    trans_type = get_transaction_type(file)
+                    if trans_type:
+                        # Create new filename with quarter info
+                        filename_without_ext = os.path.splitext(file)[0]
+                        quarter_suffix = quarter_folder.replace('rawdata-', '')
+                        new_filename = f"{filename_without_ext}-{quarter_suffix}.csv"
                         
-                        # Skip if file already exists
-                        if os.path.exists(dest_path):
-                            print(f"  └─ Skipping: File already exists at destination")
-                            skipped_files.append(f"Duplicate file: {file} in {quarter_folder}")
-                            stats['skipped'] += 1
-                            continue
+                        # Source and destination paths
+                        source_path = os.path.join(root, file)
+                        dest_folder = folders.get(trans_type)
+                        if dest_folder:
+                            dest_path = os.path.join(dest_dir, dest_folder, new_filename)
+                            
+                            # A file placed by an earlier run is skipped when unchanged, replaced when changed
+                            own_copy = False
+                            source_file = entry = None
+                            if manifest is not None:
+                                source_file = os.path.relpath(source_path, source_dir)
+                                changed, entry = manifest.check(source_file, Path(source_path))
+                                entry['output'] = os.path.join(dest_folder, new_filename)
+                                own_copy = manifest.files.get(source_file, {}).get('output') == entry['output']
+                                if own_copy and not changed and os.path.lexists(dest_path):
+                                    print(f"  └─ Unchanged since last run")
+                                    manifest.record(source_file, entry)
+                                    stats['unchanged'] += 1
+                                    continue
                             
-                        print(f"  └─ Moving {file} to: {dest_path}")
-                        shutil.copy2(source_path, dest_path)
-                        stats['moved'] += 1
+                            # Skip if file already exists
+                            if dest_path in planned_paths or (os.path.lexists(dest_path) and not own_copy):
+                                print(f"  └─ Skipping: File already exists at destination")
+                                skipped_files.append(f"Duplicate file: {file} in {quarter_folder}")
+                                stats['skipped'] += 1
+                                continue
+                                
+                            print(f"  └─ {'Would place' if dry_run else 'Placing'} {file} at: {dest_path}")
+                            planned.append((source_path, dest_path, source_file, entry))
+                            planned_paths.add(dest_path)
+                    else:
+                        skipped_files.append(f"No transaction type: {file} in {quarter_folder}")
+                        stats['skipped'] += 1
                 else:
-                    skipped_files.append(f"No transaction type: {file} in {quarter_folder}")
-                    stats['skipped'] += 1
-            else:
-                unprocessed_files.append(f"Not a target file: {file} in {quarter_folder}")
-                stats['unprocessed'] += 1
+                    unprocessed_files.append(f"Not a target file: {file} in {quarter_folder}")
+                    stats['unprocessed'] += 1
+    
+    if planned:
+        metrics.begin_phase('place')
+        print(f"\n=== {'Plan' if dry_run else 'Placing'}: {len(planned)} files by {mode} ===")
+        place_planned(planned, mode, workers, dry_run, manifest, stats, metrics)
+    
+    if manifest is not None and not dry_run:
+        metrics.begin_phase('manifest')
+        stats['removed'] = remove_stale_copies(dest_dir, manifest)
+        manifest.save()
+    elif manifest is not None:
+        stats['removed'] = len(manifest.removed())
+    metrics.end_phase()
     
     # Print summary
     print("\n=== Processing Summary ===")
     print(f"Total files processed: {stats['processed']}")
-    print(f"Files moved: {stats['moved']}")
+    print(f"Files {'to place' if dry_run else 'moved'}: {stats['moved']}")
     print(f"Files skipped: {stats['skipped']}")
     print(f"Files unprocessed: {stats['unprocessed']}")
+    if stats['copied instead']:
+        print(f"Files copied because {mode} was not possible: {stats['copied instead']}")
+    if manifest is not None:
+        print(f"Files unchanged: {stats['unchanged']}")
+        print(f"Copies of deleted files {'to remove' if dry_run else 'removed'}: {stats['removed']}")
     
     # Print skipped files list
     if skipped_files:
@@ -108,7 +306,79 @@ def organize_files(source_dir):
         print("\n=== Unprocessed Files ===")
         for file in unprocessed_files:
             print(f"- {file}")
+    
+    if report:
+        for name, count in stats.items():
+            metrics.count(name, count)
+        report_path, files_path = metrics.write_report(report)
+        print(f"\nRun report saved to: {report_path} (files: {files_path})")
+
+def place_planned(planned, mode, workers, dry_run, manifest, stats, metrics):
+    """Place every planned file in a thread pool; copies spend their time in the kernel, so
+    threads overlap them. With dry_run only the plan is recorded, with the bytes a copy
+    would write.
+    """
+    def place(source_path, dest_path):
+        # An earlier run's copy (or link) of a changed file is replaced, never written through
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+        return place_file(source_path, dest_path, mode)
+    
+    futures = None
+    if not dry_run:
+        executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        futures = iter([executor.submit(place, item[0], item[1]) for item in planned])
+    
+    planned_bytes = 0
+    try:
+        for source_path, dest_path, source_file, entry in planned:
+            size = os.path.getsize(source_path)
+            record = {'file': source_path, 'bytes': size, 'output': dest_path}
+            if dry_run:
+                planned_bytes += size
+                metrics.record_file(record, action=f"plan {mode}")
+                print(f"  {mode}: {source_path} -> {dest_path}")
+                stats['moved'] += 1
+                continue
+            
+            try:
+                used, seconds = next(futures).result()
+            except OSError as e:
+                print(f"  ✗ Could not place {source_path}: {e}")
+                metrics.record_file(record, action='failed', error=str(e))
+                continue
+            stats['moved'] += 1
+            if used != mode:
+                stats['copied instead'] += 1
+            metrics.record_file(record, action=used, seconds=round(seconds, 6))
+            if manifest is not None:
+                manifest.record(source_file, entry)
+    finally:
+        if not dry_run:
+            executor.shutdown()
+    
+    if dry_run:
+        extra = planned_bytes if mode == 'copy' else 0
+        print(f"\nWould place {len(planned)} files ({planned_bytes / (1024 * 1024):.2f} MB), "
+              f"{extra / (1024 * 1024):.2f} MB of new disk usage (reflink copies only what later changes)")
 
 if __name__ == "__main__":
-    base_dir = "/Users/dd/Jack/code-projects/xinyi-estate/estate-lvr-data/data/rawdata-estate-actual-price-registration"
-    organize_files(base_dir)
+    parser = argparse.ArgumentParser(description="Group LVR CSV files by transaction type")
+    parser.add_argument('source_dir', help="directory holding the rawdata-* quarter folders")
+    parser.add_argument('--dest-dir',
+                        help="where the transaction folders go, e.g. property-infos (default: source_dir)")
+    parser.add_argument('--zip', nargs='+', metavar='ARCHIVE',
+                        help="group the CSVs inside these zip archives instead of copying extracted files")
+    parser.add_argument('--incremental', action='store_true',
+                        help="skip files unchanged since the last run (tracked in grouper-manifest.json)")
+    parser.add_argument('--mode', choices=PLACEMENT_MODES, default='copy',
+                        help="how files are placed in the transaction folders: copy, hardlink, reflink "
+                             "(copy-on-write clone where the filesystem supports it) or symlink; hardlinks and "
+                             "reflinks fall back to a copy where impossible (default: copy)")
+    parser.add_argument('--workers', type=int, default=8, help="threads placing files (default: 8)")
+    parser.add_argument('--dry-run', action='store_true', help="print the plan without writing anything")
+    parser.add_argument('--report', help="write a JSON run report (phase timings, placed files) to this path")
+    args = parser.parse_args()
+    
+    organize_files(args.source_dir, zip_paths=args.zip, incremental=args.incremental, report=args.report,
+                   mode=args.mode, workers=args.workers, dry_run=args.dry_run, dest_dir=args.dest_dir)
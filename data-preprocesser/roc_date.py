@@ -0,0 +1,146 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+ROC_EPOCH_YEAR = 1911  # ROC year 1 is 1912
+
+# Longest text looked at: 7 digits with a little whitespace around them. Anything that
+# fills the whole width may have been cut off and is treated as invalid.
+MAX_WIDTH = 12
+
+ZERO = ord('0')
+WHITESPACE = [ord(c) for c in ' \t\r\n　']
+
+# Place value of a digit by how far it sits left of the last digit
+POWERS_OF_TEN = 10 ** np.arange(MAX_WIDTH, dtype=np.int64)
+
+def roc_to_datetime64(values, fill_missing_day=True):
+    """Convert a column of ROC dates to datetime64 in one vectorized pass
+
+    Accepted forms, surrounding whitespace ignored:
+        1090911  YYYMMDD
+         990101  YYMMDD (ROC years before 100, leading zero dropped)
+          10909  YYYMM, and 9909 YYMM (day missing)
+    A day of 00 or a missing day becomes the 1st of the month, or NaT when
+    fill_missing_day is False. Anything else (text, NaN, month 13, Feb 30) becomes
+    NaT instead of raising; leading zeros are fine, 0350101 is 1946-01-01.
+
+    Returns a datetime64[ns] Series with the index of values when it is a Series,
+    otherwise a datetime64[ns] array.
+    """
+    index = values.index if isinstance(values, pd.Series) else None
+    text = np.asarray(values, dtype=object).astype(f'U{MAX_WIDTH}')
+    n = len(text)
+
+    # Every value as a row of code points, 0 past its end
+    codes = text.view(np.uint32).reshape(n, MAX_WIDTH) if n else np.zeros((0, MAX_WIDTH), dtype=np.uint32)
+    digits = codes - ZERO  # wraps around for anything below '0'
+    is_digit = digits <= 9
+    is_blank = codes == 0
+    for whitespace in WHITESPACE:
+        is_blank |= codes == whitespace
+
+    # Digits must form one run: their count equals the distance from the first to the last
+    digit_count = is_digit.sum(axis=1)
+    first = is_digit.argmax(axis=1)
+    last = MAX_WIDTH - 1 - is_digit[:, ::-1].argmax(axis=1)
+    valid = (is_digit | is_blank).all(axis=1) & (last - first + 1 == digit_count) & (codes[:, -1] == 0)
+    valid &= (digit_count >= 4) & (digit_count <= 7)
+
+    place = np.clip(last[:, None] - np.arange(MAX_WIDTH), 0, None)
+    number = (np.where(is_digit, digits, 0) * POWERS_OF_TEN[place]).sum(axis=1)
+
+    has_day = digit_count >= 6
+    day = np.where(has_day, number % 100, 0)
+    year_month = np.where(has_day, number // 100, number)
+    month = year_month % 100
+    year = year_month // 100 + ROC_EPOCH_YEAR
+
+    valid &= (year > ROC_EPOCH_YEAR) & (month >= 1) & (month <= 12)
+    if not fill_missing_day:
+        valid &= day != 0
+    day = np.where(day == 0, 1, day)
+
+    # Month starts as datetime64[M]; the day has to fit in its month
+    months = np.where(valid, (year - 1970) * 12 + month - 1, 0).astype('datetime64[M]')
+    month_start = months.astype('datetime64[D]')
+    days_in_month = ((months + 1).astype('datetime64[D]') - month_start).astype(np.int64)
+    valid &= day <= days_in_month
+
+    dates = (month_start + (day - 1).astype('timedelta64[D]')).astype('datetime64[ns]')
+    dates[~valid] = np.datetime64('NaT')
+
+    if index is not None:
+        return pd.Series(dates, index=index, name=values.name)
+    return dates
+
+def roc_period_to_datetime64(values, separator='~', fill_missing_day=True):
+    """Split ROC periods such as '1090901~1100831' (rental periods) into (start, end) date columns"""
+    parts = pd.Series(values).str.split(separator, n=1, expand=True).reindex(columns=[0, 1])
+    return (roc_to_datetime64(parts[0], fill_missing_day),
+            roc_to_datetime64(parts[1], fill_missing_day))
+
+def roc_to_date(value):
+    """Convert one ROC date string to a Timestamp, or NaT; the row-at-a-time reference for the benchmark"""
+    if not isinstance(value, str):
+        return pd.NaT
+    value = value.strip()
+    if not (value.isascii() and value.isdigit()) or not 4 <= len(value) <= 7:
+        return pd.NaT
+    number = int(value)
+    if len(value) >= 6:
+        number, day = divmod(number, 100)
+    else:
+        day = 0
+    year, month = divmod(number, 100)
+    if year < 1:
+        return pd.NaT
+    try:
+        return pd.Timestamp(year + ROC_EPOCH_YEAR, month, day or 1)
+    except ValueError:
+        return pd.NaT
+
+def sample_roc_dates(rows, seed=0):
+    """A column that looks like real transaction and completion dates, with some bad values mixed in"""
+    rng = np.random.default_rng(seed)
+    years = rng.integers(30, 114, rows)
+    months = rng.integers(1, 13, rows)
+    days = rng.integers(0, 32, rows)
+    values = pd.Series(years * 10000 + months * 100 + days).astype(str).str.zfill(7)
+    junk = rng.random(rows)
+    values[junk < 0.02] = ''
+    values[(junk >= 0.02) & (junk < 0.03)] = 'N/A'
+    values[(junk >= 0.03) & (junk < 0.05)] = values[(junk >= 0.03) & (junk < 0.05)].str[:5]
+    values[(junk >= 0.05) & (junk < 0.06)] = np.nan
+    return values
+
+def benchmark(rows, repeat=3):
+    """Time the vectorized converter against row-wise apply on the same column"""
+    values = sample_roc_dates(rows)
+
+    results = {}
+    for name, convert in [('vectorized', roc_to_datetime64), ('apply', lambda v: v.apply(roc_to_date))]:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            converted = convert(values)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = (best, pd.to_datetime(converted))
+        print(f"{name:>10}: {best:.3f}s  {rows / best:,.0f} rows/s")
+
+    vectorized, applied = results['vectorized'][1], results['apply'][1]
+    mismatches = int((vectorized.ne(applied) & ~(vectorized.isna() & applied.isna())).sum())
+    print(f"   speedup: {results['apply'][0] / results['vectorized'][0]:.1f}x, "
+          f"{int(vectorized.isna().sum())} NaT, {mismatches} mismatches")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark vectorized ROC date conversion against row-wise apply")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="rows in the sample column (default: 1000000)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per converter, best is reported (default: 3)")
+    args = parser.parse_args()
+
+    benchmark(args.rows, args.repeat)
@@ -0,0 +1,158 @@
+import cProfile
+import csv
+import io
+import json
+import pstats
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+def file_metrics(csv_file):
+    """A fresh record for one input file; the read path fills it in as it goes"""
+    try:
+        size = csv_file.stat().st_size
+    except OSError:
+        size = None
+    return {
+        'file': str(csv_file),
+        'bytes': size,
+        'rows': 0,
+        'seconds': 0.0,
+        'encoding': None,
+        'big5_fallback': False,
+        'repaired': False,
+        'error_rows': 0,
+        'error': None,
+    }
+
+class RunMetrics:
+    """Phase timings, one record per file and optional profiles of a run, written as a report.
+
+    The report is JSON (run options, phases, totals, files, profiles) with the file
+    records also written as CSV next to it, so two runs can be diffed or loaded
+    into pandas directly.
+    """
+
+    def __init__(self, name, options=None):
+        self.name = name
+        self.options = options or {}
+        self.started = datetime.now()
+        self.phases = {}
+        self.files = []
+        self.counters = {}
+        self.profile = None
+
+        self._phase = None
+        self._phase_start = None
+        self._profiler = None
+        self._profile_path = None
+        self._trace_memory = False
+
+    def begin_phase(self, name):
+        """Start timing a phase, ending the one before it"""
+        self.end_phase()
+        self._phase = name
+        self._phase_start = time.perf_counter()
+
+    def end_phase(self):
+        if self._phase is not None:
+            elapsed = time.perf_counter() - self._phase_start
+            self.phases[self._phase] = round(self.phases.get(self._phase, 0.0) + elapsed, 6)
+            self._phase = None
+
+    def record_file(self, metrics, **extra):
+        """Add a file record; extra fields (phase, action, ...) are stored with it"""
+        self.files.append({**metrics, **extra})
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def start_profiling(self, profile_path=None, trace_memory=False):
+        """Run the rest of this process under cProfile and/or tracemalloc until stop_profiling
+
+        Only the calling process is profiled; worker processes are not.
+        """
+        if profile_path:
+            self._profile_path = Path(profile_path)
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        if trace_memory:
+            self._trace_memory = True
+            tracemalloc.start()
+
+    def stop_profiling(self, top=20):
+        """Stop profiling and keep the top functions and allocation sites for the report"""
+        profile = {}
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self._profile_path)
+            stats = pstats.Stats(self._profiler, stream=io.StringIO())
+            functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+            profile['cprofile'] = {
+                'path': str(self._profile_path),
+                'top_cumulative': [
+                    {'function': f"{path}:{line}({name})", 'calls': calls, 'total_seconds': round(total, 6),
+                     'cumulative_seconds': round(cumulative, 6)}
+                    for (path, line, name), (_, calls, total, cumulative, _) in functions
+                ],
+            }
+            self._profiler = None
+        if self._trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            profile['tracemalloc'] = {
+                'peak_bytes': peak,
+                'top_allocations': [
+                    {'site': str(stat.traceback[0]), 'bytes': stat.size, 'blocks': stat.count}
+                    for stat in snapshot.statistics('lineno')[:top]
+                ],
+            }
+            self._trace_memory = False
+        self.profile = profile or None
+
+    def totals(self):
+        """Sums over the file records, plus the slowest files"""
+        def total(field):
+            return sum(record.get(field) or 0 for record in self.files)
+
+        slowest = sorted(self.files, key=lambda record: record.get('seconds') or 0, reverse=True)[:10]
+        return {
+            'files': len(self.files),
+            'bytes': total('bytes'),
+            'rows': total('rows'),
+            'seconds': round(total('seconds'), 6),
+            'big5_fallbacks': sum(1 for record in self.files if record.get('big5_fallback')),
+            'repaired': sum(1 for record in self.files if record.get('repaired')),
+            'error_rows': total('error_rows'),
+            'failed': sum(1 for record in self.files if record.get('error')),
+            'slowest': [{'file': record['file'], 'seconds': record.get('seconds')} for record in slowest],
+        }
+
+    def write_report(self, path):
+        """Write the JSON report to path and the file records to the same name with .csv"""
+        self.end_phase()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        report = {
+            'name': self.name,
+            'started': self.started.isoformat(timespec='seconds'),
+            'wall_seconds': round((datetime.now() - self.started).total_seconds(), 6),
+            'options': self.options,
+            'phases': self.phases,
+            'counters': self.counters,
+            'totals': self.totals(),
+            'profile': self.profile,
+            'files': self.files,
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1, default=str)
+
+        csv_path = path.with_suffix('.csv')
+        fields = list(dict.fromkeys(field for record in self.files for field in record))
+        with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.files)
+        return path, csv_path
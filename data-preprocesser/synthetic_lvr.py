@@ -0,0 +1,225 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import lvr_schema
+
+# City codes and names, as in the readme table
+CITIES = {
+    'a': '臺北市', 'b': '臺中市', 'c': '基隆市', 'd': '臺南市', 'e': '高雄市', 'f': '新北市',
+    'g': '宜蘭縣', 'h': '桃園市', 'i': '嘉義市', 'j': '新竹縣', 'k': '苗栗縣', 'm': '南投縣',
+    'n': '彰化縣', 'o': '新竹市', 'p': '雲林縣', 'q': '嘉義縣', 't': '屏東縣', 'u': '花蓮縣',
+    'v': '臺東縣', 'w': '金門縣', 'x': '澎湖縣', 'z': '連江縣',
+}
+
+# Tables each transaction type is published with, as in the readme tables
+TABLES = {
+    'a': ['main', 'build', 'land', 'park'],
+    'b': ['main', 'land', 'park'],
+    'c': ['main', 'build', 'land', 'park'],
+}
+
+# Column layouts of the released files; the serial number links detail rows to their transaction
+HEADERS = {
+    ('main', 'a'): [
+        '鄉鎮市區', '交易標的', '土地位置建物門牌', '土地移轉總面積平方公尺', '都市土地使用分區', '非都市土地使用分區',
+        '非都市土地使用編定', '交易年月日', '交易筆棟數', '移轉層次', '總樓層數', '建物型態', '主要用途', '主要建材',
+        '建築完成年月', '建物移轉總面積平方公尺', '建物現況格局-房', '建物現況格局-廳', '建物現況格局-衛',
+        '建物現況格局-隔間', '有無管理組織', '總價元', '單價元平方公尺', '車位類別', '車位移轉總面積(平方公尺)',
+        '車位總價元', '備註', '編號', '主建物面積', '附屬建物面積', '陽台面積', '電梯', '移轉編號',
+    ],
+    ('main', 'b'): [
+        '鄉鎮市區', '交易標的', '土地位置建物門牌', '土地移轉總面積平方公尺', '都市土地使用分區', '非都市土地使用分區',
+        '非都市土地使用編定', '交易年月日', '交易筆棟數', '移轉層次', '總樓層數', '建物型態', '主要用途', '主要建材',
+        '建築完成年月', '建物移轉總面積平方公尺', '建物現況格局-房', '建物現況格局-廳', '建物現況格局-衛',
+        '建物現況格局-隔間', '有無管理組織', '總價元', '單價元平方公尺', '車位類別', '車位移轉總面積平方公尺',
+        '車位總價元', '備註', '編號', '建案名稱', '棟及號', '解約情形',
+    ],
+    ('main', 'c'): [
+        '鄉鎮市區', '租賃標的', '土地位置建物門牌', '土地面積平方公尺', '都市土地使用分區', '非都市土地使用分區',
+        '非都市土地使用編定', '租賃年月日', '租賃筆棟數', '租賃層次', '總樓層數', '建物型態', '主要用途', '主要建材',
+        '建築完成年月', '建物總面積平方公尺', '建物現況格局-房', '建物現況格局-廳', '建物現況格局-衛',
+        '建物現況格局-隔間', '有無管理組織', '有無附傢俱', '總額元', '單價元平方公尺', '車位類別', '車位面積平方公尺',
+        '車位總額元', '備註', '編號', '出租型態', '有無管理員', '租賃期間', '有無電梯', '附屬設備', '租賃住宅服務',
+    ],
+    'build': ['編號', '屋齡', '建物移轉面積平方公尺', '主要用途', '主要建材', '建築完成日期', '總層數', '建物分層', '移轉情形'],
+    'land': ['編號', '土地位置', '土地移轉面積平方公尺', '使用分區或編定', '權利人持分分母', '權利人持分分子', '移轉情形', '地號'],
+    'park': ['編號', '車位類別', '車位價格', '車位面積平方公尺', '車位所在樓層'],
+}
+
+# Values for the low-cardinality columns; anything not listed gets generic text
+VOCABULARY = {
+    '鄉鎮市區': ['中正區', '大安區', '信義區', '板橋區', '中和區', '北屯區', '西屯區', '前鎮區', '竹北市', '中壢區'],
+    '交易標的': ['房地(土地+建物)', '房地(土地+建物)+車位', '土地', '建物', '車位'],
+    '租賃標的': ['房地(土地+建物)', '建物', '房地(土地+建物)+車位', '車位'],
+    '都市土地使用分區': ['住', '商', '工', '其他', ''],
+    '建物型態': ['住宅大樓(11層含以上有電梯)', '華廈(10層含以下有電梯)', '公寓(5樓含以下無電梯)', '透天厝', '套房(1房1廳1衛)'],
+    '主要用途': ['住家用', '商業用', '住商用', '工業用', ''],
+    '主要建材': ['鋼筋混凝土造', '鋼骨鋼筋混凝土造', '加強磚造', '鋼骨造'],
+    '建物現況格局-隔間': ['有', '無'],
+    '有無管理組織': ['有', '無'],
+    '有無附傢俱': ['有', '無'],
+    '有無管理員': ['有', '無'],
+    '有無電梯': ['有', '無', ''],
+    '電梯': ['有', '無', ''],
+    '車位類別': ['坡道平面', '坡道機械', '升降平面', '一樓平面', ''],
+    '移轉情形': ['建物移轉', '土地移轉', '持分移轉'],
+    '出租型態': ['整棟(戶)出租', '分租套房', '分層出租'],
+    '租賃住宅服務': ['', '一般包租', '轉租'],
+    '總樓層數': ['五層', '七層', '十二層', '十五層', '二十層'],
+    '移轉層次': ['一層', '三層', '五層', '八層', '十二層', '全'],
+    '租賃層次': ['一層', '三層', '五層', '八層', '全'],
+    '建物分層': ['一層', '二層', '三層', '五層'],
+    '總層數': ['五層', '七層', '十二層', '十五層'],
+    '車位所在樓層': ['地下一層', '地下二層', '地下三層', '一層'],
+    '使用分區或編定': ['住', '商', '工', '農'],
+}
+
+# Newer releases repeat the header in English as the first data row
+ENGLISH_HEADER = {'鄉鎮市區': 'The villages and towns urban district', '編號': 'serial number'}
+
+def roc_dates(rng, rows, first_year=30, last_year=113):
+    """ROC date strings (YYYMMDD) spread over the given ROC years"""
+    years = rng.integers(first_year, last_year + 1, rows)
+    months = rng.integers(1, 13, rows)
+    days = rng.integers(1, 29, rows)
+    return pd.Series(years * 10000 + months * 100 + days).astype(str).str.zfill(7)
+
+def column_values(rng, col, rows, city):
+    """Plausible values for one column, generated a whole column at a time"""
+    kind = None
+    for schema in lvr_schema.SCHEMAS.values():
+        kind = kind or schema.get(col)
+
+    if col in VOCABULARY:
+        return rng.choice(VOCABULARY[col], rows)
+    if col == '土地位置建物門牌':
+        districts = rng.choice(VOCABULARY['鄉鎮市區'], rows)
+        numbers = rng.integers(1, 400, rows).astype(str)
+        return pd.Series(districts).radd(CITIES[city]) + '和平東路' + numbers + '號'
+    if kind == lvr_schema.ROC_DATE or col == '建築完成年月':
+        dates = roc_dates(rng, rows)
+        # Completion dates are often missing
+        return dates.where(rng.random(rows) > 0.1, '')
+    if kind == lvr_schema.INTEGER:
+        return rng.integers(100_000, 80_000_000, rows).astype(str)
+    if kind == lvr_schema.SMALL_INTEGER:
+        return rng.integers(0, 6, rows).astype(str)
+    if kind == lvr_schema.FLOAT:
+        return np.round(rng.gamma(2.0, 40.0, rows), 2).astype(str)
+    if col == '交易筆棟數' or col == '租賃筆棟數':
+        return pd.Series(rng.integers(0, 3, rows).astype(str)).radd('土地') + '建物1車位0'
+    return np.where(rng.random(rows) < 0.8, '', 'x' + rng.integers(0, 10_000, rows).astype(str))
+
+def make_table(rng, table, trans_type, city, serials):
+    """One file's rows; detail tables get 0-3 rows per serial"""
+    headers = HEADERS[(table, trans_type)] if table == 'main' else HEADERS[table]
+    if table != 'main':
+        serials = np.repeat(serials, rng.integers(0, 4, len(serials)))
+    rows = len(serials)
+
+    df = pd.DataFrame({col: column_values(rng, col, rows, city) for col in headers if col != '編號'})
+    df['編號'] = serials
+    return df[headers]
+
+def malform(rng, lines, rate):
+    """Break a share of the data lines the ways real releases are broken
+
+    Most get an extra field (a comma in an unquoted address); now and then the last
+    line gets a quote that is never closed.
+    """
+    broken = np.flatnonzero(rng.random(len(lines)) < rate)
+    for i in broken:
+        lines[i] = lines[i].replace('號', '號,之1', 1) if '號' in lines[i] else lines[i] + ',extra'
+    if len(broken) and rng.random() < 0.2:
+        lines[-1] = '"' + lines[-1]
+    return len(broken)
+
+def write_lvr_file(path, df, encoding, malformed_rate, rng, english_header=True):
+    """Write a file the way the releases look: header, English header row, data"""
+    header = ','.join(df.columns)
+    lines = [header]
+    if english_header:
+        lines.append(','.join(ENGLISH_HEADER.get(col, f'column {i + 1}') for i, col in enumerate(df.columns)))
+    data = df.to_csv(index=False, header=False, lineterminator='\n').split('\n')[:-1]
+    broken = malform(rng, data, malformed_rate) if malformed_rate else 0
+    lines.extend(data)
+
+    with open(path, 'wb') as f:
+        f.write(('\n'.join(lines) + '\n').encode(encoding))
+    return len(data), broken
+
+def generate_tree(output_dir, quarters, rows_per_file=1000, cities=None, big5_rate=0.3, malformed_rate=0.001,
+                  overlap_rate=0.02, seed=0):
+    """Write rawdata-<quarter> folders with every city, transaction type and table.
+
+    A share of each quarter's transactions is published again in the next quarter
+    (overlap_rate), the way late registrations show up in real releases. Whole files
+    are big5 instead of utf-8 at big5_rate. Returns {'files', 'rows', 'malformed', 'bytes'}.
+    """
+    rng = np.random.default_rng(seed)
+    output_dir = Path(output_dir)
+    stats = {'files': 0, 'rows': 0, 'malformed': 0, 'bytes': 0}
+    previous = {}
+
+    for quarter_idx, quarter in enumerate(quarters):
+        quarter_dir = output_dir / f"rawdata-{quarter}"
+        quarter_dir.mkdir(parents=True, exist_ok=True)
+
+        for city in cities or CITIES:
+            for trans_type, tables in TABLES.items():
+                serials = np.array([f"R{city.upper()}{trans_type.upper()}{quarter_idx:03d}{i:07d}"
+                                    for i in range(rows_per_file)], dtype=object)
+                carried = previous.get((city, trans_type))
+                if carried is not None and overlap_rate:
+                    repeat = carried[rng.random(len(carried)) < overlap_rate]
+                    serials[:len(repeat)] = repeat[:len(serials)]
+                previous[(city, trans_type)] = serials
+
+                for table in tables:
+                    suffix = '' if table == 'main' else f"_{table}"
+                    path = quarter_dir / f"{city}_lvr_land_{trans_type}{suffix}.csv"
+                    df = make_table(rng, table, trans_type, city, serials)
+                    encoding = 'big5' if rng.random() < big5_rate else 'utf-8'
+                    rows, broken = write_lvr_file(path, df, encoding, malformed_rate, rng)
+
+                    stats['files'] += 1
+                    stats['rows'] += rows
+                    stats['malformed'] += broken
+                    stats['bytes'] += path.stat().st_size
+
+    return stats
+
+def quarter_range(first, count):
+    """count quarters starting at first
+    Example: quarter_range('2020Q3', 3) -> ['2020Q3', '2020Q4', '2021Q1']
+    """
+    year, quarter = int(first[:4]), int(first[-1])
+    quarters = []
+    for _ in range(count):
+        quarters.append(f"{year}Q{quarter}")
+        year, quarter = (year + 1, 1) if quarter == 4 else (year, quarter + 1)
+    return quarters
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic tree of rawdata-YYYYQn folders")
+    parser.add_argument('output_dir', type=Path)
+    parser.add_argument('--quarters', type=int, default=2, help="number of quarters (default: 2)")
+    parser.add_argument('--first-quarter', default='2020Q3', help="first quarter (default: 2020Q3)")
+    parser.add_argument('--rows', type=int, default=1000, help="transactions per main file (default: 1000)")
+    parser.add_argument('--cities', nargs='+', choices=list(CITIES), help="only these city codes (default: all 22)")
+    parser.add_argument('--big5-rate', type=float, default=0.3, help="share of files written in big5 (default: 0.3)")
+    parser.add_argument('--malformed-rate', type=float, default=0.001,
+                        help="share of data rows that are broken (default: 0.001)")
+    parser.add_argument('--overlap-rate', type=float, default=0.02,
+                        help="share of a quarter's transactions published again the next quarter (default: 0.02)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    stats = generate_tree(args.output_dir, quarter_range(args.first_quarter, args.quarters), args.rows,
+                          cities=args.cities, big5_rate=args.big5_rate, malformed_rate=args.malformed_rate,
+                          overlap_rate=args.overlap_rate, seed=args.seed)
+    print(f"Wrote {stats['files']} files, {stats['rows']} rows ({stats['malformed']} malformed), "
+          f"{stats['bytes'] / (1024 * 1024):.2f} MB to {args.output_dir}")
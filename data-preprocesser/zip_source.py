@@ -0,0 +1,135 @@
+import csv
+import io
+import os
+import re
+import time
+import zipfile
+from pathlib import Path, PurePosixPath
+
+# Written by rawdata-grouper.py --zip into each transaction folder, read by the processor
+ZIP_INDEX_NAME = "zip-index.tsv"
+
+def convert_season(season_name):
+    """Convert a season folder/archive name to the quarter suffix used by the grouper
+    Example: rawdata-2020Q4 -> '2020Q4'
+    Example: property_data_109年第4季 -> '2020Q4' (same rule as folder-renamer.py)
+    """
+    if season_name.startswith('rawdata-'):
+        return season_name.replace('rawdata-', '')
+
+    year_match = re.search(r'(\d+)年', season_name)
+    quarter_match = re.search(r'第([1-4])季', season_name)
+    if year_match and quarter_match:
+        if "現有資料只到0228" in season_name:
+            return "114Q1-partial"
+        return f"{int(year_match.group(1)) + 1911}Q{quarter_match.group(1)}"
+    return None
+
+def decode_member_name(info):
+    """Return a member's name, re-decoding big5 names that zipfile read as cp437"""
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode('cp437').decode('big5')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+class ZipMember:
+    """A CSV inside a zip archive that can stand in for a Path in the processor.
+
+    It is named the way rawdata-grouper.py names its copies (x_lvr_land_a-2020Q4.csv),
+    and its parent is the transaction folder it was grouped into, so source_file
+    columns and error files come out the same as with extracted files. Only the
+    archive path and member name are stored, so it pickles cheaply to worker processes.
+    """
+
+    def __init__(self, archive, member, name, parent=None):
+        self.archive = Path(archive)
+        self.member = member
+        self.name = name
+        self.parent = Path(parent) if parent is not None else self.archive.parent
+
+    @property
+    def stem(self):
+        return Path(self.name).stem
+
+    def relative_to(self, other):
+        return (self.parent / self.name).relative_to(other)
+
+    def info(self):
+        with zipfile.ZipFile(self.archive) as zf:
+            return zf.getinfo(self.member)
+
+    def stat(self):
+        """Size and modification time of the member, shaped like Path.stat()"""
+        info = self.info()
+        return os.stat_result((0, 0, 0, 0, 0, 0, info.file_size, 0, time.mktime(info.date_time + (0, 0, -1)), 0))
+
+    def open(self, mode='r', encoding=None, errors=None, newline=None):
+        """Open the member for streaming reads; decompression happens as it is read"""
+        zf = zipfile.ZipFile(self.archive)
+        try:
+            handle = zf.open(self.member)
+        except Exception:
+            zf.close()
+            raise
+        # The member handle keeps its own reference to the archive file
+        zf.close()
+        if 'b' in mode:
+            return handle
+        return io.TextIOWrapper(handle, encoding=encoding, errors=errors, newline=newline)
+
+    def __str__(self):
+        return f"{self.archive}/{self.member}"
+
+    def __repr__(self):
+        return f"ZipMember({str(self.archive)!r}, {self.member!r})"
+
+def list_zip_members(zip_paths):
+    """Yield every lvr_land CSV in the given archives without extracting anything.
+
+    The quarter comes from the member's folder (rawdata-2020Q4/ or a season name)
+    and falls back to the archive name (property_data_109年第4季.zip).
+    """
+    for zip_path in sorted(Path(p) for p in zip_paths):
+        with zipfile.ZipFile(zip_path) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+
+                member_path = PurePosixPath(decode_member_name(info))
+                if not (member_path.name.endswith('.csv') and 'lvr_land' in member_path.name):
+                    continue
+
+                quarter = None
+                if len(member_path.parts) > 1:
+                    quarter = convert_season(member_path.parent.name)
+                if quarter is None:
+                    quarter = convert_season(zip_path.stem)
+                if quarter is None:
+                    print(f"  └─ No quarter found for {member_path} in {zip_path.name}")
+                    continue
+
+                grouped_name = f"{member_path.stem}-{quarter}.csv"
+                yield ZipMember(zip_path, info.filename, grouped_name)
+
+def write_zip_index(folder, members):
+    """Write the zip members grouped into a transaction folder"""
+    index_path = Path(folder) / ZIP_INDEX_NAME
+    with open(index_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter='\t')
+        writer.writerow(['archive', 'member', 'name'])
+        for member in members:
+            writer.writerow([str(member.archive.resolve()), member.member, member.name])
+    return index_path
+
+def read_zip_index(folder):
+    """Return the ZipMembers listed in a transaction folder's zip index, if it has one"""
+    folder = Path(folder)
+    index_path = folder / ZIP_INDEX_NAME
+    if not index_path.exists():
+        return []
+
+    with open(index_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f, delimiter='\t')
+        return [ZipMember(row['archive'], row['member'], row['name'], parent=folder) for row in reader]